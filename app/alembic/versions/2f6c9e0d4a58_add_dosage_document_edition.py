@@ -0,0 +1,26 @@
+"""Add edition to dosage_documents
+
+Revision ID: 2f6c9e0d4a58
+Revises: 8d3f5a6b2e17
+Create Date: 2026-10-19 12:41:06.731542
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f6c9e0d4a58'
+down_revision: Union[str, None] = '8d3f5a6b2e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('dosage_documents', sa.Column('edition', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('dosage_documents', 'edition')
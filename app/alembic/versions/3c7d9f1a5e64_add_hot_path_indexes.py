@@ -0,0 +1,43 @@
+"""Add hot path indexes
+
+Revision ID: 3c7d9f1a5e64
+Revises: 9e4a1c7b3d25
+Create Date: 2026-10-19 16:41:07.552318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c7d9f1a5e64'
+down_revision: Union[str, None] = '9e4a1c7b3d25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_admins_hospital_id_id', 'admins', ['hospital_id', 'id']),
+    ('ix_doctors_hospital_id_id', 'doctors', ['hospital_id', 'id']),
+    ('ix_patients_hospital_id_id', 'patients', ['hospital_id', 'id']),
+    ('ix_prescriptions_patient_id_id', 'prescriptions', ['patient_id', 'id']),
+    ('ix_prescriptions_doctor_id', 'prescriptions', ['doctor_id']),
+    ('ix_stress_logs_timestamp', 'stress_logs', ['timestamp']),
+    ('ix_stress_logs_doctor_id_timestamp', 'stress_logs', ['doctor_id', 'timestamp']),
+    ('ix_empatica_iot_data_doctor_id_timestamp', 'empatica_iot_data', ['doctor_id', 'timestamp']),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY doesn't block writes but can't run inside a transaction.
+    # If a build fails it leaves an INVALID index behind: drop it by hand before re-running.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
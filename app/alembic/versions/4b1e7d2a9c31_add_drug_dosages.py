@@ -0,0 +1,50 @@
+"""Add drug_dosages lookup table
+
+Revision ID: 4b1e7d2a9c31
+Revises: c27bfb2e8262
+Create Date: 2026-10-19 09:12:41.218305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1e7d2a9c31'
+down_revision: Union[str, None] = 'c27bfb2e8262'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_table(
+        'drug_dosages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('drug_name', sa.String(), nullable=False),
+        sa.Column('normalized_name', sa.String(), nullable=False),
+        sa.Column('synonyms', postgresql.ARRAY(sa.String()), nullable=False),
+        sa.Column('indication', sa.Text(), nullable=True),
+        sa.Column('population', sa.String(), nullable=True),
+        sa.Column('dose_text', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['document_id'], ['dosage_documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_drug_dosages_id'), 'drug_dosages', ['id'], unique=False)
+    op.create_index(op.f('ix_drug_dosages_document_id'), 'drug_dosages', ['document_id'], unique=False)
+    op.create_index('ix_drug_dosages_normalized_name', 'drug_dosages', ['normalized_name'], unique=False, postgresql_ops={'normalized_name': 'text_pattern_ops'})
+    op.create_index('ix_drug_dosages_normalized_name_trgm', 'drug_dosages', ['normalized_name'], unique=False, postgresql_using='gin', postgresql_ops={'normalized_name': 'gin_trgm_ops'})
+    op.create_index('ix_drug_dosages_synonyms', 'drug_dosages', ['synonyms'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_drug_dosages_synonyms', table_name='drug_dosages')
+    op.drop_index('ix_drug_dosages_normalized_name_trgm', table_name='drug_dosages')
+    op.drop_index('ix_drug_dosages_normalized_name', table_name='drug_dosages')
+    op.drop_index(op.f('ix_drug_dosages_document_id'), table_name='drug_dosages')
+    op.drop_index(op.f('ix_drug_dosages_id'), table_name='drug_dosages')
+    op.drop_table('drug_dosages')
@@ -0,0 +1,39 @@
+"""Add prescription search_vector
+
+Revision ID: 5d2e8a4c6b19
+Revises: 3c7d9f1a5e64
+Create Date: 2026-10-19 17:20:33.108462
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e8a4c6b19'
+down_revision: Union[str, None] = '3c7d9f1a5e64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english'::regconfig, coalesce(medication, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(diagnosis, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(observations, '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(treatment_plan, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    # Adding a stored generated column rewrites the table under an exclusive lock: run it off-peak
+    op.add_column('prescriptions', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(SEARCH_DOCUMENT, persisted=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_prescriptions_search_vector', 'prescriptions', ['search_vector'], postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_prescriptions_search_vector', table_name='prescriptions', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('prescriptions', 'search_vector')
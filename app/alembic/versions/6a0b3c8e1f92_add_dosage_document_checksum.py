@@ -0,0 +1,28 @@
+"""Add checksum to dosage_documents
+
+Revision ID: 6a0b3c8e1f92
+Revises: 2f6c9e0d4a58
+Create Date: 2026-10-19 13:55:12.904127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a0b3c8e1f92'
+down_revision: Union[str, None] = '2f6c9e0d4a58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('dosage_documents', sa.Column('checksum', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_dosage_documents_checksum'), 'dosage_documents', ['checksum'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_dosage_documents_checksum'), table_name='dosage_documents')
+    op.drop_column('dosage_documents', 'checksum')
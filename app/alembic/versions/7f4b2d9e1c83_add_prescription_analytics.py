@@ -0,0 +1,65 @@
+"""Add prescription analytics aggregates
+
+Revision ID: 7f4b2d9e1c83
+Revises: 5d2e8a4c6b19
+Create Date: 2026-10-19 18:05:12.447913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f4b2d9e1c83'
+down_revision: Union[str, None] = '5d2e8a4c6b19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Indexes on the large prescriptions table, built without blocking writes
+PRESCRIPTION_INDEXES = [
+    ('ix_prescriptions_updated_at', ['updated_at']),
+    ('ix_prescriptions_created_at', ['created_at']),
+]
+
+
+def upgrade() -> None:
+    op.create_table('prescription_daily_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('hospital_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=True),
+    sa.Column('diseases_type', postgresql.ENUM('COMMUNICABLE', 'NON_COMMUNICABLE', name='disease_type_enum', create_type=False), nullable=True),
+    sa.Column('medication', sa.String(), nullable=False),
+    sa.Column('prescriptions', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['hospital_id'], ['hospitals.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_prescription_daily_stats_hospital_id_day', 'prescription_daily_stats', ['hospital_id', 'day'], unique=False)
+    op.create_table('analytics_watermarks',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('value', sa.DateTime(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('analytics_dirty_days',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('hospital_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.get_context().autocommit_block():
+        for name, columns in PRESCRIPTION_INDEXES:
+            op.create_index(name, 'prescriptions', columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in PRESCRIPTION_INDEXES:
+            op.drop_index(name, table_name='prescriptions', postgresql_concurrently=True, if_exists=True)
+    op.drop_table('analytics_dirty_days')
+    op.drop_table('analytics_watermarks')
+    op.drop_index('ix_prescription_daily_stats_hospital_id_day', table_name='prescription_daily_stats')
+    op.drop_table('prescription_daily_stats')
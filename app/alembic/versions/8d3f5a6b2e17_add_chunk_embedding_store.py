@@ -0,0 +1,50 @@
+"""Add content-addressed chunk embedding store
+
+Revision ID: 8d3f5a6b2e17
+Revises: 4b1e7d2a9c31
+Create Date: 2026-10-19 11:03:27.554190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d3f5a6b2e17'
+down_revision: Union[str, None] = '4b1e7d2a9c31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'chunk_embeddings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('embedding_model', sa.String(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('embedding', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('content_hash', 'embedding_model', name='uq_chunk_embeddings_hash_model')
+    )
+    op.create_index(op.f('ix_chunk_embeddings_id'), 'chunk_embeddings', ['id'], unique=False)
+    op.create_table(
+        'dosage_document_chunks',
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('chunk_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['chunk_id'], ['chunk_embeddings.id']),
+        sa.ForeignKeyConstraint(['document_id'], ['dosage_documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('document_id', 'position')
+    )
+    op.create_index(op.f('ix_dosage_document_chunks_chunk_id'), 'dosage_document_chunks', ['chunk_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_dosage_document_chunks_chunk_id'), table_name='dosage_document_chunks')
+    op.drop_table('dosage_document_chunks')
+    op.drop_index(op.f('ix_chunk_embeddings_id'), table_name='chunk_embeddings')
+    op.drop_table('chunk_embeddings')
@@ -0,0 +1,60 @@
+"""Add principal_lookup
+
+Revision ID: 9e4a1c7b3d25
+Revises: 6a0b3c8e1f92
+Create Date: 2026-10-19 15:02:41.318254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4a1c7b3d25'
+down_revision: Union[str, None] = '6a0b3c8e1f92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('principal_lookup',
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('user_type', sa.String(), nullable=False),
+    sa.Column('role', sa.String(), nullable=False),
+    sa.Column('hospital_id', sa.Integer(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=True),
+    sa.Column('admin_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['admin_id'], ['admins.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('email'),
+    sa.UniqueConstraint('doctor_id'),
+    sa.UniqueConstraint('admin_id')
+    )
+    # Emails used by more than one doctor or admin, in any letter case, can only log in one of them from now on
+    collisions = op.get_bind().execute(sa.text(
+        "SELECT lower(email), string_agg(user_type || ' ' || id, ', ' ORDER BY user_type DESC, id) "
+        "FROM (SELECT 'doctor' AS user_type, id, email FROM doctors "
+        "      UNION ALL SELECT 'admin', id, email FROM admins) AS accounts "
+        "GROUP BY lower(email) HAVING count(*) > 1"
+    )).all()
+    for email, accounts in collisions:
+        print(f"principal_lookup: {email} is shared by {accounts}; only the first can log in until the others get another email")
+
+    # Doctors are inserted first so they keep precedence if an email exists in both tables,
+    # matching the order login used to check them in
+    op.execute(
+        "INSERT INTO principal_lookup (email, user_type, role, hospital_id, doctor_id) "
+        "SELECT lower(email), 'doctor', role, hospital_id, id FROM doctors ORDER BY id "
+        "ON CONFLICT (email) DO NOTHING"
+    )
+    op.execute(
+        "INSERT INTO principal_lookup (email, user_type, role, hospital_id, admin_id) "
+        "SELECT lower(email), 'admin', role, hospital_id, id FROM admins ORDER BY id "
+        "ON CONFLICT (email) DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('principal_lookup')
@@ -2,21 +2,118 @@ from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from models import Doctor, Admin
-from sqlalchemy.orm import Session
+from dataclasses import dataclass
+from models import Doctor, Admin, PrincipalLookup
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from typing import Union
+from utils.hashing import hash_executor, HashingSaturated
+import os
+import threading
+import time
 
 SECRET_KEY = "aiplanettask1234"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# How long a resolved principal is trusted before it is re-read from the database
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# bcrypt cost factor; tune against the password_hash_seconds metric. Existing hashes keep their own cost
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Seconds a client is asked to wait before retrying when the hashing queue is full
+HASH_RETRY_AFTER_SECONDS = 2
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+# Stored for accounts whose password is not set yet (e.g. bulk imported doctors); matches no password
+UNUSABLE_PASSWORD_HASH = "!"
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user, as needed by the routes (no ORM session attached)."""
+    id: int
+    email: str
+    name: str
+    role: str
+    hospital_id: int
+    user_type: str  # "doctor" or "admin": the table `id` refers to
+
+class PrincipalCache:
+    """Per-worker TTL cache of principals keyed by (user_type, id)."""
+
+    def __init__(self, ttl: int = PRINCIPAL_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_type: str, user_id: int):
+        with self._lock:
+            entry = self._entries.get((user_type, user_id))
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[(user_type, user_id)]
+                return None
+            return entry[1]
+
+    def set(self, principal: Principal):
+        with self._lock:
+            self._entries[(principal.user_type, principal.id)] = (time.monotonic() + self.ttl, principal)
+
+    def invalidate(self, user_type: str, user_id: int):
+        with self._lock:
+            self._entries.pop((user_type, user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+principal_cache = PrincipalCache()
+
+def invalidate_principal(user_type: str, user_id: int):
+    """Drop a cached principal after the user was updated or deleted."""
+    principal_cache.invalidate(user_type, user_id)
+
+def user_type_of(user) -> str:
+    return "doctor" if isinstance(user, Doctor) else "admin"
+
+def principal_from_user(user) -> Principal:
+    return Principal(
+        id=user.id,
+        email=user.email,
+        name=user.name,
+        role=user.role,
+        hospital_id=user.hospital_id,
+        user_type=user_type_of(user),
+    )
+
+def hashing_unavailable_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, please retry shortly",
+        headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)},
+    )
+
+async def verify_password_async(plain_password, hashed_password):
+    if hashed_password == UNUSABLE_PASSWORD_HASH:
+        return False
+    try:
+        return await hash_executor.run_async("verify", pwd_context.verify, plain_password, hashed_password)
+    except HashingSaturated:
+        raise hashing_unavailable_exception()
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    try:
+        return hash_executor.run("hash", pwd_context.hash, password)
+    except HashingSaturated:
+        raise hashing_unavailable_exception()
+
+async def get_password_hash_async(password):
+    try:
+        return await hash_executor.run_async("hash", pwd_context.hash, password)
+    except HashingSaturated:
+        raise hashing_unavailable_exception()
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -24,38 +121,140 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def authenticate_user(email: str, password: str, db_session: Session):
-    # Check if the user exists in any role (Doctor, Admin, etc.)
-    user = db_session.query(Doctor).filter(Doctor.email == email).first()
-    if not user:
-        user = db_session.query(Admin).filter(Admin.email == email).first()
-    if user and verify_password(password, user.hashed_password):
+def principal_claims(user) -> dict:
+    """Claims that let get_current_user resolve the user without looking it up by email."""
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "user_type": user_type_of(user),
+        "role": user.role,
+        "hospital_id": user.hospital_id,
+    }
+
+def principal_lookup_query(email: str):
+    """
+    Select the principal_lookup row for an email, with the doctor or admin and its hospital,
+    so a user of any type is found with one indexed query.
+    """
+    return (
+        select(PrincipalLookup)
+        .options(
+            joinedload(PrincipalLookup.doctor).joinedload(Doctor.hospital),
+            joinedload(PrincipalLookup.admin).joinedload(Admin.hospital),
+        )
+        .where(PrincipalLookup.email == email.lower())
+    )
+
+async def email_registered(db: AsyncSession, email: str, exclude: tuple = None) -> bool:
+    """
+    Check whether a doctor or admin already uses an email, in any letter case.
+    principal_lookup is keyed on the lower-cased email of both, so a shared email would fail the insert.
+    :param exclude: (user_type, id) of the user being updated, whose own email doesn't count
+    """
+    lookup = await db.scalar(select(PrincipalLookup).where(PrincipalLookup.email == email.lower()))
+    if lookup is None:
+        return False
+    if exclude is not None:
+        user_type, user_id = exclude
+        return (lookup.user_type, lookup.doctor_id if user_type == "doctor" else lookup.admin_id) != (user_type, user_id)
+    return True
+
+def email_taken_exception():
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+
+async def authenticate_user(email: str, password: str, db: AsyncSession):
+    """
+    Find the doctor or admin with this email and check the password.
+    bcrypt runs on the hashing workers and is awaited, so a burst of logins holds no threadpool threads.
+    :return: The user, or None if the email or password is wrong
+    """
+    lookup = await db.scalar(principal_lookup_query(email))
+    user = lookup.user if lookup else None
+    if user and await verify_password_async(password, user.hashed_password):
         return user
     return None
 
-def get_current_user(token: str, db: Session, role: Union[str, None] = None):
-    credentials_exception = HTTPException(
+def _principal_lookup(payload: dict):
+    """
+    Work out how to resolve a token payload.
+    :return: ("cached", Principal), ("id", model, id), ("email", email) or None for an invalid payload
+    """
+    user_id = payload.get("uid")
+    user_type = payload.get("user_type")
+    if user_id is not None and user_type in ("doctor", "admin"):
+        principal = principal_cache.get(user_type, user_id)
+        if principal is not None:
+            return ("cached", principal)
+        return ("id", Doctor if user_type == "doctor" else Admin, user_id)
+    # Tokens issued before the id claims were added
+    email = payload.get("sub")
+    return ("email", email) if email is not None else None
+
+def _cache_user(user):
+    if user is None:
+        return None
+    principal = principal_from_user(user)
+    principal_cache.set(principal)
+    return principal
+
+def resolve_principal(payload: dict, db: Session):
+    """
+    Resolve the token payload to a Principal, from the cache when possible.
+    :return: Principal, or None if the user no longer exists
+    """
+    lookup = _principal_lookup(payload)
+    if lookup is None:
+        return None
+    if lookup[0] == "cached":
+        return lookup[1]
+    if lookup[0] == "id":
+        return _cache_user(db.get(lookup[1], lookup[2]))
+    row = db.scalar(principal_lookup_query(lookup[1]))
+    return _cache_user(row.user) if row else None
+
+async def resolve_principal_async(payload: dict, db: AsyncSession):
+    """Same as resolve_principal, for an AsyncSession."""
+    lookup = _principal_lookup(payload)
+    if lookup is None:
+        return None
+    if lookup[0] == "cached":
+        return lookup[1]
+    if lookup[0] == "id":
+        return _cache_user(await db.get(lookup[1], lookup[2]))
+    row = await db.scalar(principal_lookup_query(lookup[1]))
+    return _cache_user(row.user) if row else None
+
+def decode_token(token: str) -> dict:
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception()
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        # Checking if the user exists in multiple roles (Doctor, Admin, etc.)
-        user = db.query(Doctor).filter(Doctor.email == email).first() or db.query(Admin).filter(Admin.email == email).first()
-        if user is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
 
+def check_role(user, role: Union[str, None]):
     # If a role is specified, check that the user's role matches
     if role and user.role != role:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Not authorized as {role}",
         )
-    
+
+def get_current_user(token: str, db: Session, role: Union[str, None] = None):
+    user = resolve_principal(decode_token(token), db)
+    if user is None:
+        raise credentials_exception()
+    check_role(user, role)
+    return user
+
+async def get_current_user_async(token: str, db: AsyncSession, role: Union[str, None] = None):
+    user = await resolve_principal_async(decode_token(token), db)
+    if user is None:
+        raise credentials_exception()
+    check_role(user, role)
     return user
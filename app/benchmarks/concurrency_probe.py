@@ -0,0 +1,61 @@
+"""
+Measure how throughput of one endpoint scales with the number of concurrent clients.
+
+Point it at a running server (ideally a single uvicorn worker) with a valid token:
+    python -m benchmarks.concurrency_probe --url http://localhost:8000/api/patients/ --token $TOKEN --levels 1 4 16 64
+
+With blocking database calls inside `async def` routes, req/s stays flat as concurrency grows;
+with the async session it should keep rising until the database or CPU saturates.
+"""
+import argparse
+import asyncio
+import time
+import httpx
+
+async def run_level(url: str, token: str, concurrency: int, requests_per_client: int) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    errors = 0
+
+    async def client_loop(client):
+        nonlocal errors
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "req_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Throughput of one endpoint at increasing concurrency")
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--token", required=True, help="Bearer token with access to the endpoint")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=50, help="Requests per client at each level")
+    args = parser.parse_args()
+
+    for level in args.levels:
+        result = await run_level(args.url, args.token, level, args.requests)
+        print(
+            f"concurrency={result['concurrency']:>4}  req/s={result['req_per_sec']:>8}  "
+            f"p50={result['p50_ms']}ms  p95={result['p95_ms']}ms  errors={result['errors']}"
+        )
+
+if __name__ == "__main__":
+    asyncio.run(main())
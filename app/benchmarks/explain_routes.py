@@ -0,0 +1,179 @@
+"""
+EXPLAIN ANALYZE of the queries behind the list, dashboard and login routes, without and with the hot path indexes.
+
+Needs Postgres, configured with the usual POSTGRES_* settings. Use a scratch database: --seed bulk inserts a
+synthetic dataset with plain SQL (no principal_lookup rows, so the seeded users can't log in), and the "before"
+plans are taken in a transaction that drops the indexes and is rolled back, holding exclusive locks meanwhile.
+
+Run from the app directory, after `alembic upgrade head`:
+    python -m benchmarks.explain_routes --seed --patients 200000 --prescriptions-per-patient 5
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+from db import engine
+from models import Admin, Doctor, Patient, Prescription, StressLog, EmpaticaIotData
+
+# Created by the 3c7d9f1a5e64 migration
+HOT_PATH_INDEXES = [
+    "ix_admins_hospital_id_id",
+    "ix_doctors_hospital_id_id",
+    "ix_patients_hospital_id_id",
+    "ix_prescriptions_patient_id_id",
+    "ix_prescriptions_doctor_id",
+    "ix_stress_logs_timestamp",
+    "ix_stress_logs_doctor_id_timestamp",
+    "ix_empatica_iot_data_doctor_id_timestamp",
+]
+
+PAGE = 51  # Default page size plus the row that detects a next page
+
+SEED_STATEMENTS = [
+    """
+    INSERT INTO hospitals (name, location)
+    SELECT 'Benchmark hospital ' || g || ' ' || md5(random()::text), 'Nairobi' FROM generate_series(1, :hospitals) g
+    """,
+    """
+    INSERT INTO doctors (name, email, specialty, role, hashed_password, is_temporary_password, hospital_id)
+    SELECT 'Doctor ' || g, 'doctor' || g || '.' || md5(random()::text) || '@example.com', 'General Medicine', 'doctor', 'x', false,
+           h.ids[1 + g % cardinality(h.ids)]
+    FROM generate_series(1, :doctors) g, (SELECT array_agg(id) AS ids FROM hospitals) h
+    """,
+    """
+    INSERT INTO admins (name, email, role, hashed_password, is_temporary_password, hospital_id)
+    SELECT 'Admin ' || g, 'admin' || g || '.' || md5(random()::text) || '@example.com', 'admin', 'x', false,
+           h.ids[1 + g % cardinality(h.ids)]
+    FROM generate_series(1, :hospitals * 3) g, (SELECT array_agg(id) AS ids FROM hospitals) h
+    """,
+    """
+    INSERT INTO patients (name, email, hospital_id)
+    SELECT 'Patient ' || g, 'patient' || g || '.' || md5(random()::text) || '@example.com', h.ids[1 + g % cardinality(h.ids)]
+    FROM generate_series(1, :patients) g, (SELECT array_agg(id) AS ids FROM hospitals) h
+    """,
+    """
+    INSERT INTO prescriptions (patient_id, doctor_id, medication, dosage, diagnosis, diseases_type, created_at, updated_at)
+    SELECT p.ids[1 + g % cardinality(p.ids)], d.ids[1 + g % cardinality(d.ids)], 'Amoxicillin 500mg', '1 capsule tds',
+           'Upper respiratory tract infection',
+           (CASE WHEN g % 2 = 0 THEN 'COMMUNICABLE' ELSE 'NON_COMMUNICABLE' END)::disease_type_enum,
+           now() - (g % 365) * interval '1 day', now() - (g % 365) * interval '1 day'
+    FROM generate_series(1, :patients * :prescriptions_per_patient) g,
+         (SELECT array_agg(id) AS ids FROM patients) p, (SELECT array_agg(id) AS ids FROM doctors) d
+    """,
+    """
+    INSERT INTO stress_logs (doctor_id, doctor_name, stress_level, timestamp)
+    SELECT d.ids[1 + g % cardinality(d.ids)], 'Doctor', (ARRAY['low', 'medium', 'high'])[1 + g % 3],
+           now() - random() * interval '90 days'
+    FROM generate_series(1, :doctors * 90) g, (SELECT array_agg(id) AS ids FROM doctors) d
+    """,
+    """
+    INSERT INTO empatica_iot_data (doctor_id, x, y, z, eda, heart_rate, temperature, time_of_day, day_of_week, timestamp)
+    SELECT d.ids[1 + g % cardinality(d.ids)], random(), random(), random(), random() * 10, 60 + random() * 60,
+           33 + random() * 4, 'morning', 'monday', now() - random() * interval '30 days'
+    FROM generate_series(1, :iot_rows) g, (SELECT array_agg(id) AS ids FROM doctors) d
+    """,
+]
+
+def seed(conn, args):
+    params = {
+        "hospitals": args.hospitals,
+        "doctors": args.doctors,
+        "patients": args.patients,
+        "prescriptions_per_patient": args.prescriptions_per_patient,
+        "iot_rows": args.iot_rows,
+    }
+    for statement in SEED_STATEMENTS:
+        conn.execute(text(statement), params)
+    for table in ("hospitals", "doctors", "admins", "patients", "prescriptions", "stress_logs", "empatica_iot_data"):
+        conn.execute(text(f"ANALYZE {table}"))
+
+def busiest(conn, sql: str):
+    return conn.execute(text(sql)).scalar()
+
+def route_queries(conn) -> dict:
+    """The statements each route runs, with parameters taken from the largest hospital, patient and doctor."""
+    hospital_id = busiest(conn, "SELECT hospital_id FROM patients GROUP BY 1 ORDER BY count(*) DESC LIMIT 1")
+    patient_id = busiest(conn, "SELECT patient_id FROM prescriptions GROUP BY 1 ORDER BY count(*) DESC LIMIT 1")
+    doctor_id = busiest(conn, "SELECT doctor_id FROM empatica_iot_data GROUP BY 1 ORDER BY count(*) DESC LIMIT 1")
+    page_of_patients = select(Patient.id).where(Patient.hospital_id == hospital_id).order_by(Patient.id).limit(PAGE - 1)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        "GET /api/patients/": select(Patient).where(Patient.hospital_id == hospital_id).order_by(Patient.id).limit(PAGE),
+        "GET /api/patients/ (doctor: prescriptions of the page)": select(Prescription).where(
+            Prescription.patient_id.in_(list(conn.execute(page_of_patients).scalars()))
+        ),
+        "GET /api/doctors/": select(Doctor).where(Doctor.hospital_id == hospital_id).order_by(Doctor.id).limit(PAGE),
+        "GET /api/admins/?hospital_id=": select(Admin).where(Admin.hospital_id == hospital_id).order_by(Admin.id).limit(PAGE),
+        "GET /api/prescriptions/{patient_id}": select(Prescription)
+            .where(Prescription.patient_id == patient_id).order_by(Prescription.id).limit(PAGE),
+        "GET /api/prescriptions/{patient_id}?doctor_id=": select(Prescription)
+            .where(Prescription.patient_id == patient_id, Prescription.doctor_id == doctor_id).order_by(Prescription.id).limit(PAGE),
+        "DELETE /api/delete-doctor/ (foreign key check)": select(Prescription.id).where(Prescription.doctor_id == doctor_id).limit(1),
+        "GET /api/stress-logs-today/": select(StressLog).join(Doctor).where(
+            Doctor.hospital_id == hospital_id,
+            StressLog.timestamp >= today,
+            StressLog.timestamp < today + timedelta(days=1),
+        ),
+        "POST /api/login (doctor's latest readings)": select(EmpaticaIotData)
+            .filter_by(doctor_id=doctor_id).order_by(EmpaticaIotData.timestamp.desc()).limit(5),
+    }
+
+def scans(plan: dict) -> list:
+    """Scan nodes of a plan, e.g. 'Seq Scan on prescriptions' or 'Index Scan using ix_... on prescriptions'."""
+    found = []
+    if "Relation Name" in plan:
+        using = f" using {plan['Index Name']}" if "Index Name" in plan else ""
+        found.append(f"{plan['Node Type']}{using} on {plan['Relation Name']}")
+    for child in plan.get("Plans", []):
+        found += scans(child)
+    return found
+
+def explain(conn, statement) -> dict:
+    sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    result = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")).scalar()
+    result = result if isinstance(result, list) else json.loads(result)
+    return {"execution_ms": round(result[0]["Execution Time"], 3), "scans": scans(result[0]["Plan"])}
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE of route queries without and with the hot path indexes")
+    parser.add_argument("--seed", action="store_true", help="Insert a synthetic dataset first")
+    parser.add_argument("--hospitals", type=int, default=20)
+    parser.add_argument("--doctors", type=int, default=2000)
+    parser.add_argument("--patients", type=int, default=200000)
+    parser.add_argument("--prescriptions-per-patient", type=int, default=5)
+    parser.add_argument("--iot-rows", type=int, default=2000000)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    if args.seed:
+        with engine.begin() as conn:
+            seed(conn, args)
+
+    report = {}
+    with engine.connect() as conn:
+        queries = route_queries(conn)
+        conn.rollback()
+
+        # Before: drop the indexes inside a transaction that is rolled back afterwards
+        with conn.begin() as transaction:
+            for name in HOT_PATH_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            for route, statement in queries.items():
+                report[route] = {"before": explain(conn, statement)}
+            transaction.rollback()
+
+        with conn.begin():
+            for route, statement in queries.items():
+                report[route]["after"] = explain(conn, statement)
+
+    for route, plans in report.items():
+        print(route)
+        for label in ("before", "after"):
+            print(f"  {label:>6}: {plans[label]['execution_ms']:>10} ms  {'; '.join(plans[label]['scans'])}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+if __name__ == "__main__":
+    main()
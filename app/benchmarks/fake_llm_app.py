@@ -0,0 +1,30 @@
+"""
+The API with the OpenAI clients replaced by fakes, as served by the load test harness:
+    uvicorn benchmarks.fake_llm_app:app
+
+Completions take FAKE_LLM_LATENCY_SECONDS on average, spread like real upstream calls, so dosage queries hold a
+worker thread as long as they would in production without calling (or paying for) the API.
+"""
+import math
+import os
+import random
+import time
+from langchain_core.messages import AIMessage
+import utils.RAG.query_handler as query_handler
+from benchmarks.fakes import HashingEmbeddings
+
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0.8"))
+
+class FakeChatModel:
+    def __init__(self, model: str = None, **kwargs):
+        self.model = model
+
+    def invoke(self, messages):
+        # Log-normal around the mean: most completions close to it, a few much slower
+        time.sleep(random.lognormvariate(math.log(FAKE_LLM_LATENCY_SECONDS), 0.3))
+        return AIMessage(content="Fake completion: see the KNMF dosage tables for this drug.")
+
+query_handler.default_llm = FakeChatModel
+query_handler.default_embeddings = HashingEmbeddings
+
+from main import app  # noqa: E402  (imported after the fakes are in place)
@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+FIXTURE_PATH = Path(__file__).resolve().parent / "knmf_fixture.json"
+
+LINES_PER_PAGE = 60
+
+def load_fixture():
+    """Monographs and labelled questions of the benchmark formulary."""
+    with open(FIXTURE_PATH) as fixture:
+        return json.load(fixture)
+
+def monograph_lines(monograph: dict, reference: int):
+    lines = [
+        monograph["drug"],
+        monograph["forms"],
+        f"Indications: {monograph['indications']}",
+        f"Cautions: {monograph['cautions']}",
+        "Dose:",
+        *monograph["doses"],
+        f"Side-effects: {monograph['side_effects']}",
+        # Keeps repeated copies of a monograph textually distinct
+        f"Notes: KNMF monograph reference {reference}.",
+        "",
+    ]
+    return lines
+
+def formulary_lines(copies: int = 1):
+    monographs = load_fixture()["monographs"]
+    lines = []
+    for copy in range(copies):
+        for index, monograph in enumerate(monographs):
+            lines += monograph_lines(monograph, copy * len(monographs) + index + 1)
+    return lines
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: str, lines: list, lines_per_page: int = LINES_PER_PAGE) -> int:
+    """
+    Write plain text lines to a minimal Helvetica PDF that pdfplumber can read.
+    :return: Number of pages written
+    """
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for page in pages:
+        text = "".join(f"({_escape(line)}) Tj T* " for line in page)
+        stream = f"BT /F1 10 Tf 12 TL 50 780 Td {text}ET".encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as pdf:
+        pdf.write(output)
+    return len(pages)
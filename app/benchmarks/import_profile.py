@@ -0,0 +1,80 @@
+"""
+Import time of the API: what every uvicorn worker pays before it can serve a request.
+
+Imports main in fresh interpreters with `python -X importtime` and reports the best run. The report has the total,
+the slowest top-level packages, and which of the heavy packages (pandas, xgboost, langchain, ...) were imported.
+With --against, a git revision is profiled the same way in a temporary worktree, to show the difference:
+    python -m benchmarks.import_profile --against HEAD~1
+
+Run from the app directory with the usual POSTGRES_* settings. Revisions that touch the database at import time
+also need it to be reachable.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+HEAVY_PACKAGES = ["pandas", "sklearn", "xgboost", "langchain", "langchain_community", "langchain_openai", "pdfplumber", "tiktoken", "faiss"]
+PROBE = f"import sys, main; print(' '.join(name for name in {HEAVY_PACKAGES!r} if name in sys.modules))"
+
+def parse_importtime(stderr: str):
+    """
+    :return: Cumulative seconds of `import main`, and the seconds spent importing each top-level package
+    """
+    total = 0.0
+    packages = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        # Self times add up without counting nested imports twice
+        packages[name.strip().split(".")[0]] += int(own) / 1e6
+        if name.strip() == "main":
+            total = int(cumulative) / 1e6
+    return total, packages
+
+def profile(app_dir: str, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], cwd=app_dir, capture_output=True, text=True)
+        if result.returncode:
+            raise RuntimeError(f"Importing main failed in {app_dir}:\n{result.stderr[-3000:]}")
+        total, packages = parse_importtime(result.stderr)
+        if best is None or total < best["total"]:
+            best = {"total": total, "packages": packages, "heavy": result.stdout.split()}
+    return best
+
+def print_profile(label: str, result: dict, top: int):
+    print(f"\n{label}: import main {result['total']:.2f}s")
+    print(f"  heavy packages imported: {', '.join(result['heavy']) or 'none'}")
+    for name, seconds in sorted(result["packages"].items(), key=lambda item: -item[1])[:top]:
+        print(f"  {name:<40} {seconds:>6.2f}s")
+
+def profile_revision(revision: str, repeat: int) -> dict:
+    prefix = subprocess.run(["git", "rev-parse", "--show-prefix"], capture_output=True, text=True, check=True).stdout.strip()
+    worktree = tempfile.mkdtemp(prefix="import_profile_")
+    subprocess.run(["git", "worktree", "add", "--detach", worktree, revision], capture_output=True, check=True)
+    try:
+        return profile(os.path.join(worktree, prefix), repeat)
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", worktree], capture_output=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import time of the API")
+    parser.add_argument("--against", help="Git revision to compare with, e.g. HEAD~1")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per tree; the fastest is reported")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages listed")
+    args = parser.parse_args()
+
+    current = profile(".", args.repeat)
+    print_profile("This tree", current, args.top)
+    if args.against:
+        previous = profile_revision(args.against, args.repeat)
+        print_profile(args.against, previous, args.top)
+        saved = previous["total"] - current["total"]
+        print(f"\nStartup saved per worker: {saved:.2f}s ({saved / previous['total']:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+End-to-end load test of the API, with a baseline to catch performance regressions.
+
+Creates a scratch database on the configured Postgres server and seeds it with benchmarks.synthetic_data plus a few
+drug index entries. Then it serves benchmarks.fake_llm_app (the app with OpenAI faked) with uvicorn and replays two phases:
+  1. shift change: every virtual doctor logs in at the same moment;
+  2. steady state: the doctors stream wearable readings, list, create, edit, delete and search prescriptions,
+     and ask dosage questions, some answered from the drug index and some by the (fake) LLM.
+It reports requests/s and p50/p95/p99 latency per route. Against a stored baseline, the run fails (exit status 1)
+when a phase's throughput drops, or a route's p95 or error rate rises, by more than --tolerance.
+
+Run from the app directory with the usual POSTGRES_* settings; the user must be allowed to create databases:
+    python -m benchmarks.load_test --users 50 --duration 60 --baseline benchmarks/load_baseline.json
+    python -m benchmarks.load_test --users 50 --duration 60 --save-baseline benchmarks/load_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+import httpx
+import numpy as np
+from sqlalchemy import create_engine, insert, select, text
+from db import Base
+from models import Admin, DosageDocument, DrugDosage
+from utils.RAG.drug_index import normalize_name
+from benchmarks import synthetic_data
+
+PASSWORD = "LoadTestPassword1"
+# Routes with fewer requests than this are reported but never fail the comparison
+MIN_SAMPLES = 20
+
+# (drug, population, dose, indication) rows of the drug index
+DRUG_INDEX = [
+    ("Amoxicillin", "Adult", "500 mg every 8 hours for 5 to 7 days", "Bacterial infections"),
+    ("Amoxicillin", "Child 1-5 years", "125 mg every 8 hours", "Bacterial infections"),
+    ("Metformin", "Adult", "500 mg twice daily, increased gradually to a maximum of 2 g daily", "Type 2 diabetes"),
+    ("Paracetamol", "Adult", "1 g every 4 to 6 hours, maximum 4 g daily", "Pain and fever"),
+    ("Artemether/Lumefantrine", "Adult", "4 tablets twice daily for 3 days", "Uncomplicated malaria"),
+]
+DOSAGE_INDEX_QUESTIONS = [
+    "What is the dose of amoxicillin for adults?",
+    "Paracetamol dosage for adult",
+    "Dose of metformin",
+]
+DOSAGE_LLM_QUESTIONS = [
+    "How should antiretroviral therapy be adjusted during tuberculosis treatment?",
+    "Which antihypertensives are preferred in pregnancy?",
+    "What are the interactions between rifampicin and oral contraceptives?",
+]
+
+def database_url(database: str) -> str:
+    return (
+        f"postgresql://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}"
+        f"@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{database}"
+    )
+
+def recreate_database(name: str, drop_only: bool = False):
+    engine = create_engine(database_url("postgres"), isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+        if not drop_only:
+            conn.execute(text(f'CREATE DATABASE "{name}"'))
+    engine.dispose()
+
+def seed(name: str, args) -> list:
+    """
+    Create the tables and load the dataset.
+    :return: Emails of the seeded doctors
+    """
+    engine = create_engine(database_url(name))
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    Base.metadata.create_all(bind=engine)
+
+    dataset = synthetic_data.build_parser().parse_args([
+        "--hospitals", str(args.hospitals),
+        "--doctors", str(args.doctors),
+        "--patients", str(args.patients),
+        "--prescriptions-per-patient", str(args.prescriptions_per_patient),
+        # A day of readings per doctor: doctor logins classify stress from the latest ones
+        "--iot-doctors", str(args.doctors),
+        "--iot-days", "1",
+        "--iot-hz", str(1 / 300),
+        "--password", PASSWORD,
+        "--seed", str(args.seed),
+    ])
+    connection = engine.raw_connection()
+    try:
+        synthetic_data.load(connection, dataset)
+    finally:
+        connection.close()
+
+    with engine.begin() as conn:
+        admin_id = conn.execute(select(Admin.id).order_by(Admin.id).limit(1)).scalar()
+        document_id = conn.execute(
+            insert(DosageDocument)
+            .values(title="KNMF (load test)", content="", edition="load test", uploaded_by=admin_id)
+            .returning(DosageDocument.id)
+        ).scalar()
+        conn.execute(insert(DrugDosage), [
+            {
+                "document_id": document_id,
+                "drug_name": drug,
+                "normalized_name": normalize_name(drug),
+                "synonyms": [],
+                "indication": indication,
+                "population": population,
+                "dose_text": dose,
+            }
+            for drug, population, dose, indication in DRUG_INDEX
+        ])
+        emails = conn.execute(text("SELECT email FROM doctors ORDER BY id")).scalars().all()
+    engine.dispose()
+    return emails
+
+def start_server(args, database: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "POSTGRES_DB": database,
+        "POSTGRES_REPLICA_HOST": "",
+        "FAISS_INDEX_ROOT": tempfile.mkdtemp(prefix="load_test_faiss_"),
+        "FAKE_LLM_LATENCY_SECONDS": str(args.llm_latency),
+    }
+    server = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "benchmarks.fake_llm_app:app",
+        "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning",
+    ], env=env)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The API exited during startup with status {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/", timeout=1).status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("The API did not start within 120s")
+
+class Recorder:
+    """Latency of every request of a phase, by route."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = time.perf_counter()
+        self.finished = None
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        self.latencies[route].append(time.perf_counter() - started)
+        if response is None or response.status_code >= 400:
+            self.errors[route] += 1
+            return None
+        return response
+
+    def summary(self) -> dict:
+        duration = (self.finished or time.perf_counter()) - self.started
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            routes[route] = {
+                "count": len(latencies),
+                "errors": self.errors[route],
+                "rps": round(len(latencies) / duration, 2),
+                "p50_ms": round(p50, 1),
+                "p95_ms": round(p95, 1),
+                "p99_ms": round(p99, 1),
+            }
+        requests = sum(len(latencies) for latencies in self.latencies.values())
+        return {"duration_s": round(duration, 2), "requests": requests, "rps": round(requests / duration, 2), "routes": routes}
+
+class VirtualDoctor:
+    def __init__(self, client: httpx.AsyncClient, email: str, rng: random.Random):
+        self.client = client
+        self.email = email
+        self.rng = rng
+        self.headers = None
+        self.patient_ids = []
+        self.prescription_ids = []
+
+    async def login(self, recorder: Recorder):
+        response = await recorder.request(
+            self.client, "POST /api/login", "POST", "/api/login", json={"email": self.email, "password": PASSWORD}
+        )
+        if response is not None:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def list_patients(self, recorder: Recorder):
+        response = await recorder.request(
+            self.client, "GET /api/patients/", "GET", "/api/patients/", params={"limit": 50}, headers=self.headers
+        )
+        if response is not None and not self.patient_ids:
+            self.patient_ids = [patient["id"] for patient in response.json()]
+
+    async def iot_ingest(self, recorder: Recorder):
+        await recorder.request(self.client, "POST /api/empatica-data/", "POST", "/api/empatica-data/", headers=self.headers, json={
+            "x": self.rng.gauss(0, 0.4), "y": self.rng.gauss(0, 0.4), "z": 1 + self.rng.gauss(0, 0.4),
+            "eda": self.rng.lognormvariate(0.5, 0.6), "hr": self.rng.gauss(75, 8), "temp": self.rng.gauss(33.5, 0.5),
+            "time_of_day": "morning", "day_of_week": "monday",
+        })
+
+    async def list_prescriptions(self, recorder: Recorder):
+        if self.patient_ids:
+            patient_id = self.rng.choice(self.patient_ids)
+            await recorder.request(self.client, "GET /api/prescriptions/{patient_id}", "GET", f"/api/prescriptions/{patient_id}", headers=self.headers)
+
+    async def create_prescription(self, recorder: Recorder):
+        if not self.patient_ids:
+            return
+        response = await recorder.request(
+            self.client, "POST /api/create-prescription/", "POST", "/api/create-prescription/",
+            params={"patient_id": self.rng.choice(self.patient_ids)}, headers=self.headers,
+            json={
+                "medication": "Amoxicillin 500mg",
+                "dosage": "1 capsule, 3 times a day for 7 days",
+                "observations": "Fever and productive cough for three days",
+                "diagnosis": "Acute bacterial infection",
+                "diseases_type": "communicable",
+                "treatment_plan": "Complete the full course.",
+            },
+        )
+        if response is not None:
+            self.prescription_ids.append(response.json()["id"])
+
+    async def update_prescription(self, recorder: Recorder):
+        if self.prescription_ids:
+            prescription_id = self.rng.choice(self.prescription_ids)
+            await recorder.request(
+                self.client, "PUT /api/update-prescription/{prescription_id}", "PUT", f"/api/update-prescription/{prescription_id}",
+                headers=self.headers, json={"doctor_notes": "Reviewed, continue treatment."},
+            )
+
+    async def delete_prescription(self, recorder: Recorder):
+        if self.prescription_ids:
+            prescription_id = self.prescription_ids.pop(self.rng.randrange(len(self.prescription_ids)))
+            await recorder.request(
+                self.client, "DELETE /api/delete-prescription/{prescription_id}", "DELETE", f"/api/delete-prescription/{prescription_id}",
+                headers=self.headers,
+            )
+
+    async def search_prescriptions(self, recorder: Recorder):
+        await recorder.request(
+            self.client, "GET /api/search-prescriptions/", "GET", "/api/search-prescriptions/",
+            params={"q": self.rng.choice(["amoxicillin", "malaria", "hypertension", "diabetes"])}, headers=self.headers,
+        )
+
+    async def dosage_query_drug_index(self, recorder: Recorder):
+        await recorder.request(
+            self.client, "POST /api/query-dosage/ (drug index)", "POST", "/api/query-dosage/",
+            headers=self.headers, json={"query": self.rng.choice(DOSAGE_INDEX_QUESTIONS)},
+        )
+
+    async def dosage_query_llm(self, recorder: Recorder):
+        await recorder.request(
+            self.client, "POST /api/query-dosage/ (LLM)", "POST", "/api/query-dosage/",
+            headers=self.headers, json={"query": self.rng.choice(DOSAGE_LLM_QUESTIONS)},
+        )
+
+# Steady state mix: (action, weight)
+STEADY_MIX = [
+    (VirtualDoctor.iot_ingest, 35),
+    (VirtualDoctor.list_prescriptions, 18),
+    (VirtualDoctor.list_patients, 8),
+    (VirtualDoctor.create_prescription, 10),
+    (VirtualDoctor.update_prescription, 7),
+    (VirtualDoctor.delete_prescription, 3),
+    (VirtualDoctor.search_prescriptions, 7),
+    (VirtualDoctor.dosage_query_drug_index, 6),
+    (VirtualDoctor.dosage_query_llm, 6),
+]
+
+async def steady_state(doctor: VirtualDoctor, recorder: Recorder, deadline: float, think_time: float):
+    actions, weights = zip(*STEADY_MIX)
+    await doctor.list_patients(recorder)
+    while time.perf_counter() < deadline:
+        await doctor.rng.choices(actions, weights)[0](doctor, recorder)
+        await asyncio.sleep(doctor.rng.expovariate(1 / think_time) if think_time else 0)
+
+async def run_load(args, emails: list) -> dict:
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=120) as client:
+        doctors = [VirtualDoctor(client, email, random.Random(args.seed + i)) for i, email in enumerate(emails[:args.users])]
+
+        shift_change = Recorder()
+        await asyncio.gather(*(doctor.login(shift_change) for doctor in doctors))
+        shift_change.finished = time.perf_counter()
+        doctors = [doctor for doctor in doctors if doctor.headers]
+
+        steady = Recorder()
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(*(steady_state(doctor, steady, deadline, args.think_time) for doctor in doctors))
+        steady.finished = time.perf_counter()
+    return {"shift_change": shift_change.summary(), "steady": steady.summary()}
+
+def compare(phases: dict, baseline: dict, tolerance: float) -> list:
+    """
+    :return: Descriptions of the regressions against the baseline report
+    """
+    failures = []
+    for phase, summary in phases.items():
+        base = baseline["phases"].get(phase)
+        if not base:
+            continue
+        if summary["rps"] < base["rps"] * (1 - tolerance):
+            failures.append(f"{phase}: {summary['rps']} req/s, baseline {base['rps']}")
+        for route, stats in summary["routes"].items():
+            base_stats = base["routes"].get(route)
+            if not base_stats or min(stats["count"], base_stats["count"]) < MIN_SAMPLES:
+                continue
+            if stats["p95_ms"] > base_stats["p95_ms"] * (1 + tolerance):
+                failures.append(f"{phase} {route}: p95 {stats['p95_ms']} ms, baseline {base_stats['p95_ms']} ms")
+            error_rate, base_error_rate = stats["errors"] / stats["count"], base_stats["errors"] / base_stats["count"]
+            if error_rate > base_error_rate + tolerance / 10:
+                failures.append(f"{phase} {route}: {error_rate:.1%} errors, baseline {base_error_rate:.1%}")
+    return failures
+
+def print_report(phases: dict):
+    for phase, summary in phases.items():
+        print(f"\n{phase}: {summary['requests']} requests in {summary['duration_s']}s, {summary['rps']} req/s")
+        print(f"  {'route':<52} {'count':>7} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for route, stats in summary["routes"].items():
+            print(
+                f"  {route:<52} {stats['count']:>7} {stats['errors']:>6} {stats['rps']:>8} "
+                f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}"
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API against a seeded scratch database")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent virtual doctors")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of steady state load")
+    parser.add_argument("--think-time", type=float, default=0.05, help="Mean pause between a doctor's requests, in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Mean seconds per fake LLM completion")
+    parser.add_argument("--hospitals", type=int, default=5)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--prescriptions-per-patient", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", default="dawachat_load_test", help="Scratch database, dropped and recreated")
+    parser.add_argument("--keep-database", action="store_true", help="Leave the scratch database for inspection")
+    parser.add_argument("--output", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Report to compare with: fail if this run is worse by more than --tolerance")
+    parser.add_argument("--save-baseline", help="Write the report as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression, e.g. 0.2 for 20%%")
+    args = parser.parse_args()
+    if args.users > args.doctors:
+        parser.error("--users can't exceed --doctors: each virtual user is a seeded doctor")
+
+    recreate_database(args.database)
+    try:
+        emails = seed(args.database, args)
+        server = start_server(args, args.database)
+        try:
+            phases = asyncio.run(run_load(args, emails))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    finally:
+        if not args.keep_database:
+            recreate_database(args.database, drop_only=True)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "save_baseline", "keep_database")}
+    report = {"config": config, "phases": phases}
+    print_report(phases)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as output:
+                json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["config"] != config:
+            print("\nWarning: the baseline was recorded with different settings:", baseline["config"])
+        failures = compare(phases, baseline, args.tolerance)
+        if failures:
+            print(f"\nRegressions beyond {args.tolerance:.0%} of the baseline:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of the baseline")
+
+if __name__ == "__main__":
+    main()
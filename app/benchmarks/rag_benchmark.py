@@ -0,0 +1,131 @@
+"""
+Offline benchmark of the dosage RAG pipeline.
+
+Ingests a generated fixture formulary through process_and_store_pdf_content and answers a labelled
+question set through get_dosage_info, using deterministic hashing embeddings, a fake chat model,
+an in-memory SQLite chunk store and a temporary FAISS collection root. No network calls are made
+once tiktoken's encoding files are cached (set TIKTOKEN_CACHE_DIR on air-gapped machines).
+
+Run from the app directory:
+    python -m benchmarks.rag_benchmark --copies 20 --repeat 5 --json rag_benchmark.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import pdfplumber
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db import Base
+from models import DosageDocument, ChunkEmbedding, DosageDocumentChunk
+from utils.RAG.pdf_parser import process_and_store_pdf_content
+from utils.RAG.query_handler import get_dosage_info
+from utils.RAG.vector_collections import VectorCollectionManager
+from benchmarks.fakes import HashingEmbeddings, fake_chat_model
+from benchmarks.fixtures import load_fixture, formulary_lines, write_pdf
+
+def percentiles(samples: list) -> dict:
+    """p50/p95/p99 and max of a list of seconds, in milliseconds (nearest-rank)."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+def chunk_store_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[DosageDocument.__table__, ChunkEmbedding.__table__, DosageDocumentChunk.__table__])
+    return sessionmaker(bind=engine, autoflush=False)()
+
+def ingest(db, pdf_path: str, document_id: int, embeddings, manager) -> dict:
+    document = DosageDocument(id=document_id, title=os.path.basename(pdf_path), content=pdf_path, uploaded_by=1)
+    db.add(document)
+    db.flush()
+    embedded_before = embeddings.embedded_texts
+    start = time.perf_counter()
+    process_and_store_pdf_content(pdf_path, db, document, embeddings=embeddings, manager=manager)
+    db.commit()
+    elapsed = time.perf_counter() - start
+
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = len(pdf.pages)
+    chunks = db.query(DosageDocumentChunk).filter(DosageDocumentChunk.document_id == document_id).count()
+    return {
+        "seconds": round(elapsed, 4),
+        "pages": pages,
+        "chunks": chunks,
+        "pages_per_sec": round(pages / elapsed, 2),
+        "chunks_per_sec": round(chunks / elapsed, 2),
+        "embedded_chunks": embeddings.embedded_texts - embedded_before,
+    }
+
+def evaluate_retrieval(questions: list, embeddings, manager, ks: list, repeat: int) -> dict:
+    latencies = []
+    hits = {k: 0 for k in ks}
+    for question in questions:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            docs = manager.search(question["question"], embeddings, k=max(ks))
+            latencies.append(time.perf_counter() - start)
+        # A question is recalled at k when one of the top k chunks covers the labelled drug
+        expected = question["drug"].lower()
+        for k in ks:
+            if any(expected in doc.page_content.lower() for doc in docs[:k]):
+                hits[k] += 1
+    return {
+        "latency": percentiles(latencies),
+        "recall": {f"recall@{k}": round(hits[k] / len(questions), 3) for k in ks},
+    }
+
+def evaluate_answers(questions: list, embeddings, manager, repeat: int) -> dict:
+    llm = fake_chat_model()
+    latencies = []
+    for question in questions:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            get_dosage_info(question["question"], embeddings=embeddings, llm=llm, manager=manager)
+            latencies.append(time.perf_counter() - start)
+    return {"latency": percentiles(latencies)}
+
+def run(copies: int, repeat: int, ks: list) -> dict:
+    fixture = load_fixture()
+    embeddings = HashingEmbeddings()
+    db = chunk_store_session()
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_path = os.path.join(workdir, "knmf_fixture.pdf")
+        write_pdf(pdf_path, formulary_lines(copies))
+        manager = VectorCollectionManager(os.path.join(workdir, "faiss_dosage_index"))
+
+        report = {
+            "copies": copies,
+            "ingest_cold": ingest(db, pdf_path, 1, embeddings, manager),
+            # Same content again: every chunk should come from the chunk store
+            "ingest_cached": ingest(db, pdf_path, 2, embeddings, manager),
+        }
+        manager.remove(2)
+        report["retrieval"] = evaluate_retrieval(fixture["questions"], embeddings, manager, ks, repeat)
+        report["answer"] = evaluate_answers(fixture["questions"], embeddings, manager, repeat)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of KNMF ingestion and dosage retrieval")
+    parser.add_argument("--copies", type=int, default=10, help="Copies of the fixture formulary in the generated PDF")
+    parser.add_argument("--repeat", type=int, default=5, help="Times each question is asked")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10, 20], help="Cut-offs for recall@k")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args.copies, args.repeat, sorted(args.k))
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+if __name__ == "__main__":
+    main()
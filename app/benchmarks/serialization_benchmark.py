@@ -0,0 +1,105 @@
+"""
+Rows/sec of prescription list serialization: the previous jsonable_encoder + response_model path
+against utils.serializers with orjson. Works on in-memory ORM objects, so no database is needed.
+
+Run from the app directory:
+    python -m benchmarks.serialization_benchmark --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy.orm.attributes import set_committed_value
+from models import Hospital, Doctor, Patient, Prescription, DiseaseTypeEnum
+from schemas import PrescriptionOut
+from utils.serializers import prescription_out, json_response
+
+def loaded(obj, **relations):
+    """Attach relations as if eagerly loaded, without firing backrefs that would populate the reverse collections."""
+    for key, value in relations.items():
+        set_committed_value(obj, key, value)
+    return obj
+
+def make_prescriptions(rows: int) -> list:
+    hospital = Hospital(id=1, name="Kenyatta National Hospital", location="Nairobi")
+    doctors = [
+        loaded(Doctor(id=i, name=f"Doctor {i}", email=f"doctor{i}@example.com", specialty="General Medicine",
+                      role="doctor", hashed_password="x" * 60, hospital_id=1), hospital=hospital)
+        for i in range(1, 21)
+    ]
+    patients = [
+        loaded(Patient(id=i, name=f"Patient {i}", email=f"patient{i}@example.com", hospital_id=1), hospital=hospital)
+        for i in range(1, 501)
+    ]
+    start = datetime(2024, 1, 1)
+    prescriptions = []
+    for i in range(rows):
+        created_at = start + timedelta(minutes=i)
+        patient, doctor = patients[i % len(patients)], doctors[i % len(doctors)]
+        prescriptions.append(loaded(Prescription(
+            id=i + 1,
+            patient_id=patient.id,
+            doctor_id=doctor.id,
+            medication="Amoxicillin 500mg",
+            dosage="1 capsule three times daily for 7 days",
+            observations="Fever and productive cough for three days",
+            diagnosis="Community acquired pneumonia",
+            diseases_type=DiseaseTypeEnum.COMMUNICABLE,
+            treatment_plan="Review after one week",
+            doctor_notes=None,
+            created_at=created_at,
+            updated_at=created_at,
+        ), patient=patient, doctor=doctor))
+    return prescriptions
+
+prescription_list = TypeAdapter(List[PrescriptionOut])
+
+def legacy_serialize(prescriptions: list) -> bytes:
+    """What the routes did before: spread jsonable_encoder per object, then FastAPI validated and encoded again."""
+    content = [
+        {
+            **jsonable_encoder(pr),
+            "patient": {**jsonable_encoder(pr.patient), "hospital": jsonable_encoder(pr.patient.hospital)},
+            "doctor": {**jsonable_encoder(pr.doctor), "hospital": jsonable_encoder(pr.doctor.hospital)},
+        }
+        for pr in prescriptions
+    ]
+    validated = prescription_list.validate_python(content)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+def fast_serialize(prescriptions: list) -> bytes:
+    return json_response([prescription_out(pr) for pr in prescriptions]).body
+
+def measure(serialize, prescriptions: list, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = serialize(prescriptions)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {"best_seconds": round(best, 4), "rows_per_sec": round(len(prescriptions) / best), "bytes": len(body)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Rows/sec of prescription list serialization")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    prescriptions = make_prescriptions(args.rows)
+    # Both paths must produce the same document
+    assert json.loads(legacy_serialize(prescriptions[:50])) == json.loads(fast_serialize(prescriptions[:50]))
+
+    legacy = measure(legacy_serialize, prescriptions, args.repeat)
+    fast = measure(fast_serialize, prescriptions, args.repeat)
+    print(json.dumps({
+        "rows": args.rows,
+        "legacy": legacy,
+        "fast": fast,
+        "speedup": round(fast["rows_per_sec"] / legacy["rows_per_sec"], 1),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Synthetic dataset generator for load tests, benchmarks and index tuning.
+
+Rows are generated column-wise with NumPy, formatted as CSV a chunk at a time and loaded with COPY, so tens of
+millions of rows take minutes rather than hours. Ids are assigned here and the sequences moved past them afterwards,
+so no ids are read back. The tables are locked against writes while the load runs, in one transaction.
+
+The generated doctors and admins can log in with --password, so the load test harness can sign in as any of them.
+Load into a scratch database; seeding a production one would only make its dashboards wrong.
+
+Run from the app directory, after `alembic upgrade head`:
+    python -m benchmarks.synthetic_data --hospitals 50 --doctors 5000 --patients 1000000 --prescriptions-per-patient 8 \
+        --iot-doctors 500 --iot-days 7 --iot-hz 0.1
+"""
+import argparse
+import io
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from db import engine
+from auth import pwd_context
+from models import DiseaseTypeEnum
+from utils.Analytics.local_day import ANALYTICS_TIMEZONE_NAME
+from utils.IoT.categorize_time_of_day import categorize_time_of_day
+
+LOCATIONS = ["Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret", "Kijabe", "Thika", "Machakos", "Nyeri", "Meru"]
+SPECIALTIES = ["General Medicine", "Pediatrics", "Gynecology", "Internal Medicine", "Surgery", "Clinician", "Cardiology", "Psychiatry"]
+FIRST_NAMES = ["Achieng", "Wanjiru", "Otieno", "Kamau", "Njeri", "Mutua", "Akinyi", "Kiprono", "Wafula", "Chebet", "Omondi", "Nyambura"]
+LAST_NAMES = ["Ochieng", "Mwangi", "Odhiambo", "Kariuki", "Wambui", "Kiptoo", "Barasa", "Atieno", "Njoroge", "Maina", "Onyango", "Korir"]
+
+# (weight, medication, dosage, diagnosis, disease type, treatment plan)
+PRESCRIPTION_CATALOGUE = [
+    (14, "Amoxicillin 500mg", "1 capsule, 3 times a day for 7 days", "Acute bacterial infection", DiseaseTypeEnum.COMMUNICABLE, "Complete the full course."),
+    (12, "Artemether/Lumefantrine 20/120mg", "4 tablets twice a day for 3 days", "Uncomplicated malaria", DiseaseTypeEnum.COMMUNICABLE, "Take with fatty food. Review if fever persists."),
+    (10, "Metformin 850mg", "1 tablet, twice a day", "Type 2 Diabetes", DiseaseTypeEnum.NON_COMMUNICABLE, "Maintain a healthy diet and take medication as prescribed."),
+    (10, "Amlodipine 5mg", "1 tablet once a day", "Essential hypertension", DiseaseTypeEnum.NON_COMMUNICABLE, "Reduce salt intake. Check blood pressure monthly."),
+    (9, "Ibuprofen 400mg", "1 tablet, every 6 hours as needed", "Muscle strain", DiseaseTypeEnum.NON_COMMUNICABLE, "Rest, apply ice packs, and take medication as needed."),
+    (8, "Paracetamol 1g", "1 tablet every 8 hours as needed", "Viral upper respiratory tract infection", DiseaseTypeEnum.COMMUNICABLE, "Plenty of fluids and rest."),
+    (7, "Oral rehydration salts", "1 sachet after each loose stool", "Acute gastroenteritis", DiseaseTypeEnum.COMMUNICABLE, "Continue feeding. Return if unable to drink."),
+    (6, "Tenofovir/Lamivudine/Dolutegravir", "1 tablet once a day", "HIV infection", DiseaseTypeEnum.COMMUNICABLE, "Adherence counselling. Viral load in 6 months."),
+    (6, "Salbutamol inhaler 100mcg", "2 puffs as needed", "Asthma", DiseaseTypeEnum.NON_COMMUNICABLE, "Avoid triggers. Review inhaler technique."),
+    (5, "Ciprofloxacin 500mg", "1 tablet twice a day for 5 days", "Urinary tract infection", DiseaseTypeEnum.COMMUNICABLE, "Increase fluid intake."),
+    (5, "Omeprazole 20mg", "1 capsule once a day before breakfast", "Peptic ulcer disease", DiseaseTypeEnum.NON_COMMUNICABLE, "Avoid NSAIDs and alcohol."),
+    (4, "Rifampicin/Isoniazid/Pyrazinamide/Ethambutol", "4 tablets once a day", "Pulmonary tuberculosis", DiseaseTypeEnum.COMMUNICABLE, "Directly observed therapy. Trace contacts."),
+    (4, "Ferrous sulphate 200mg", "1 tablet once a day", "Iron deficiency anaemia", DiseaseTypeEnum.NON_COMMUNICABLE, "Iron rich diet. Repeat haemoglobin in 4 weeks."),
+]
+OBSERVATIONS = [
+    "Fever and productive cough for three days",
+    "Elevated blood pressure on two readings",
+    "Mild dehydration, alert and drinking",
+    "Stable, no acute distress",
+    "Tenderness on palpation",
+    None,
+]
+DAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+TIME_OF_DAY_BY_HOUR = np.array([categorize_time_of_day(hour) for hour in range(24)], dtype=object)
+
+def csv_safe(values: list) -> np.ndarray:
+    """Quote the texts CSV needs quoted, once per catalogue entry rather than once per row."""
+    quoted = []
+    for value in values:
+        if value is not None and any(char in value for char in ',"\n'):
+            value = '"' + value.replace('"', '""') + '"'
+        quoted.append(value)
+    return np.array(quoted, dtype=object)
+
+def csv_strings(values, rows: int) -> list:
+    """One column as CSV field texts, formatted by NumPy in C; object columns must already be CSV safe."""
+    if not isinstance(values, np.ndarray):
+        return [str(values)] * rows
+    if np.issubdtype(values.dtype, np.datetime64):
+        return np.datetime_as_string(values, unit="us").tolist()
+    if values.dtype == object:
+        return ["" if value is None else value for value in values.tolist()]  # An empty field is NULL
+    return values.astype(str).tolist()
+
+def copy_rows(cursor, table: str, columns: dict):
+    """COPY column arrays (or constants) into a table, with the CSV text joined row by row in C."""
+    rows = next(len(values) for values in columns.values() if isinstance(values, np.ndarray))
+    fields = [csv_strings(values, rows) for values in columns.values()]
+    buffer = io.StringIO("\n".join(map(",".join, zip(*fields))) + "\n")
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def next_id(cursor, table: str) -> int:
+    cursor.execute(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")
+    return cursor.fetchone()[0]
+
+def names(rng, count: int) -> np.ndarray:
+    first = np.array(FIRST_NAMES, dtype=object)[rng.integers(len(FIRST_NAMES), size=count)]
+    last = np.array(LAST_NAMES, dtype=object)[rng.integers(len(LAST_NAMES), size=count)]
+    return first + " " + last
+
+def emails(prefix: str, ids: np.ndarray, tag: str) -> np.ndarray:
+    return np.char.add(np.char.add(prefix, ids.astype(str)), f".{tag}@synthetic.dawachat.ai").astype(object)
+
+def timestamps(start: datetime, seconds: np.ndarray) -> np.ndarray:
+    return np.datetime64(start, "us") + (seconds * 1e6).astype("timedelta64[us]")
+
+class Generator:
+    def __init__(self, cursor, args):
+        self.cursor = cursor
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+        self.tag = f"{args.seed}x{int(time.time())}"  # Keeps names and emails unique across runs
+        self.now = datetime.utcnow()
+        self.counts = {}
+
+    def timed(self, table: str, rows: int, started: float):
+        self.counts[table] = self.counts.get(table, 0) + rows
+        print(f"{table}: {rows} rows in {time.perf_counter() - started:.1f}s")
+
+    def hospitals(self):
+        started = time.perf_counter()
+        count = self.args.hospitals
+        ids = next_id(self.cursor, "hospitals") + np.arange(count)
+        copy_rows(self.cursor, "hospitals", {
+            "id": ids,
+            "name": np.char.add("Synthetic Hospital ", np.char.add(np.arange(1, count + 1).astype(str), f" {self.tag}")).astype(object),
+            "location": np.array(LOCATIONS, dtype=object)[self.rng.integers(len(LOCATIONS), size=count)],
+        })
+        self.hospital_ids = ids
+        # Hospital sizes vary a lot: patients are spread by a skewed weight per hospital
+        weights = self.rng.lognormal(0, 1, size=count)
+        self.hospital_weights = weights / weights.sum()
+        self.timed("hospitals", count, started)
+
+    def staff(self, hashed_password: str):
+        started = time.perf_counter()
+        hospitals = len(self.hospital_ids)
+        # Every hospital gets at least one doctor, the rest follow the hospital weights
+        doctor_hospital = np.concatenate([
+            np.arange(hospitals), self.rng.choice(hospitals, size=self.args.doctors - hospitals, p=self.hospital_weights)
+        ])
+        doctor_hospital.sort()
+        doctor_ids = next_id(self.cursor, "doctors") + np.arange(self.args.doctors)
+        copy_rows(self.cursor, "doctors", {
+            "id": doctor_ids,
+            "name": "Dr. " + names(self.rng, self.args.doctors),
+            "email": emails("doctor", doctor_ids, self.tag),
+            "specialty": np.array(SPECIALTIES, dtype=object)[self.rng.integers(len(SPECIALTIES), size=self.args.doctors)],
+            "role": "doctor",
+            "hashed_password": hashed_password,
+            "is_temporary_password": False,
+            "hospital_id": self.hospital_ids[doctor_hospital],
+        })
+        self.doctor_ids = doctor_ids
+        # Doctors of hospital h are doctor_ids[doctor_start[h]:doctor_start[h] + doctor_count[h]]
+        self.doctor_count = np.bincount(doctor_hospital, minlength=hospitals)
+        self.doctor_start = np.concatenate([[0], np.cumsum(self.doctor_count)[:-1]])
+
+        admin_ids = next_id(self.cursor, "admins") + np.arange(hospitals)
+        copy_rows(self.cursor, "admins", {
+            "id": admin_ids,
+            "name": "Admin " + names(self.rng, hospitals),
+            "email": emails("admin", admin_ids, self.tag),
+            "role": "admin",
+            "hashed_password": hashed_password,
+            "is_temporary_password": False,
+            "hospital_id": self.hospital_ids,
+        })
+        # COPY skips the mapper events that keep principal_lookup in sync
+        self.cursor.execute(
+            "INSERT INTO principal_lookup (email, user_type, role, hospital_id, doctor_id) "
+            "SELECT lower(email), 'doctor', role, hospital_id, id FROM doctors WHERE id BETWEEN %s AND %s",
+            (int(doctor_ids[0]), int(doctor_ids[-1])),
+        )
+        self.cursor.execute(
+            "INSERT INTO principal_lookup (email, user_type, role, hospital_id, admin_id) "
+            "SELECT lower(email), 'admin', role, hospital_id, id FROM admins WHERE id BETWEEN %s AND %s",
+            (int(admin_ids[0]), int(admin_ids[-1])),
+        )
+        self.timed("doctors", self.args.doctors, started)
+        self.counts["admins"] = hospitals
+
+    def patients_and_prescriptions(self):
+        first_patient = next_id(self.cursor, "patients")
+        first_prescription = loaded_from = next_id(self.cursor, "prescriptions")
+        weights, medication, dosage, diagnosis, diseases_type, treatment_plan = zip(*PRESCRIPTION_CATALOGUE)
+        catalogue_weights = np.array(weights, dtype=float) / sum(weights)
+        catalogue = {
+            "medication": csv_safe(medication),
+            "dosage": csv_safe(dosage),
+            "diagnosis": csv_safe(diagnosis),
+            # Postgres enum labels are the member names
+            "diseases_type": np.array([value.name for value in diseases_type], dtype=object),
+            "treatment_plan": csv_safe(treatment_plan),
+        }
+        observations = csv_safe(OBSERVATIONS)
+        history_seconds = self.args.history_days * 86400
+        history_start = self.now - timedelta(days=self.args.history_days)
+
+        for offset in range(0, self.args.patients, self.args.chunk_rows):
+            started = time.perf_counter()
+            count = min(self.args.chunk_rows, self.args.patients - offset)
+            ids = first_patient + offset + np.arange(count)
+            hospital = self.rng.choice(len(self.hospital_ids), size=count, p=self.hospital_weights)
+            copy_rows(self.cursor, "patients", {
+                "id": ids,
+                "name": names(self.rng, count),
+                "email": emails("patient", ids, self.tag),
+                "hospital_id": self.hospital_ids[hospital],
+            })
+            self.timed("patients", count, started)
+
+            started = time.perf_counter()
+            per_patient = self.rng.poisson(self.args.prescriptions_per_patient, size=count)
+            patient = np.repeat(ids, per_patient)
+            patient_hospital = np.repeat(hospital, per_patient)
+            rows = len(patient)
+            if rows == 0:
+                continue
+            # A doctor of the patient's hospital
+            doctor = self.doctor_ids[
+                self.doctor_start[patient_hospital] + (self.rng.random(rows) * self.doctor_count[patient_hospital]).astype(np.int64)
+            ]
+            entry = self.rng.choice(len(PRESCRIPTION_CATALOGUE), size=rows, p=catalogue_weights)
+            created_at = timestamps(history_start, self.rng.random(rows) * history_seconds)
+            # One in ten prescriptions was edited a little later
+            edited = self.rng.random(rows) < 0.1
+            updated_at = created_at + np.where(edited, self.rng.random(rows) * 3 * 86400e6, 0).astype("timedelta64[us]")
+            copy_rows(self.cursor, "prescriptions", {
+                "id": first_prescription + np.arange(rows),
+                "patient_id": patient,
+                "doctor_id": doctor,
+                "medication": catalogue["medication"][entry],
+                "dosage": catalogue["dosage"][entry],
+                "observations": observations[self.rng.integers(len(observations), size=rows)],
+                "diagnosis": catalogue["diagnosis"][entry],
+                "diseases_type": catalogue["diseases_type"][entry],
+                "treatment_plan": catalogue["treatment_plan"][entry],
+                "created_at": created_at,
+                "updated_at": updated_at,
+            })
+            first_prescription += rows
+            self.timed("prescriptions", rows, started)
+
+        # Back-dated updated_at is behind the analytics watermark: mark the loaded days for the next refresh instead
+        self.cursor.execute(
+            "INSERT INTO analytics_dirty_days (hospital_id, day) "
+            "SELECT DISTINCT patients.hospital_id, date(timezone(%s, timezone('UTC', prescriptions.created_at))) "
+            "FROM prescriptions JOIN patients ON patients.id = prescriptions.patient_id WHERE prescriptions.id >= %s",
+            (ANALYTICS_TIMEZONE_NAME, int(loaded_from)),
+        )
+
+    def iot_data(self):
+        doctors = self.rng.choice(self.doctor_ids, size=min(self.args.iot_doctors, len(self.doctor_ids)), replace=False)
+        per_doctor = int(self.args.iot_days * 86400 * self.args.iot_hz)
+        total = len(doctors) * per_doctor
+        if total == 0:
+            return
+        print(f"empatica_iot_data: {total} rows to generate")
+        first_id = next_id(self.cursor, "empatica_iot_data")
+        start = self.now - timedelta(days=self.args.iot_days)
+        for offset in range(0, total, self.args.chunk_rows):
+            started = time.perf_counter()
+            index = offset + np.arange(min(self.args.chunk_rows, total - offset))
+            rows = len(index)
+            # Readings every 1/hz seconds per doctor, with a little jitter
+            seconds = (index % per_doctor) / self.args.iot_hz + self.rng.random(rows) * 0.5 / self.args.iot_hz
+            timestamp = timestamps(start, seconds)
+            hour = timestamp.astype("datetime64[h]").astype(np.int64) % 24
+            day = timestamp.astype("datetime64[D]").astype(np.int64)
+            # Heart rate follows the day, EDA is skewed with occasional stress peaks
+            heart_rate = 72 + 8 * np.sin(2 * np.pi * (hour - 10) / 24) + self.rng.normal(0, 6, rows)
+            copy_rows(self.cursor, "empatica_iot_data", {
+                "id": first_id + index,
+                "doctor_id": doctors[index // per_doctor],
+                "x": np.round(self.rng.normal(0, 0.4, rows), 3),
+                "y": np.round(self.rng.normal(0, 0.4, rows), 3),
+                "z": np.round(1 + self.rng.normal(0, 0.4, rows), 3),
+                "eda": np.round(np.clip(self.rng.lognormal(0.5, 0.6, rows), 0.05, 25), 3),
+                "heart_rate": np.round(np.clip(heart_rate, 45, 180), 3),
+                "temperature": np.round(33.5 + self.rng.normal(0, 0.5, rows), 3),
+                "time_of_day": TIME_OF_DAY_BY_HOUR[hour],
+                # 1970-01-01 was a Thursday
+                "day_of_week": np.array(DAY_NAMES, dtype=object)[(day + 3) % 7],
+                "timestamp": timestamp,
+            })
+            self.timed("empatica_iot_data", rows, started)
+
+TABLES = ["hospitals", "doctors", "admins", "patients", "prescriptions", "empatica_iot_data"]
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Bulk load a synthetic dataset with COPY")
+    parser.add_argument("--hospitals", type=int, default=20)
+    parser.add_argument("--doctors", type=int, default=2000)
+    parser.add_argument("--patients", type=int, default=200000)
+    parser.add_argument("--prescriptions-per-patient", type=float, default=5, help="Mean of a Poisson distribution")
+    parser.add_argument("--history-days", type=int, default=365, help="Prescriptions are spread over this many past days")
+    parser.add_argument("--iot-doctors", type=int, default=200, help="Doctors wearing a device")
+    parser.add_argument("--iot-days", type=float, default=7, help="Days of readings per device, up to now")
+    parser.add_argument("--iot-hz", type=float, default=1 / 60, help="Readings per second per device")
+    parser.add_argument("--password", default="SyntheticPassword1", help="Password of every generated doctor and admin")
+    parser.add_argument("--chunk-rows", type=int, default=500000, help="Rows generated and copied at a time")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser
+
+def load(connection, args) -> Generator:
+    """
+    Generate and commit a dataset.
+    :param connection: psycopg2 connection (e.g. engine.raw_connection())
+    :param args: Namespace with the options of build_parser()
+    :return: The Generator, holding the generated ids and row counts
+    """
+    try:
+        cursor = connection.cursor()
+        # Ids are computed here: keep other writers out until the sequences are moved past them
+        cursor.execute(f"LOCK TABLE {', '.join(TABLES)}, principal_lookup IN EXCLUSIVE MODE")
+        generator = Generator(cursor, args)
+        generator.hospitals()
+        # One hash shared by every account: hashing per row would take longer than the whole load
+        generator.staff(pwd_context.hash(args.password))
+        generator.patients_and_prescriptions()
+        generator.iot_data()
+        for table in TABLES:
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))")
+        connection.commit()
+        for table in TABLES:
+            cursor.execute(f"ANALYZE {table}")
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    return generator
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.doctors < args.hospitals:
+        parser.error("--doctors must be at least --hospitals: every hospital needs a doctor")
+
+    started = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        generator = load(connection, args)
+    finally:
+        connection.close()
+
+    total = sum(generator.counts.values())
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s): {generator.counts}")
+    print(f"Doctors and admins log in with password {args.password!r}, e.g. doctor{generator.doctor_ids[0]}.{generator.tag}@synthetic.dawachat.ai")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+pytest fixtures shared by the app's tests.
+
+Query budgets keep routes from silently regressing to more queries, e.g. a lazy relationship loaded once per row:
+
+    @pytest.mark.query_budget(3)
+    def test_list_patients(client, doctor_headers):
+        client.get("/api/patients/", headers=doctor_headers)
+
+    def test_login_then_list(client, query_budget):
+        token = login(client)
+        with query_budget(3):
+            client.get("/api/patients/", headers={"Authorization": f"Bearer {token}"})
+
+Statements of every engine of the app (primary, async and replica) count towards the budget.
+
+Tests using the `postgres_db` fixture run against the POSTGRES_* database and are skipped when it can't be reached.
+They create and drop the app's tables there, so it must be a scratch database whose name ends in "test".
+"""
+import os
+import pytest
+
+# db creates its engines at import; tests that don't use them need no database, only a well-formed URL
+for setting, default in {"POSTGRES_USER": "postgres", "POSTGRES_PASSWORD": "postgres", "POSTGRES_HOST": "localhost",
+                         "POSTGRES_PORT": "5432", "POSTGRES_DB": "dawachat_test"}.items():
+    os.environ.setdefault(setting, default)
+
+from sqlalchemy import exc, text  # noqa: E402
+from db import Base, engine, pool_engines  # noqa: E402
+from utils.query_counter import assert_max_queries  # noqa: E402
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "query_budget(limit): fail the test if it runs more than `limit` SQL statements")
+
+@pytest.fixture
+def query_budget():
+    """
+    :return: Function of a limit returning a context manager that fails if its block runs more statements
+    """
+    def budget(limit: int, engines=None):
+        return assert_max_queries(list(engines or pool_engines.values()), limit)
+    return budget
+
+@pytest.fixture(autouse=True)
+def query_budget_marker(request):
+    marker = request.node.get_closest_marker("query_budget")
+    if marker is None:
+        yield
+        return
+    with assert_max_queries(list(pool_engines.values()), marker.args[0]):
+        yield
+
+@pytest.fixture(scope="session")
+def postgres_schema():
+    if not os.environ["POSTGRES_DB"].endswith("test"):
+        pytest.skip(f"POSTGRES_DB {os.environ['POSTGRES_DB']!r} is not a scratch test database")
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except exc.OperationalError:
+        pytest.skip("Postgres is not reachable")
+    import models  # noqa: F401  Registers the tables
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+@pytest.fixture
+def postgres_db(postgres_schema):
+    """
+    :return: Session on the emptied test database
+    """
+    from db import SessionLocal
+
+    tables = ", ".join(f'"{table.name}"' for table in Base.metadata.sorted_tables)
+    with engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    with SessionLocal() as db:
+        yield db
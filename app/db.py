@@ -1,8 +1,14 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, NullPool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
+from starlette.requests import Request
+from uuid import uuid4
+from utils.metrics import DB_POOL_CHECKOUT_WAIT_SECONDS, DB_POOL_CHECKOUT_TIMEOUTS, instrument_queries, record_pool_usage
 import os
+import time
 
 Base = declarative_base()
 
@@ -12,6 +18,30 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Async dependency for routes declared with `async def`
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def reads_from_primary(request: Request) -> bool:
+    """
+    True while the client is within REPLICA_STICKY_SECONDS of its last successful write: by its cookie, or by its
+    principal as flagged by PrimaryStickinessMiddleware.
+    """
+    if getattr(request.state, "read_from_primary", False):
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_STICKY_COOKIE, "0")) > time.time()
+    except ValueError:
+        return False
+
+# Async dependency for read-only routes: a replica, unless the client wrote recently and must read its own writes
+async def get_async_read_db(request: Request):
+    session_factory = AsyncSessionLocal if reads_from_primary(request) else AsyncReplicaSessionLocal
+    async with session_factory() as db:
+        yield db
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -23,7 +53,103 @@ database_name = os.getenv('POSTGRES_DB')
 
 # Construct the database URL using environment variables
 DATABASE_URL = f"postgresql://{user}:{password}@{host}:{port}/{database_name}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{database_name}"
+
+# Streaming read replica for the read-only routes; without it they read from the primary
+replica_host = os.getenv('POSTGRES_REPLICA_HOST')
+replica_port = os.getenv('POSTGRES_REPLICA_PORT', port)
+ASYNC_REPLICA_DATABASE_URL = (
+    f"postgresql+asyncpg://{user}:{password}@{replica_host}:{replica_port}/{database_name}" if replica_host else None
+)
+# After a write the client reads from the primary for this long, so replication lag never hides its own changes
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+PRIMARY_STICKY_COOKIE = "db_primary_until"
+
+# Pool settings, per engine and per worker process. Each worker has a sync and an async engine,
+# so it can hold up to 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections to Postgres.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Behind pgbouncer in transaction mode: pgbouncer does the pooling and prepared statements can't be cached
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+class InstrumentedPoolMixin:
+    """
+    Records how long each checkout waits for a connection, and the pool's usage after each checkout and return,
+    labelled with the pool's logging name.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(self.logging_name).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT_SECONDS.labels(self.logging_name).observe(time.perf_counter() - start)
+        record_pool_usage(self)
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        record_pool_usage(self)
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+class InstrumentedNullPool(InstrumentedPoolMixin, NullPool):
+    pass
+
+def pool_options(name: str, pool_class) -> dict:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_logging_name": name}
+    if DB_PGBOUNCER:
+        return {**options, "poolclass": InstrumentedNullPool}
+    return {
+        **options,
+        "poolclass": pool_class,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+# asyncpg prepares every statement; pgbouncer may hand the next one to another server connection
+ASYNC_CONNECT_ARGS = {
+    "statement_cache_size": 0,
+    "prepared_statement_cache_size": 0,
+    "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+} if DB_PGBOUNCER else {}
 
 # Set up the engine and session
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **pool_options("sync", InstrumentedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine and session for the event loop; objects stay usable after commit
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, connect_args=ASYNC_CONNECT_ARGS, **pool_options("async", InstrumentedAsyncQueuePool)
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+if ASYNC_REPLICA_DATABASE_URL:
+    async_replica_engine = create_async_engine(
+        ASYNC_REPLICA_DATABASE_URL, connect_args=ASYNC_CONNECT_ARGS, **pool_options("async_replica", InstrumentedAsyncQueuePool)
+    )
+    AsyncReplicaSessionLocal = async_sessionmaker(bind=async_replica_engine, autoflush=False, expire_on_commit=False)
+else:
+    async_replica_engine = async_engine
+    AsyncReplicaSessionLocal = AsyncSessionLocal
+
+# Every engine of the worker, e.g. for counting a test's queries
+pool_engines = {"sync": engine, "async": async_engine.sync_engine}
+if async_replica_engine is not async_engine:
+    pool_engines["async_replica"] = async_replica_engine.sync_engine
+
+# Queries and query time of each request
+for instrumented_engine in pool_engines.values():
+    instrument_queries(instrumented_engine)
@@ -1,25 +1,41 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, status, APIRouter
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, UploadFile, File, status, APIRouter
 from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
-from auth import authenticate_user, create_access_token, get_current_user
+from auth import authenticate_user, create_access_token, get_current_user, principal_claims, principal_cache, principal_from_user
 from schemas import LoginRequest
-from db import SessionLocal
-from routes import super_admin, admin, doctor, rag
+from db import SessionLocal, engine, async_engine, async_replica_engine, get_async_db
+from routes import super_admin, admin, doctor, rag, analytics, export
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.middleware import PrimaryStickinessMiddleware, MetricsMiddleware
+from utils.metrics import metrics_app, mark_worker_dead
+from utils.replica_stickiness import listen_for_pins
 from utils.ML.process_doctor_stress_log import process_doctor_stress_log
 import os
+import asyncio
 from utils.asdict import asdict
-from seed_db import seed_database
+from utils.Analytics.prescription_stats import refresh_periodically
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.db = SessionLocal()
-    seed_database()
+    # Schema migrations and seeding run once per deployment in prestart.py, not in every worker
+    analytics_refresh = asyncio.create_task(refresh_periodically())
+    # Pins of bearer clients to the primary, published by every worker after their writes
+    sticky_listener = asyncio.create_task(listen_for_pins()) if async_replica_engine is not async_engine else None
     yield  # The application runs while this is active
-    app.state.db.close()
+    analytics_refresh.cancel()
+    if sticky_listener:
+        sticky_listener.cancel()
+    # Close pooled connections so Postgres doesn't wait for them to time out
+    engine.dispose()
+    await async_engine.dispose()
+    if async_replica_engine is not async_engine:
+        await async_replica_engine.dispose()
+    mark_worker_dead()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -32,13 +48,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  
     allow_headers=["*"],  
+    expose_headers=[NEXT_CURSOR_HEADER],  # Lets browser clients page through list endpoints
 )
 
+# Read-your-writes for clients whose reads are routed to the replica
+if async_replica_engine is not async_engine:
+    app.add_middleware(PrimaryStickinessMiddleware)
+
+# Per-route latency, status, database and span metrics; added last so it times the other middleware too
+app.add_middleware(MetricsMiddleware)
+
 # Initialize router 
 app.include_router(super_admin.router)
 app.include_router(admin.router)
 app.include_router(doctor.router)
 app.include_router(rag.router)
+app.include_router(analytics.router)
+app.include_router(export.router)
+
+# Prometheus metrics, of all the workers when PROMETHEUS_MULTIPROC_DIR is set
+app.mount("/metrics", metrics_app())
 
 load_dotenv()
 
@@ -54,15 +83,25 @@ def get_db():
 # OAuth2 password bearer setup
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+def log_doctor_stress(doctor_id: int, doctor_name: str):
+    db = SessionLocal()
+    try:
+        process_doctor_stress_log(doctor_id, doctor_name, db)
+    finally:
+        db.close()
+
 # Login Route for Authentication
 @app.post("/api/login")
-def login(login_request: LoginRequest, db: Session = Depends(get_db)):
-    user = authenticate_user(login_request.email, login_request.password, db)
-    if user.role == "doctor":
-        process_doctor_stress_log(user.id, user.name, db)
+async def login(login_request: LoginRequest, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(login_request.email, login_request.password, db)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    token = create_access_token(data={"sub": user.email, "role": user.role, "hospital": asdict(user.hospital), "name": user.name})
+    if user.role == "doctor":
+        # Stress classification reads the wearable data and runs the model: after the response, on a worker thread
+        background_tasks.add_task(log_doctor_stress, user.id, user.name)
+    # Prime the principal cache so the user's next requests need no lookup
+    principal_cache.set(principal_from_user(user))
+    token = create_access_token(data={**principal_claims(user), "hospital": asdict(user.hospital), "name": user.name})
     return {"access_token": token, "token_type": "bearer"}
 
 # Example of a route that requires super_admin role
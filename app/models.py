@@ -1,7 +1,10 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Enum, Float, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, Text, Enum, Float, Boolean, Index, LargeBinary, UniqueConstraint, Computed
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy import event, insert, delete, select, inspect
 from db import Base
-from datetime import datetime, timezone
+from utils.Analytics.local_day import local_day
+from datetime import datetime
 from enum import Enum as pyEnum
 
 class Hospital(Base):
@@ -42,6 +45,11 @@ class Admin(Base):
     is_temporary_password = Column(Boolean, default=True)
     hospital_id = Column(Integer, ForeignKey("hospitals.id", ondelete="CASCADE"), nullable=False)
     hospital = relationship("Hospital", back_populates="admins")
+
+    __table_args__ = (
+        # Admins of a hospital, in keyset page order
+        Index("ix_admins_hospital_id_id", "hospital_id", "id"),
+    )
     
 
 class Doctor(Base):
@@ -59,6 +67,65 @@ class Doctor(Base):
     stress_logs = relationship("StressLog", back_populates="doctor")
     iot_data = relationship("EmpaticaIotData", back_populates="doctor", cascade="all, delete")
 
+    __table_args__ = (
+        # Doctors of a hospital, in keyset page order
+        Index("ix_doctors_hospital_id_id", "hospital_id", "id"),
+    )
+
+class PrincipalLookup(Base):
+    """
+    One row per login identity (doctor or admin), keyed by lower-cased email,
+    so any principal is resolved with a single indexed query.
+    Kept in sync with the doctors/admins tables by the mapper events below.
+    """
+    __tablename__ = "principal_lookup"
+    email = Column(String, primary_key=True)  # Lower-cased
+    user_type = Column(String, nullable=False)  # "doctor" or "admin"
+    role = Column(String, nullable=False)
+    hospital_id = Column(Integer, nullable=False)
+    doctor_id = Column(Integer, ForeignKey("doctors.id", ondelete="CASCADE"), unique=True, nullable=True)
+    admin_id = Column(Integer, ForeignKey("admins.id", ondelete="CASCADE"), unique=True, nullable=True)
+    doctor = relationship("Doctor")
+    admin = relationship("Admin")
+
+    @property
+    def user(self):
+        return self.doctor if self.user_type == "doctor" else self.admin
+
+def _sync_principal_lookup(connection, target, user_type):
+    fk_column = PrincipalLookup.doctor_id if user_type == "doctor" else PrincipalLookup.admin_id
+    connection.execute(delete(PrincipalLookup).where(fk_column == target.id))
+    connection.execute(insert(PrincipalLookup).values(
+        email=target.email.lower(),
+        user_type=user_type,
+        role=target.role,
+        hospital_id=target.hospital_id,
+        doctor_id=target.id if user_type == "doctor" else None,
+        admin_id=target.id if user_type == "admin" else None,
+    ))
+
+def _delete_principal_lookup(connection, target, user_type):
+    fk_column = PrincipalLookup.doctor_id if user_type == "doctor" else PrincipalLookup.admin_id
+    connection.execute(delete(PrincipalLookup).where(fk_column == target.id))
+
+@event.listens_for(Doctor, "after_insert")
+@event.listens_for(Doctor, "after_update")
+def _sync_doctor_lookup(mapper, connection, target):
+    _sync_principal_lookup(connection, target, "doctor")
+
+@event.listens_for(Doctor, "after_delete")
+def _delete_doctor_lookup(mapper, connection, target):
+    _delete_principal_lookup(connection, target, "doctor")
+
+@event.listens_for(Admin, "after_insert")
+@event.listens_for(Admin, "after_update")
+def _sync_admin_lookup(mapper, connection, target):
+    _sync_principal_lookup(connection, target, "admin")
+
+@event.listens_for(Admin, "after_delete")
+def _delete_admin_lookup(mapper, connection, target):
+    _delete_principal_lookup(connection, target, "admin")
+
 class Patient(Base):
     __tablename__ = "patients"
     id = Column(Integer, primary_key=True, index=True)
@@ -68,10 +135,23 @@ class Patient(Base):
     hospital = relationship("Hospital")
     prescriptions = relationship("Prescription", back_populates="patient")
 
+    __table_args__ = (
+        # Patients of a hospital, in keyset page order
+        Index("ix_patients_hospital_id_id", "hospital_id", "id"),
+    )
+
 class DiseaseTypeEnum(str, pyEnum):
     COMMUNICABLE = "communicable"
     NON_COMMUNICABLE = "non_communicable"
 
+# Weighted document searched by /api/search-prescriptions/: medication and diagnosis rank above notes
+PRESCRIPTION_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english'::regconfig, coalesce(medication, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(diagnosis, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(observations, '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(treatment_plan, '')), 'C')"
+)
+
 class Prescription(Base):
     __tablename__ = "prescriptions"
     
@@ -85,19 +165,134 @@ class Prescription(Base):
     diseases_type = Column(Enum(DiseaseTypeEnum, name=("disease_type_enum")))
     treatment_plan = Column(Text, nullable=True)
     doctor_notes = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Analytics refresh watermark
+    # Maintained by Postgres; deferred so ordinary prescription queries never load it
+    search_vector = deferred(Column(TSVECTOR, Computed(PRESCRIPTION_SEARCH_DOCUMENT, persisted=True)))
     
     doctor = relationship("Doctor")
     patient = relationship("Patient")
 
+    __table_args__ = (
+        # A patient's prescriptions in keyset page order, and the selectinload of a page of patients
+        Index("ix_prescriptions_patient_id_id", "patient_id", "id"),
+        Index("ix_prescriptions_doctor_id", "doctor_id"),
+        Index("ix_prescriptions_search_vector", "search_vector", postgresql_using="gin"),
+        # Changed rows since the analytics watermark, and the rows of one day when a bucket is recomputed
+        Index("ix_prescriptions_updated_at", "updated_at"),
+        Index("ix_prescriptions_created_at", "created_at"),
+    )
+
+class PrescriptionDailyStat(Base):
+    """
+    Prescription counts per hospital, local day, doctor, disease type and medication.
+    Rebuilt bucket by bucket (hospital and day) by utils/Analytics/prescription_stats.py; never written by the routes.
+    """
+    __tablename__ = "prescription_daily_stats"
+    id = Column(Integer, primary_key=True)
+    hospital_id = Column(Integer, ForeignKey("hospitals.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    doctor_id = Column(Integer, nullable=True)  # No foreign key: counts stay valid after the doctor is removed
+    diseases_type = Column(Enum(DiseaseTypeEnum, name="disease_type_enum", create_type=False), nullable=True)
+    medication = Column(String, nullable=False)
+    prescriptions = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_prescription_daily_stats_hospital_id_day", "hospital_id", "day"),
+    )
+
+class AnalyticsWatermark(Base):
+    """How far an aggregate has been refreshed: source rows updated up to `value` are included."""
+    __tablename__ = "analytics_watermarks"
+    name = Column(String, primary_key=True)
+    value = Column(DateTime, nullable=False)
+    refreshed_at = Column(DateTime, nullable=False)
+
+class AnalyticsDirtyDay(Base):
+    """A hospital and day whose aggregates must be recomputed because a prescription left it (deleted or moved)."""
+    __tablename__ = "analytics_dirty_days"
+    id = Column(Integer, primary_key=True)
+    hospital_id = Column(Integer, nullable=False)
+    day = Column(Date, nullable=False)
+
+def _mark_day_dirty(connection, patient_id, created_at):
+    if patient_id is None or created_at is None:
+        return
+    hospital_id = connection.execute(select(Patient.hospital_id).where(Patient.id == patient_id)).scalar()
+    if hospital_id is not None:
+        connection.execute(insert(AnalyticsDirtyDay).values(hospital_id=hospital_id, day=local_day(created_at)))
+
+def _previous_value(target, key: str):
+    history = inspect(target).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(target, key)
+
+# Deleted rows leave no updated_at behind, so deletes mark their bucket instead
+@event.listens_for(Prescription, "after_delete")
+def _mark_prescription_day_dirty(mapper, connection, target):
+    _mark_day_dirty(connection, target.patient_id, target.created_at)
+
+# Rows moved out of a bucket, e.g. orphaned (patient_id set to NULL) when their patient is deleted: the refresh only
+# sees the bucket they are in now, if any, so mark the one they left
+@event.listens_for(Prescription, "after_update")
+def _mark_previous_prescription_day_dirty(mapper, connection, target):
+    state = inspect(target)
+    if not (state.attrs.patient_id.history.deleted or state.attrs.created_at.history.deleted):
+        return
+    _mark_day_dirty(connection, _previous_value(target, "patient_id"), _previous_value(target, "created_at"))
+
 class DosageDocument(Base):
     __tablename__ = "dosage_documents"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     content = Column(String, nullable=False)
+    edition = Column(String, nullable=True)  # e.g. "2023 1st Edition"
+    checksum = Column(String(64), unique=True, index=True, nullable=True)  # SHA-256 of the uploaded file
     uploaded_by = Column(Integer, ForeignKey("admins.id"))
     uploaded_at = Column(DateTime, default=datetime.utcnow)
+    drug_dosages = relationship("DrugDosage", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
+    chunks = relationship("DosageDocumentChunk", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
+
+class ChunkEmbedding(Base):
+    """Embedding of a text chunk, keyed by the SHA-256 of its content so unchanged text is never re-embedded."""
+    __tablename__ = "chunk_embeddings"
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False)
+    embedding_model = Column(String, nullable=False)
+    text = Column(Text, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32 vector bytes
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("content_hash", "embedding_model", name="uq_chunk_embeddings_hash_model"),
+    )
+
+class DosageDocumentChunk(Base):
+    __tablename__ = "dosage_document_chunks"
+    document_id = Column(Integer, ForeignKey("dosage_documents.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True)  # Chunk order within the document
+    chunk_id = Column(Integer, ForeignKey("chunk_embeddings.id"), nullable=False, index=True)
+    document = relationship("DosageDocument", back_populates="chunks")
+    chunk = relationship("ChunkEmbedding")
+
+class DrugDosage(Base):
+    __tablename__ = "drug_dosages"
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("dosage_documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    drug_name = Column(String, nullable=False)
+    normalized_name = Column(String, nullable=False)  # Lower-cased, punctuation-free name used for lookups
+    synonyms = Column(ARRAY(String), nullable=False, default=list)  # Normalized alternative names
+    indication = Column(Text, nullable=True)
+    population = Column(String, nullable=True)  # e.g. "Adult", "Child 1-5 years"
+    dose_text = Column(Text, nullable=False)
+    document = relationship("DosageDocument", back_populates="drug_dosages")
+
+    __table_args__ = (
+        # Exact and prefix matches on the drug name
+        Index("ix_drug_dosages_normalized_name", "normalized_name", postgresql_ops={"normalized_name": "text_pattern_ops"}),
+        # Fuzzy matches (requires the pg_trgm extension)
+        Index("ix_drug_dosages_normalized_name_trgm", "normalized_name", postgresql_using="gin", postgresql_ops={"normalized_name": "gin_trgm_ops"}),
+        Index("ix_drug_dosages_synonyms", "synonyms", postgresql_using="gin"),
+    )
 
 class StressLog(Base):
     __tablename__ = "stress_logs"
@@ -107,6 +302,12 @@ class StressLog(Base):
     stress_level = Column(String) 
     timestamp = Column(DateTime, default=datetime.utcnow)
     doctor = relationship("Doctor", back_populates="stress_logs")
+
+    __table_args__ = (
+        # Today's logs across a hospital, and a doctor's history
+        Index("ix_stress_logs_timestamp", "timestamp"),
+        Index("ix_stress_logs_doctor_id_timestamp", "doctor_id", "timestamp"),
+    )
     
 class EmpaticaIotData(Base):
     __tablename__ = "empatica_iot_data"
@@ -126,4 +327,9 @@ class EmpaticaIotData(Base):
     day_of_week = Column(String, nullable=False)
 
     timestamp = Column(DateTime, default=datetime.utcnow)
-    doctor = relationship("Doctor", back_populates="iot_data")
\ No newline at end of file
+    doctor = relationship("Doctor", back_populates="iot_data")
+
+    __table_args__ = (
+        # Latest readings of a doctor, read on every doctor login
+        Index("ix_empatica_iot_data_doctor_id_timestamp", "doctor_id", "timestamp"),
+    )
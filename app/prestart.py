@@ -0,0 +1,61 @@
+"""
+One-time startup work, run before the API workers are started:
+    python prestart.py && uvicorn main:app --workers 4
+
+- Empty database: create the schema from the models and stamp it with the latest Alembic revision.
+- Database under Alembic: apply the pending migrations (alembic upgrade head).
+- Database created by create_all before the app used Alembic: stamp it with the initial revision, then upgrade.
+- Then seed the initial hospitals and accounts if there are none yet.
+A Postgres advisory lock makes concurrent runs (several containers starting together) take turns; the later ones
+find nothing left to do.
+"""
+import sys
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import func, inspect, select
+from db import engine, Base
+from seed_db import create_schema, seed_database
+
+# Arbitrary key of the Postgres advisory lock held for the whole pre-start
+PRESTART_LOCK_KEY = 430_002
+# Revision and tables of the schema that create_all made before the migrations existed
+BASELINE_REVISION = "c27bfb2e8262"
+BASELINE_TABLES = {
+    "hospitals", "admins", "doctors", "patients", "prescriptions", "dosage_documents", "stress_logs", "empatica_iot_data",
+}
+
+def prepare_schema():
+    config = Config("alembic.ini")
+    with engine.connect() as conn:
+        tables = set(inspect(conn).get_table_names())
+
+    if "alembic_version" in tables:
+        print("Applying pending migrations")
+        command.upgrade(config, "head")
+    elif not tables & set(Base.metadata.tables):
+        print("Empty database, creating the schema")
+        create_schema()
+        command.stamp(config, "head")
+    elif tables & set(Base.metadata.tables) == BASELINE_TABLES:
+        print(f"Schema without an Alembic revision matches the baseline, stamping {BASELINE_REVISION} and migrating")
+        command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
+    else:
+        sys.exit(
+            "The database has tables but no Alembic revision, and they don't match the baseline schema. "
+            "Run `alembic stamp <revision>` with the revision its schema matches, then run prestart.py again."
+        )
+
+def main():
+    # Session level lock outside any transaction: CREATE INDEX CONCURRENTLY in migrations waits for open transactions
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_connection:
+        lock_connection.execute(select(func.pg_advisory_lock(PRESTART_LOCK_KEY)))
+        try:
+            prepare_schema()
+            seed_database()
+        finally:
+            lock_connection.execute(select(func.pg_advisory_unlock(PRESTART_LOCK_KEY)))
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Response, UploadFile, status
+from sqlalchemy import select, or_
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from models import Doctor, Patient, Admin, Hospital, Prescription, StressLog
-from schemas import DoctorCreate, DoctorUpdate, PatientCreate, PatientUpdate, PatientOut
+from schemas import DoctorCreate, DoctorUpdate, PatientCreate, PatientUpdate, PatientOut, ImportReport
 from utils.rbac import verify_role
 from utils.asdict import asdict
-from db import get_db
-from auth import get_current_user
+from utils.serializers import json_response
+from utils.pagination import PageParams, page_params, keyset_page, finish_page
+from utils.Onboarding.csv_import import PatientImporter, DoctorImporter, import_csv, issue_temporary_passwords
+from db import get_async_db, get_async_read_db
+from auth import get_current_user_async
 from fastapi.security import OAuth2PasswordBearer
-from auth import get_password_hash
+from auth import get_password_hash_async, invalidate_principal, email_registered, email_taken_exception
 from datetime import datetime
 import pytz
 
@@ -21,12 +26,15 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 async def create_doctor(
     doctor: DoctorCreate,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "admin")
+
+    if await email_registered(db, doctor.email):
+        raise email_taken_exception()
     
-    hashed_password = get_password_hash(doctor.password)
+    hashed_password = await get_password_hash_async(doctor.password)
     new_doctor = Doctor(
         name=doctor.name,
         email=doctor.email,
@@ -36,31 +44,56 @@ async def create_doctor(
         hashed_password=hashed_password
     )
     db.add(new_doctor)
-    db.commit()
-    db.refresh(new_doctor)
+    await db.commit()
+    await db.refresh(new_doctor, ["hospital"])
     
     return {
         **asdict(new_doctor),
         "hospital": asdict(new_doctor.hospital) if new_doctor.hospital else None
     }
 
+# Bulk import Doctors from a CSV file with name, email and specialty columns
+@router.post("/api/import-doctors/", response_model=ImportReport)
+async def import_doctors(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    dry_run: bool = Query(False, description="Only validate the file and report the rows that would fail"),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    current_user = await get_current_user_async(token, db)
+    verify_role(current_user, "admin")
+
+    importer = DoctorImporter(current_user.hospital_id)
+    result = await import_csv(db, file, importer, dry_run)
+    await db.commit()
+    # Temporary passwords are hashed and emailed after the response
+    background_tasks.add_task(issue_temporary_passwords, importer.inserted)
+
+    return ImportReport(**vars(result), dry_run=dry_run)
+
 # List Doctors in Admin's Hospital
 @router.get("/api/doctors/")
 async def get_doctors(
+    response: Response,
+    specialty: Optional[str] = Query(None, description="Only doctors with this specialty"),
+    search: Optional[str] = Query(None, description="Text contained in the doctor's name or email"),
+    page: PageParams = Depends(page_params),
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "admin")
     
-    doctors = (
-        db.query(Doctor)
-        .options(joinedload(Doctor.hospital))
-        .filter(Doctor.hospital_id == current_user.hospital_id)
-        .all()
-    )
+    query = select(Doctor).options(joinedload(Doctor.hospital)).where(Doctor.hospital_id == current_user.hospital_id)
+    if specialty:
+        query = query.where(Doctor.specialty == specialty)
+    if search:
+        query = query.where(or_(Doctor.name.icontains(search, autoescape=True), Doctor.email.icontains(search, autoescape=True)))
+    doctors = (await db.execute(keyset_page(query, [Doctor.id], page))).scalars().all()
+    doctors = finish_page(doctors, [Doctor.id], page, response)
     
-    return [
+    return json_response([
         {
             "id": d.id,
             "name": d.name,
@@ -69,7 +102,7 @@ async def get_doctors(
             "hospital": asdict(d.hospital) if d.hospital else None
         }
         for d in doctors
-    ]
+    ], response=response)
 
 # Update a Doctor
 @router.put("/api/update-doctor/{doctor_id}")
@@ -77,22 +110,26 @@ async def update_doctor(
     doctor_id: int,
     doctor: DoctorUpdate,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "admin")
     
-    existing_doctor = db.query(Doctor).filter(Doctor.id == doctor_id, Doctor.hospital_id == current_user.hospital_id).first()
+    existing_doctor = await db.scalar(
+        select(Doctor).options(joinedload(Doctor.hospital)).where(Doctor.id == doctor_id, Doctor.hospital_id == current_user.hospital_id)
+    )
     if not existing_doctor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found")
+    if doctor.email and await email_registered(db, doctor.email, exclude=("doctor", existing_doctor.id)):
+        raise email_taken_exception()
     
     existing_doctor.name = doctor.name or existing_doctor.name
     existing_doctor.email = doctor.email or existing_doctor.email
     existing_doctor.specialty = doctor.specialty or existing_doctor.specialty
     if doctor.password:
-        existing_doctor.password_hash = get_password_hash(doctor.password)
-    db.commit()
-    db.refresh(existing_doctor)
+        existing_doctor.hashed_password = await get_password_hash_async(doctor.password)
+    await db.commit()
+    invalidate_principal("doctor", existing_doctor.id)
     
     return {
         **asdict(existing_doctor),
@@ -104,17 +141,18 @@ async def update_doctor(
 async def delete_doctor(
     doctor_id: int,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "admin")
     
-    doctor = db.query(Doctor).filter(Doctor.id == doctor_id, Doctor.hospital_id == current_user.hospital_id).first()
+    doctor = await db.scalar(select(Doctor).where(Doctor.id == doctor_id, Doctor.hospital_id == current_user.hospital_id))
     if not doctor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Doctor not found")
     
-    db.delete(doctor)
-    db.commit()
+    await db.delete(doctor)
+    await db.commit()
+    invalidate_principal("doctor", doctor_id)
     return {"detail": "Doctor deleted successfully"}
 
 # Create a Patient (Admin only for their hospital)
@@ -122,9 +160,9 @@ async def delete_doctor(
 async def create_patient(
     patient: PatientCreate,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "admin")
     
     new_patient = Patient(
@@ -133,8 +171,8 @@ async def create_patient(
         hospital_id=current_user.hospital_id
     )
     db.add(new_patient)
-    db.commit()
-    db.refresh(new_patient)
+    await db.commit()
+    await db.refresh(new_patient, ["hospital"])
     
     return {
             **asdict(new_patient),
@@ -142,13 +180,32 @@ async def create_patient(
             # "prescriptions": [asdict(pr) for pr in p.prescriptions] if p.prescriptions and current_user.role=="doctor" else []
         }
 
+# Bulk import Patients from a CSV file with name and email columns
+@router.post("/api/import-patients/", response_model=ImportReport)
+async def import_patients(
+    file: UploadFile = File(...),
+    dry_run: bool = Query(False, description="Only validate the file and report the rows that would fail"),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    current_user = await get_current_user_async(token, db)
+    verify_role(current_user, "admin")
+
+    result = await import_csv(db, file, PatientImporter(current_user.hospital_id), dry_run)
+    await db.commit()
+
+    return ImportReport(**vars(result), dry_run=dry_run)
+
 # List Patients with Prescriptions
 @router.get("/api/patients/")
 async def get_patients(
+    response: Response,
+    search: Optional[str] = Query(None, description="Text contained in the patient's name or email"),
+    page: PageParams = Depends(page_params),
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     if current_user.role == "admin" or current_user.role == "doctor":
         pass
     else:
@@ -157,21 +214,24 @@ async def get_patients(
             detail=f"Insufficient permissions. Required role: Admin or Doctor",
         )
 
-    patients = (
-        db.query(Patient)
-        .options(joinedload(Patient.hospital), joinedload(Patient.prescriptions))
-        .filter(Patient.hospital_id == current_user.hospital_id)
-        .all()
-    )
+    query = select(Patient).options(joinedload(Patient.hospital)).where(Patient.hospital_id == current_user.hospital_id)
+    # Only doctors see prescriptions: one extra SELECT ... IN for the whole page, none for admins
+    include_prescriptions = current_user.role == "doctor"
+    if include_prescriptions:
+        query = query.options(selectinload(Patient.prescriptions))
+    if search:
+        query = query.where(or_(Patient.name.icontains(search, autoescape=True), Patient.email.icontains(search, autoescape=True)))
+    patients = (await db.execute(keyset_page(query, [Patient.id], page))).scalars().all()
+    patients = finish_page(patients, [Patient.id], page, response)
 
-    return [
+    return json_response([
         {
             **asdict(p),
             "hospital": asdict(p.hospital) if p.hospital else None,
-            "prescriptions": [asdict(pr) for pr in p.prescriptions] if p.prescriptions and current_user.role=="doctor" else []
+            "prescriptions": [asdict(pr) for pr in p.prescriptions] if include_prescriptions else []
         }
         for p in patients
-    ]
+    ], response=response)
 
 # Update a Patient
 @router.put("/api/update-patient/{patient_id}")
@@ -179,24 +239,28 @@ async def update_patient(
     patient_id: int,
     patient: PatientUpdate,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "admin")
     
-    existing_patient = db.query(Patient).filter(Patient.id == patient_id, Patient.hospital_id == current_user.hospital_id).first()
+    existing_patient = await db.scalar(
+        select(Patient)
+        .options(joinedload(Patient.hospital))
+        .where(Patient.id == patient_id, Patient.hospital_id == current_user.hospital_id)
+    )
     if not existing_patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
     
     existing_patient.name = patient.name or existing_patient.name
     existing_patient.email = patient.email or existing_patient.email
-    db.commit()
-    db.refresh(existing_patient)
+    await db.commit()
     
     return {
         **asdict(existing_patient),
         "hospital": asdict(existing_patient.hospital) if existing_patient.hospital else None,
-        "prescriptions": [asdict(pr) for pr in existing_patient.prescriptions] if existing_patient.prescriptions and current_user.role=="doctor" else []
+        # Only admins reach this route, and prescriptions are only shown to doctors
+        "prescriptions": []
     }
 
 #Delete a Patient (Admin only for their hospital)
@@ -204,26 +268,26 @@ async def update_patient(
 async def delete_patient(
     patient_id: int,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "admin")
     
-    patient = db.query(Patient).filter(Patient.id == patient_id, Patient.hospital_id == current_user.hospital_id).first()
+    patient = await db.scalar(select(Patient).where(Patient.id == patient_id, Patient.hospital_id == current_user.hospital_id))
     if not patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
     
-    db.delete(patient)
-    db.commit()
+    await db.delete(patient)
+    await db.commit()
     return {"detail": "Patient deleted successfully"}
 
 # Get All Stress Logs for the Day (Admin Only)
 @router.get("/api/stress-logs-today/")
 async def get_stress_logs_today(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     
     verify_role(current_user, "admin")
     tz = pytz.timezone("Africa/Nairobi")
@@ -231,17 +295,15 @@ async def get_stress_logs_today(
     today_end = datetime.now(tz).replace(hour=23, minute=59, second=59, microsecond=999999)
     
    # Get stress logs for doctors only in admin's hospital
-    stress_logs = (
-        db.query(StressLog)
+    stress_logs = (await db.execute(
+        select(StressLog)
         .join(Doctor)
-        .filter(
+        .where(
             Doctor.hospital_id == current_user.hospital_id,
             StressLog.timestamp >= today_start,
             StressLog.timestamp <= today_end
         )
-        .options(joinedload(StressLog.doctor))
-        .all()
-    )
+    )).scalars().all()
 
     if not stress_logs:
         raise HTTPException(
@@ -0,0 +1,112 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+from models import PrescriptionDailyStat, AnalyticsWatermark, Doctor
+from schemas import DiseaseTypeDayCount, MedicationCount, DoctorDayVolume
+from utils.rbac import verify_role
+from utils.Analytics.local_day import local_day
+from utils.Analytics.prescription_stats import WATERMARK_NAME
+from db import get_async_read_db
+from auth import get_current_user_async
+from fastapi.security import OAuth2PasswordBearer
+
+router = APIRouter()
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 366
+# Time up to which prescription changes are included in the aggregates
+REFRESHED_THROUGH_HEADER = "X-Analytics-Refreshed-Through"
+
+def day_range(date_from: Optional[date], date_to: Optional[date]):
+    date_to = date_to or local_day(datetime.utcnow())
+    date_from = date_from or date_to - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if date_from > date_to or (date_to - date_from).days >= MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"date_from must be on or before date_to, at most {MAX_RANGE_DAYS} days apart",
+        )
+    return date_from, date_to
+
+async def admin_stats_filter(token: str, db: AsyncSession, date_from: Optional[date], date_to: Optional[date], response: Response):
+    """Check the caller is an admin and return the filters of their hospital's stats over the requested days."""
+    current_user = await get_current_user_async(token, db)
+    verify_role(current_user, "admin")
+    date_from, date_to = day_range(date_from, date_to)
+
+    refreshed_through = await db.scalar(select(AnalyticsWatermark.value).where(AnalyticsWatermark.name == WATERMARK_NAME))
+    if refreshed_through:
+        response.headers[REFRESHED_THROUGH_HEADER] = refreshed_through.isoformat()
+    return (
+        PrescriptionDailyStat.hospital_id == current_user.hospital_id,
+        PrescriptionDailyStat.day >= date_from,
+        PrescriptionDailyStat.day <= date_to,
+    )
+
+# Prescriptions per day and disease type
+@router.get("/api/analytics/disease-types/", response_model=List[DiseaseTypeDayCount])
+async def get_disease_type_counts(
+    response: Response,
+    date_from: Optional[date] = Query(None, description=f"First day, defaults to {DEFAULT_RANGE_DAYS} days before date_to"),
+    date_to: Optional[date] = Query(None, description="Last day (included), defaults to today"),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    filters = await admin_stats_filter(token, db, date_from, date_to, response)
+    rows = (await db.execute(
+        select(PrescriptionDailyStat.day, PrescriptionDailyStat.diseases_type, func.sum(PrescriptionDailyStat.prescriptions))
+        .where(*filters)
+        .group_by(PrescriptionDailyStat.day, PrescriptionDailyStat.diseases_type)
+        .order_by(PrescriptionDailyStat.day, PrescriptionDailyStat.diseases_type)
+    )).all()
+    return [DiseaseTypeDayCount(day=day, diseases_type=diseases_type, prescriptions=total) for day, diseases_type, total in rows]
+
+# Most prescribed medications over the period
+@router.get("/api/analytics/top-medications/", response_model=List[MedicationCount])
+async def get_top_medications(
+    response: Response,
+    date_from: Optional[date] = Query(None, description=f"First day, defaults to {DEFAULT_RANGE_DAYS} days before date_to"),
+    date_to: Optional[date] = Query(None, description="Last day (included), defaults to today"),
+    limit: int = Query(10, ge=1, le=100),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    filters = await admin_stats_filter(token, db, date_from, date_to, response)
+    total = func.sum(PrescriptionDailyStat.prescriptions)
+    rows = (await db.execute(
+        select(PrescriptionDailyStat.medication, total)
+        .where(*filters)
+        .group_by(PrescriptionDailyStat.medication)
+        .order_by(total.desc(), PrescriptionDailyStat.medication)
+        .limit(limit)
+    )).all()
+    return [MedicationCount(medication=medication, prescriptions=count) for medication, count in rows]
+
+# Prescriptions per day and doctor
+@router.get("/api/analytics/doctor-volumes/", response_model=List[DoctorDayVolume])
+async def get_doctor_volumes(
+    response: Response,
+    date_from: Optional[date] = Query(None, description=f"First day, defaults to {DEFAULT_RANGE_DAYS} days before date_to"),
+    date_to: Optional[date] = Query(None, description="Last day (included), defaults to today"),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    filters = await admin_stats_filter(token, db, date_from, date_to, response)
+    volumes = (
+        select(PrescriptionDailyStat.day, PrescriptionDailyStat.doctor_id, func.sum(PrescriptionDailyStat.prescriptions).label("total"))
+        .where(*filters)
+        .group_by(PrescriptionDailyStat.day, PrescriptionDailyStat.doctor_id)
+        .subquery()
+    )
+    rows = (await db.execute(
+        select(volumes.c.day, volumes.c.doctor_id, Doctor.name, volumes.c.total)
+        .outerjoin(Doctor, Doctor.id == volumes.c.doctor_id)
+        .order_by(volumes.c.day, volumes.c.doctor_id)
+    )).all()
+    return [
+        DoctorDayVolume(day=day, doctor_id=doctor_id, doctor_name=name, prescriptions=total)
+        for day, doctor_id, name, total in rows
+    ]
@@ -1,33 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from models import Prescription, Patient, EmpaticaIotData
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select, func, Float
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from models import Prescription, Patient, Doctor, EmpaticaIotData, DiseaseTypeEnum
 from schemas import PrescriptionCreate, PrescriptionUpdate, PrescriptionOut, EmpaticaDataIn
 from utils.rbac import verify_role
 from utils.IoT.categorize_time_of_day import categorize_time_of_day
 from utils.asdict import asdict
-from db import get_db
-from auth import get_current_user
+from utils.serializers import prescription_out, json_response
+from utils.pagination import PageParams, page_params, bounded_page_params, keyset_page, finish_page
+from db import get_async_db, get_async_read_db
+from auth import get_current_user_async
 from fastapi.security import OAuth2PasswordBearer
-from fastapi.encoders import jsonable_encoder
 from datetime import datetime
+from utils.timestamps import naive_utc
 
 router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Prescription responses include the patient and doctor, each with their hospital
+prescription_relations = (
+    joinedload(Prescription.patient).joinedload(Patient.hospital),
+    joinedload(Prescription.doctor).joinedload(Doctor.hospital),
+)
+
 # Create a Prescription (Doctor only for their hospital's patients)
 @router.post("/api/create-prescription/", response_model=PrescriptionOut, status_code=status.HTTP_201_CREATED)
 async def create_prescription(
     prescription: PrescriptionCreate,
     patient_id: int,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "doctor")
     
-    patient = db.query(Patient).filter(Patient.id == patient_id, Patient.hospital_id == current_user.hospital_id).first()
+    patient = await db.scalar(select(Patient).where(Patient.id == patient_id, Patient.hospital_id == current_user.hospital_id))
     if not patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found or does not belong to your hospital")
     
@@ -44,52 +54,91 @@ async def create_prescription(
     )
 
     db.add(new_prescription)
-    db.commit()
-    db.refresh(new_prescription)
+    await db.commit()
+    new_prescription = await db.scalar(
+        select(Prescription)
+        .options(*prescription_relations)
+        .where(Prescription.id == new_prescription.id)
+        .execution_options(populate_existing=True)
+    )
     
-    return {
-            **jsonable_encoder(new_prescription),
-            "patient": {
-                **jsonable_encoder(new_prescription.patient),
-                "hospital": jsonable_encoder(new_prescription.patient.hospital) 
-            } if new_prescription.patient else None,
-            "doctor": {
-                **jsonable_encoder(new_prescription.doctor),
-                "hospital": jsonable_encoder(new_prescription.doctor.hospital)  
-            } if new_prescription.doctor else None
-        }
+    return json_response(prescription_out(new_prescription), status_code=status.HTTP_201_CREATED)
 
 # Get Prescriptions for a Specific Patient
 @router.get("/api/prescriptions/{patient_id}", response_model=List[PrescriptionOut])
 async def get_prescriptions(
     patient_id: int,
+    response: Response,
+    diseases_type: Optional[DiseaseTypeEnum] = Query(None),
+    doctor_id: Optional[int] = Query(None, description="Only prescriptions written by this doctor"),
+    created_from: Optional[datetime] = Query(None, description="Only prescriptions created at or after this time (UTC)"),
+    created_to: Optional[datetime] = Query(None, description="Only prescriptions created before this time (UTC)"),
+    page: PageParams = Depends(page_params),
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "doctor")
     
-    patient = db.query(Patient).filter(Patient.id == patient_id, Patient.hospital_id == current_user.hospital_id).first()
+    # Loaded once with its hospital; every row's `pr.patient` then resolves from the session's identity map
+    patient = await db.scalar(
+        select(Patient)
+        .options(joinedload(Patient.hospital))
+        .where(Patient.id == patient_id, Patient.hospital_id == current_user.hospital_id)
+    )
     if not patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found or does not belong to your hospital")
     
-    prescriptions = db.query(Prescription).filter(Prescription.patient_id == patient_id).all()
+    # A patient sees few doctors: one SELECT ... IN for them instead of joining a doctor and hospital onto every row
+    query = (
+        select(Prescription)
+        .options(selectinload(Prescription.doctor).joinedload(Doctor.hospital))
+        .where(Prescription.patient_id == patient_id)
+    )
+    if diseases_type:
+        query = query.where(Prescription.diseases_type == diseases_type)
+    if doctor_id is not None:
+        query = query.where(Prescription.doctor_id == doctor_id)
+    if created_from:
+        query = query.where(Prescription.created_at >= naive_utc(created_from))
+    if created_to:
+        query = query.where(Prescription.created_at < naive_utc(created_to))
+    prescriptions = (await db.execute(keyset_page(query, [Prescription.id], page))).scalars().all()
+    prescriptions = finish_page(prescriptions, [Prescription.id], page, response)
     
-    # Serialize the prescriptions, explicitly including hospital info for patient and doctor
-    return [
-        {
-            **jsonable_encoder(pr),
-            "patient": {
-                **jsonable_encoder(pr.patient),
-                "hospital": jsonable_encoder(pr.patient.hospital) 
-            } if pr.patient else None,
-            "doctor": {
-                **jsonable_encoder(pr.doctor),
-                "hospital": jsonable_encoder(pr.doctor.hospital)  
-            } if pr.doctor else None
-        }
-        for pr in prescriptions
-    ]
+    return json_response([prescription_out(pr) for pr in prescriptions], response=response)
+
+# Full-text search over the prescriptions of the doctor's hospital, best matches first
+@router.get("/api/search-prescriptions/", response_model=List[PrescriptionOut])
+async def search_prescriptions(
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=200, description="Words to find in the medication, diagnosis, observations or treatment plan"),
+    patient_id: Optional[int] = Query(None, description="Only prescriptions of this patient"),
+    diseases_type: Optional[DiseaseTypeEnum] = Query(None),
+    page: PageParams = Depends(bounded_page_params),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    current_user = await get_current_user_async(token, db)
+    verify_role(current_user, "doctor")
+
+    # websearch syntax: quoted phrases, "or", and -excluded words; never a syntax error
+    terms = func.websearch_to_tsquery("english", q)
+    rank = func.ts_rank_cd(Prescription.search_vector, terms, type_=Float)
+    query = (
+        select(Prescription, rank.label("rank"))
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .options(*prescription_relations)
+        .where(Patient.hospital_id == current_user.hospital_id, Prescription.search_vector.op("@@")(terms))
+    )
+    if patient_id is not None:
+        query = query.where(Prescription.patient_id == patient_id)
+    if diseases_type:
+        query = query.where(Prescription.diseases_type == diseases_type)
+    key_columns = [rank, Prescription.id]
+    rows = (await db.execute(keyset_page(query, key_columns, page, descending=True))).all()
+    rows = finish_page(rows, key_columns, page, response, key=lambda row: [row.rank, row.Prescription.id])
+    return json_response([prescription_out(row.Prescription) for row in rows], response=response)
 
 # Update a Prescription
 @router.put("/api/update-prescription/{prescription_id}", response_model=PrescriptionOut)
@@ -97,12 +146,16 @@ async def update_prescription(
     prescription_id: int,
     prescription: PrescriptionUpdate,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "doctor")
     
-    existing_prescription = db.query(Prescription).filter(Prescription.id == prescription_id, Prescription.doctor_id == current_user.id).first()
+    existing_prescription = await db.scalar(
+        select(Prescription)
+        .options(*prescription_relations)
+        .where(Prescription.id == prescription_id, Prescription.doctor_id == current_user.id)
+    )
     if not existing_prescription:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prescription not found or does not belong to you")
     
@@ -114,46 +167,35 @@ async def update_prescription(
     existing_prescription.treatment_plan = prescription.treatment_plan or existing_prescription.treatment_plan
     existing_prescription.doctor_notes = prescription.doctor_notes or existing_prescription.doctor_notes
 
-    db.commit()
-    db.refresh(existing_prescription)
+    await db.commit()
     
-    return {
-            **jsonable_encoder(existing_prescription),
-            "patient": {
-                **jsonable_encoder(existing_prescription.patient),
-                "hospital": jsonable_encoder(existing_prescription.patient.hospital) 
-            } if existing_prescription.patient else None,
-            "doctor": {
-                **jsonable_encoder(existing_prescription.doctor),
-                "hospital": jsonable_encoder(existing_prescription.doctor.hospital)  
-            } if existing_prescription.doctor else None
-        }
+    return json_response(prescription_out(existing_prescription))
 
 # Delete a Prescription
 @router.delete("/api/delete-prescription/{prescription_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_prescription(
     prescription_id: int,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "doctor")
     
-    prescription = db.query(Prescription).filter(Prescription.id == prescription_id, Prescription.doctor_id == current_user.id).first()
+    prescription = await db.scalar(select(Prescription).where(Prescription.id == prescription_id, Prescription.doctor_id == current_user.id))
     if not prescription:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prescription not found or does not belong to you")
     
-    db.delete(prescription)
-    db.commit()
+    await db.delete(prescription)
+    await db.commit()
     return {"detail": "Prescription deleted successfully"}
 
 @router.post("/api/empatica-data/", status_code=status.HTTP_201_CREATED)
 async def receive_empatica_data(
     data: EmpaticaDataIn,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "doctor")
 
     now = datetime.utcnow()
@@ -174,8 +216,7 @@ async def receive_empatica_data(
     )
 
     db.add(new_record)
-    db.commit()
-    db.refresh(new_record)
+    await db.commit()
 
     return {
         "detail": "Empatica wearable data saved successfully",
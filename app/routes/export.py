@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
+from utils.timestamps import naive_utc
+from models import Prescription, Patient, Doctor, EmpaticaIotData
+from utils.Export.table_export import ExportFormat, EXPORT_MEDIA_TYPES, stream_export
+from db import get_async_read_db
+from auth import get_current_user_async
+from fastapi.security import OAuth2PasswordBearer
+
+router = APIRouter()
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+# Exported columns: ids instead of patient and doctor details
+PRESCRIPTION_EXPORT_COLUMNS = [
+    Prescription.id,
+    Prescription.patient_id,
+    Prescription.doctor_id,
+    Patient.hospital_id,
+    Prescription.medication,
+    Prescription.dosage,
+    Prescription.observations,
+    Prescription.diagnosis,
+    Prescription.diseases_type,
+    Prescription.treatment_plan,
+    Prescription.doctor_notes,
+    Prescription.created_at,
+    Prescription.updated_at,
+]
+
+IOT_EXPORT_COLUMNS = [
+    EmpaticaIotData.id,
+    EmpaticaIotData.doctor_id,
+    Doctor.hospital_id,
+    EmpaticaIotData.x,
+    EmpaticaIotData.y,
+    EmpaticaIotData.z,
+    EmpaticaIotData.eda,
+    EmpaticaIotData.heart_rate,
+    EmpaticaIotData.temperature,
+    EmpaticaIotData.time_of_day,
+    EmpaticaIotData.day_of_week,
+    EmpaticaIotData.timestamp,
+]
+
+def export_hospital_id(current_user, hospital_id: Optional[int]) -> Optional[int]:
+    """
+    Hospital an export is restricted to: an admin's own, or for a super admin the requested one (None for all).
+    :return: Raises HTTPException (403) for other roles or another hospital
+    """
+    if current_user.role == "super_admin":
+        return hospital_id
+    if current_user.role != "admin" or (hospital_id is not None and hospital_id != current_user.hospital_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions. Admins can only export their own hospital",
+        )
+    return current_user.hospital_id
+
+def export_response(statement, table: str, export_format: ExportFormat) -> StreamingResponse:
+    filename = f"{table}-{datetime.utcnow():%Y%m%dT%H%M%S}.{export_format.value}"
+    return StreamingResponse(
+        stream_export(statement, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# Export Prescriptions (Admin: their hospital, Super Admin: any or all hospitals)
+@router.get("/api/export/prescriptions/")
+async def export_prescriptions(
+    export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+    hospital_id: Optional[int] = Query(None, description="Only this hospital (super admins; admins always get their own)"),
+    doctor_id: Optional[int] = Query(None, description="Only prescriptions written by this doctor"),
+    created_from: Optional[datetime] = Query(None, description="Only prescriptions created at or after this time (UTC)"),
+    created_to: Optional[datetime] = Query(None, description="Only prescriptions created before this time (UTC)"),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    current_user = await get_current_user_async(token, db)
+    hospital_id = export_hospital_id(current_user, hospital_id)
+
+    query = select(*PRESCRIPTION_EXPORT_COLUMNS).join(Patient, Prescription.patient_id == Patient.id)
+    if hospital_id is not None:
+        query = query.where(Patient.hospital_id == hospital_id)
+    if doctor_id is not None:
+        query = query.where(Prescription.doctor_id == doctor_id)
+    if created_from:
+        query = query.where(Prescription.created_at >= naive_utc(created_from))
+    if created_to:
+        query = query.where(Prescription.created_at < naive_utc(created_to))
+
+    return export_response(query.order_by(Prescription.id), "prescriptions", export_format)
+
+# Export Empatica wearable readings (Admin: their hospital, Super Admin: any or all hospitals)
+@router.get("/api/export/empatica-data/")
+async def export_empatica_data(
+    export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+    hospital_id: Optional[int] = Query(None, description="Only this hospital (super admins; admins always get their own)"),
+    doctor_id: Optional[int] = Query(None, description="Only readings of this doctor"),
+    recorded_from: Optional[datetime] = Query(None, description="Only readings taken at or after this time (UTC)"),
+    recorded_to: Optional[datetime] = Query(None, description="Only readings taken before this time (UTC)"),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    current_user = await get_current_user_async(token, db)
+    hospital_id = export_hospital_id(current_user, hospital_id)
+
+    query = select(*IOT_EXPORT_COLUMNS).join(Doctor, EmpaticaIotData.doctor_id == Doctor.id)
+    if hospital_id is not None:
+        query = query.where(Doctor.hospital_id == hospital_id)
+    if doctor_id is not None:
+        query = query.where(EmpaticaIotData.doctor_id == doctor_id)
+    if recorded_from:
+        query = query.where(EmpaticaIotData.timestamp >= naive_utc(recorded_from))
+    if recorded_to:
+        query = query.where(EmpaticaIotData.timestamp < naive_utc(recorded_to))
+
+    return export_response(query.order_by(EmpaticaIotData.id), "empatica_iot_data", export_format)
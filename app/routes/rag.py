@@ -1,38 +1,107 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from utils.rbac import verify_role
 from db import get_db
 from auth import get_current_user
 from fastapi.security import OAuth2PasswordBearer
 from utils.RAG.pdf_parser import process_and_store_pdf_content
 from utils.RAG.query_handler import get_dosage_info
+from utils.RAG.drug_index import store_drug_dosages, search_drug_dosages, resolve_dosage_query
+from utils.RAG.vector_collections import collection_manager
+from utils.RAG.uploads import save_pdf_upload
 from models import DosageDocument
-from schemas import QueryDosageRequest
+from schemas import QueryDosageRequest, DrugDosageOut, DosageDocumentOut
 
 router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+def already_uploaded(document: DosageDocument) -> dict:
+    return {"message": "KNMF already uploaded", "document_id": document.id, "drug_entries": 0}
+
 @router.post("/api/upload-knmf/")
 def upload_dosage_pdf(
     file: UploadFile = File(...),
+    edition: Optional[str] = Form(None),
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ):
     current_user = get_current_user(token, db)
     verify_role(current_user, "super_admin")
     
-    file_path = f"/tmp/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        buffer.write(file.file.read())
+    # Stream the upload to a checksum-named file instead of reading it into memory
+    file_path, checksum = save_pdf_upload(file)
+
+    # The same file has already been ingested, nothing to re-embed
+    existing_document = db.query(DosageDocument).filter(DosageDocument.checksum == checksum).first()
+    if existing_document:
+        return already_uploaded(existing_document)
     
     # Parse and save to database
-    process_and_store_pdf_content(file_path)
-    dosage_document = DosageDocument(title=file.filename, content=file_path, uploaded_by=current_user.id)
+    dosage_document = DosageDocument(title=file.filename, content=file_path, edition=edition, checksum=checksum, uploaded_by=current_user.id)
     db.add(dosage_document)
+    try:
+        # A concurrent upload of the same file holds the checksum: this waits for it to commit, then fails
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        existing_document = db.query(DosageDocument).filter(DosageDocument.checksum == checksum).first()
+        if not existing_document:
+            raise
+        return already_uploaded(existing_document)
+    try:
+        pdf_content = process_and_store_pdf_content(file_path, db, dosage_document)
+        # Structured drug/dose rows for the exact-match fast path
+        drug_entries = store_drug_dosages(db, dosage_document.id, pdf_content)
+        db.commit()
+    except Exception:
+        # Don't leave an index behind for a document that was never saved
+        collection_manager.remove(dosage_document.id)
+        raise
+    return {"message": "KNMF uploaded successfully", "document_id": dosage_document.id, "drug_entries": drug_entries}
+
+@router.get("/api/dosage-documents/", response_model=List[DosageDocumentOut])
+def get_dosage_documents(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    current_user = get_current_user(token, db)
+    verify_role(current_user, "super_admin")
+
+    return db.query(DosageDocument).order_by(DosageDocument.id).all()
+
+@router.delete("/api/delete-dosage-document/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_dosage_document(
+    document_id: int,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    current_user = get_current_user(token, db)
+    verify_role(current_user, "super_admin")
+
+    dosage_document = db.query(DosageDocument).filter(DosageDocument.id == document_id).first()
+    if not dosage_document:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dosage document not found")
+
+    # Only this document's collection is dropped; the other indexes are not rebuilt
+    db.delete(dosage_document)
     db.commit()
-    return {"message": "KNMF uploaded successfully"}
+    collection_manager.remove(document_id)
+    return {"detail": "Dosage document deleted successfully"}
+
+@router.get("/api/drug-dosages/", response_model=List[DrugDosageOut])
+def lookup_drug_dosages(
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    current_user = get_current_user(token, db)
+    verify_role(current_user, "doctor")
+
+    return search_drug_dosages(db, q, limit)
 
 @router.post("/api/query-dosage/")
 def query_dosage(
@@ -48,6 +117,19 @@ def query_dosage(
     # if not dosage_document:
     #     raise HTTPException(status_code=404, detail="No dosage document found")
 
-    # Perform the query using the FAISS index loaded in get_dosage_info
-    response = get_dosage_info(request.query)
+    # Resolve the document/edition filters to the dosage documents to search
+    document_ids = request.document_ids
+    if request.editions:
+        edition_ids = [doc_id for (doc_id,) in db.query(DosageDocument.id).filter(DosageDocument.edition.in_(request.editions))]
+        document_ids = [doc_id for doc_id in edition_ids if not document_ids or doc_id in document_ids]
+        if not document_ids:
+            raise HTTPException(status_code=404, detail="No dosage document found for the requested edition")
+
+    # Simple "dose of X for Y" questions are answered straight from the drug index
+    answer = resolve_dosage_query(db, request.query, document_ids)
+    if answer:
+        return {"response": {"content": answer}, "source": "drug_index"}
+
+    # Perform the query over the FAISS collections in get_dosage_info
+    response = get_dosage_info(request.query, document_ids=document_ids)
     return {"response": response}
\ No newline at end of file
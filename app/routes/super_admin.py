@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select, or_
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from models import Hospital, Admin
 from schemas import HospitalCreate, HospitalUpdate, AdminCreate, AdminUpdate, HospitalOut, AdminOut
 from utils.rbac import verify_role
-from db import get_db
-from auth import get_current_user
+from utils.pagination import PageParams, page_params, keyset_page, finish_page
+from db import get_async_db, get_async_read_db
+from auth import get_current_user_async
 from fastapi.security import OAuth2PasswordBearer
-from auth import get_password_hash
+from auth import get_password_hash_async, invalidate_principal, principal_cache, email_registered, email_taken_exception
 from utils.Notifications.credentials_verify import generate_temp_password, send_temporary_password
 
 router = APIRouter()
@@ -20,18 +23,17 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 async def create_hospital(
     hospital: HospitalCreate,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "super_admin")
 
-    if db.query(Hospital).filter(Hospital.name == hospital.name).first():
+    if await db.scalar(select(Hospital).where(Hospital.name == hospital.name)):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Hospital name already exists")
 
     new_hospital = Hospital(name=hospital.name, location=hospital.location)
     db.add(new_hospital)
-    db.commit()
-    db.refresh(new_hospital)
+    await db.commit()
 
     return HospitalOut(id=new_hospital.id, name=new_hospital.name, location=new_hospital.location)
 
@@ -39,13 +41,23 @@ async def create_hospital(
 # 2. List All Hospitals
 @router.get("/api/hospitals/", response_model=List[HospitalOut])
 async def get_hospitals(
+    response: Response,
+    location: Optional[str] = Query(None, description="Only hospitals at this location"),
+    search: Optional[str] = Query(None, description="Text contained in the hospital's name"),
+    page: PageParams = Depends(page_params),
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "super_admin")
 
-    hospitals = db.query(Hospital).all()
+    query = select(Hospital)
+    if location:
+        query = query.where(Hospital.location == location)
+    if search:
+        query = query.where(Hospital.name.icontains(search, autoescape=True))
+    hospitals = (await db.execute(keyset_page(query, [Hospital.id], page))).scalars().all()
+    hospitals = finish_page(hospitals, [Hospital.id], page, response)
     return [HospitalOut(id=hospital.id, name=hospital.name, location=hospital.location) for hospital in hospitals]
 
 
@@ -55,19 +67,18 @@ async def update_hospital(
     hospital_id: int,
     hospital: HospitalUpdate,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "super_admin")
 
-    existing_hospital = db.query(Hospital).filter(Hospital.id == hospital_id).first()
+    existing_hospital = await db.scalar(select(Hospital).where(Hospital.id == hospital_id))
     if not existing_hospital:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found")
 
     existing_hospital.name = hospital.name or existing_hospital.name
     existing_hospital.location = hospital.location or existing_hospital.location
-    db.commit()
-    db.refresh(existing_hospital)
+    await db.commit()
 
     return HospitalOut(id=existing_hospital.id, name=existing_hospital.name, location=existing_hospital.location)
 
@@ -77,17 +88,19 @@ async def update_hospital(
 async def delete_hospital(
     hospital_id: int,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "super_admin")
 
-    hospital = db.query(Hospital).filter(Hospital.id == hospital_id).first()
+    hospital = await db.scalar(select(Hospital).where(Hospital.id == hospital_id))
     if not hospital:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found")
 
-    db.delete(hospital)
-    db.commit()
+    await db.delete(hospital)
+    await db.commit()
+    # The hospital's admins and doctors were deleted with it
+    principal_cache.clear()
     return {"detail": "Hospital deleted successfully"}
 
 
@@ -97,20 +110,20 @@ async def create_admin(
     admin: AdminCreate,
     hospital_id: int,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db, role="super_admin")
+    current_user = await get_current_user_async(token, db, role="super_admin")
     verify_role(current_user, "super_admin")
 
-    hospital = db.query(Hospital).filter(Hospital.id == hospital_id).first()
+    hospital = await db.scalar(select(Hospital).where(Hospital.id == hospital_id))
     if not hospital:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Hospital not found")
 
-    if db.query(Admin).filter(Admin.email == admin.email).first():
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Admin email already exists")
+    if await email_registered(db, admin.email):
+        raise email_taken_exception()
 
     temp_password = generate_temp_password()
-    hashed_password = get_password_hash(temp_password)
+    hashed_password = await get_password_hash_async(temp_password)
     new_admin = Admin(
         name=admin.name,
         email=admin.email,
@@ -121,21 +134,33 @@ async def create_admin(
     )
     send_temporary_password(new_admin.email, temp_password, new_admin.name)
     db.add(new_admin)
-    db.commit()
-    db.refresh(new_admin)
-    return AdminOut(id=new_admin.id, name=new_admin.name, email=new_admin.email, role=new_admin.role, hospital_name=new_admin.hospital.name)
+    await db.commit()
+    return AdminOut(id=new_admin.id, name=new_admin.name, email=new_admin.email, role=new_admin.role, hospital_name=hospital.name)
 
 
 # 6. List All Admins
 @router.get("/api/admins/", response_model=List[AdminOut])
 async def get_admins(
+    response: Response,
+    hospital_id: Optional[int] = Query(None, description="Only admins of this hospital"),
+    role: Optional[str] = Query(None, description="Only admins with this role, e.g. admin or super_admin"),
+    search: Optional[str] = Query(None, description="Text contained in the admin's name or email"),
+    page: PageParams = Depends(page_params),
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "super_admin")
 
-    admins = db.query(Admin).all()
+    query = select(Admin).options(joinedload(Admin.hospital))
+    if hospital_id is not None:
+        query = query.where(Admin.hospital_id == hospital_id)
+    if role:
+        query = query.where(Admin.role == role)
+    if search:
+        query = query.where(or_(Admin.name.icontains(search, autoescape=True), Admin.email.icontains(search, autoescape=True)))
+    admins = (await db.execute(keyset_page(query, [Admin.id], page))).scalars().all()
+    admins = finish_page(admins, [Admin.id], page, response)
     return [AdminOut(id=admin.id, name=admin.name, email=admin.email, role=admin.role, hospital_name=admin.hospital.name) for admin in admins]
 
 
@@ -145,21 +170,23 @@ async def update_admin(
     admin_id: int,
     admin: AdminUpdate,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "super_admin")
 
-    existing_admin = db.query(Admin).filter(Admin.id == admin_id).first()
+    existing_admin = await db.scalar(select(Admin).options(joinedload(Admin.hospital)).where(Admin.id == admin_id))
     if not existing_admin:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Admin not found")
+    if admin.email and await email_registered(db, admin.email, exclude=("admin", existing_admin.id)):
+        raise email_taken_exception()
 
     existing_admin.name = admin.name or existing_admin.name
     existing_admin.email = admin.email or existing_admin.email
     if admin.password:
-        existing_admin.hashed_password = get_password_hash(admin.password)
-    db.commit()
-    db.refresh(existing_admin)
+        existing_admin.hashed_password = await get_password_hash_async(admin.password)
+    await db.commit()
+    invalidate_principal("admin", existing_admin.id)
 
     return AdminOut(id=existing_admin.id, name=existing_admin.name, email=existing_admin.email, role=existing_admin.role,hospital_name=existing_admin.hospital.name)
 
@@ -169,15 +196,16 @@ async def update_admin(
 async def delete_admin(
     admin_id: int,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user = get_current_user(token, db)
+    current_user = await get_current_user_async(token, db)
     verify_role(current_user, "super_admin")
 
-    admin = db.query(Admin).filter(Admin.id == admin_id).first()
+    admin = await db.scalar(select(Admin).where(Admin.id == admin_id))
     if not admin:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Admin not found")
 
-    db.delete(admin)
-    db.commit()
+    await db.delete(admin)
+    await db.commit()
+    invalidate_principal("admin", admin_id)
     return {"detail": "Admin deleted successfully"}
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum 
 
 # Hospital Schemas
@@ -62,6 +62,10 @@ class DoctorCreate(DoctorBase):
     password: str
     role: str
 
+class DoctorImportRow(DoctorBase):
+    """Row of a doctor import file; the role is always doctor and a temporary password is emailed."""
+    pass
+
 class DoctorUpdate(DoctorBase):
     """Schema for updating doctor details."""
     name: Optional[str] = None
@@ -150,12 +154,53 @@ class DosageDocumentUpdate(DosageDocumentBase):
 
 class DosageDocumentOut(DosageDocumentBase):
     id: int
+    edition: Optional[str] = None
     uploaded_by: int
     uploaded_at: datetime
 
     class Config:
         from_attributes = True
 
+class DrugDosageOut(BaseModel):
+    id: int
+    document_id: int
+    drug_name: str
+    synonyms: List[str] = []
+    indication: Optional[str] = None
+    population: Optional[str] = None
+    dose_text: str
+
+    class Config:
+        from_attributes = True
+
+# Bulk Import Schemas
+class ImportRowError(BaseModel):
+    row: int  # Line of the CSV file
+    errors: List[str]
+
+class ImportReport(BaseModel):
+    total_rows: int
+    imported: int
+    failed: int
+    dry_run: bool
+    errors: List[ImportRowError] = []  # The first MAX_REPORTED_ERRORS failed rows
+
+# Analytics Schemas
+class DiseaseTypeDayCount(BaseModel):
+    day: date
+    diseases_type: Optional[DiseaseTypeEnum] = None
+    prescriptions: int
+
+class MedicationCount(BaseModel):
+    medication: str
+    prescriptions: int
+
+class DoctorDayVolume(BaseModel):
+    day: date
+    doctor_id: Optional[int] = None
+    doctor_name: Optional[str] = None
+    prescriptions: int
+
 # User-related schemas (for login)
 class LoginRequest(BaseModel):
     email: EmailStr
@@ -163,6 +208,8 @@ class LoginRequest(BaseModel):
 
 class QueryDosageRequest(BaseModel):
     query: str
+    document_ids: Optional[List[int]] = None  # Restrict the search to these dosage documents
+    editions: Optional[List[str]] = None  # Restrict the search to these formulary editions
     
 class EmpaticaDataIn(BaseModel):
     x: float 
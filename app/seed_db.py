@@ -1,5 +1,6 @@
 from datetime import datetime, timezone, timedelta
 from sqlalchemy.orm import Session
+from sqlalchemy import text
 from models import Patient, Prescription, Doctor, Admin, Hospital, DiseaseTypeEnum, EmpaticaIotData
 from db import SessionLocal, engine, Base
 from auth import get_password_hash
@@ -9,8 +10,11 @@ from utils.IoT.categorize_time_of_day import categorize_time_of_day
 
 load_dotenv(override=True)
 
-# Create the database tables
-Base.metadata.create_all(bind=engine)
+def create_schema():
+    # Create the database tables (trigram indexes need pg_trgm)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    Base.metadata.create_all(bind=engine)
 
 def seed_database():
     db = SessionLocal()
@@ -176,5 +180,5 @@ def seed_database():
 
 if __name__ == "__main__":
     Base.metadata.drop_all(bind=engine)  # Drop existing tables
-    Base.metadata.create_all(bind=engine)  # Recreate tables
+    create_schema()  # Recreate tables
     seed_database()
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+import pytest
+from utils.RAG.drug_index import match_query_rows, normalize_name
+
+def dose_row(drug, population, indication, synonyms=()):
+    return SimpleNamespace(
+        drug_name=drug, normalized_name=normalize_name(drug), synonyms=list(synonyms),
+        population=population, indication=indication, dose_text="",
+    )
+
+AMOXICILLIN = [
+    dose_row("Amoxicillin", "Adult", "Bacterial infections"),
+    dose_row("Amoxicillin", "Child 1-5 years", "Bacterial infections"),
+]
+METFORMIN = [dose_row("Metformin", "Adult", "Type 2 diabetes", synonyms=["glucophage"])]
+
+def matches(rows, query):
+    return [row.population for row in match_query_rows(rows, normalize_name(query).split())]
+
+@pytest.mark.parametrize("rows, query, populations", [
+    (METFORMIN, "Dose of metformin", ["Adult"]),
+    (METFORMIN, "What is the usual dose of glucophage?", ["Adult"]),
+    (AMOXICILLIN, "What is the dose of amoxicillin for adults?", ["Adult"]),
+    (AMOXICILLIN, "Amoxicillin dosage for a child 3 years old", ["Child 1-5 years"]),
+    (AMOXICILLIN, "Amoxicillin dose for bacterial infections", ["Adult", "Child 1-5 years"]),
+    (METFORMIN, "How much metformin in type 2 diabetes", ["Adult"]),
+])
+def test_standard_questions_are_answered(rows, query, populations):
+    assert matches(rows, query) == populations
+
+@pytest.mark.parametrize("rows, query", [
+    (METFORMIN, "dose of metformin in renal impairment"),
+    (AMOXICILLIN, "amoxicillin dosage in pregnancy"),
+    (AMOXICILLIN, "amoxicillin dose for adults with penicillin allergy"),
+    (METFORMIN, "metformin dose with heart failure"),
+    (AMOXICILLIN, "amoxicillin dose for malaria"),
+    (AMOXICILLIN, "amoxicillin dose for neonates"),
+])
+def test_unknown_conditions_are_left_to_the_llm(rows, query):
+    assert matches(rows, query) == []
@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import time
+from fastapi import BackgroundTasks, FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from utils.metrics import instrument_queries, span
+from utils.middleware import MetricsMiddleware
+
+ROUTE = {"method": "POST", "route": "/work"}
+
+def sample(name: str) -> float:
+    return REGISTRY.get_sample_value(name, ROUTE) or 0.0
+
+def test_background_tasks_are_not_part_of_the_request():
+    engine = create_engine("sqlite://")
+    instrument_queries(engine)
+
+    def background_work():
+        with engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+        with span("background"):
+            time.sleep(0.5)
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.post("/work")
+    def work(background_tasks: BackgroundTasks):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        background_tasks.add_task(background_work)
+        return {}
+
+    seconds, queries = sample("http_request_duration_seconds_sum"), sample("http_request_db_queries_sum")
+    assert TestClient(app).post("/work").status_code == 200
+
+    assert sample("http_request_duration_seconds_sum") - seconds < 0.5
+    assert sample("http_request_db_queries_sum") - queries == 1
+    assert sample("http_requests_in_progress") == 0
+    assert REGISTRY.get_sample_value("http_requests_total", {**ROUTE, "status": "200"}) >= 1
+    engine.dispose()
+
+def test_pool_usage_is_recorded_on_checkout_and_return(tmp_path):
+    from db import InstrumentedQueuePool
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool, pool_size=2, pool_logging_name="test_pool"
+    )
+
+    def gauge(name: str) -> float:
+        return REGISTRY.get_sample_value(name, {"engine": "test_pool"})
+
+    with engine.connect():
+        assert gauge("db_pool_checked_out") == 1
+        assert gauge("db_pool_size") == 2
+    assert gauge("db_pool_checked_out") == 0
+    assert gauge("db_pool_checked_in") == 1
+    engine.dispose()
+
+def test_multiprocess_metrics_add_up_the_workers(tmp_path):
+    from prometheus_client import CollectorRegistry, multiprocess
+
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    # Two workers serve requests; the second one has stopped
+    for stopped in (False, True):
+        subprocess.run([sys.executable, "-c", (
+            "from utils.metrics import HTTP_REQUESTS, HTTP_REQUESTS_IN_PROGRESS, mark_worker_dead\n"
+            "HTTP_REQUESTS.labels('GET', '/x', '200').inc(3)\n"
+            "HTTP_REQUESTS_IN_PROGRESS.labels('GET', '/x').inc()\n"
+            f"if {stopped}: mark_worker_dead()\n"
+        )], env=env, check=True)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+    assert registry.get_sample_value("http_requests_total", {"method": "GET", "route": "/x", "status": "200"}) == 6
+    assert registry.get_sample_value("http_requests_in_progress", {"method": "GET", "route": "/x"}) == 1
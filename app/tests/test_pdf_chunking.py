@@ -0,0 +1,47 @@
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db import Base
+from models import DosageDocument, ChunkEmbedding, DosageDocumentChunk
+from utils.RAG.pdf_parser import process_and_store_pdf_content, read_pdf_pages, split_pages
+from utils.RAG.vector_collections import VectorCollectionManager
+from benchmarks.fakes import HashingEmbeddings
+from benchmarks.fixtures import formulary_lines, write_pdf, LINES_PER_PAGE
+
+def chunk_store_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[DosageDocument.__table__, ChunkEmbedding.__table__, DosageDocumentChunk.__table__])
+    return sessionmaker(bind=engine, autoflush=False)()
+
+def ingest(db, pdf_path, document_id, embeddings, manager, text_splitter):
+    document = DosageDocument(id=document_id, title="KNMF", content=str(pdf_path), uploaded_by=1)
+    db.add(document)
+    db.flush()
+    embedded_before = embeddings.embedded_texts
+    process_and_store_pdf_content(str(pdf_path), db, document, embeddings=embeddings, manager=manager, text_splitter=text_splitter)
+    db.commit()
+    return embeddings.embedded_texts - embedded_before
+
+def test_editing_one_page_only_embeds_that_page(tmp_path):
+    db = chunk_store_session()
+    embeddings = HashingEmbeddings()
+    manager = VectorCollectionManager(str(tmp_path / "faiss_dosage_index"))
+    # Character based, so the test needs no tiktoken download
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=150)
+
+    lines = formulary_lines(3)
+    original = tmp_path / "original.pdf"
+    write_pdf(str(original), lines)
+    first = ingest(db, original, 1, embeddings, manager, text_splitter)
+
+    edited_line = 2 * LINES_PER_PAGE + 5
+    lines[edited_line] = lines[edited_line] + " Revised in this edition."
+    edited = tmp_path / "edited.pdf"
+    write_pdf(str(edited), lines)
+    second = ingest(db, edited, 2, embeddings, manager, text_splitter)
+
+    pages = read_pdf_pages(str(edited))
+    assert len(pages) > 3
+    assert first == len(split_pages(read_pdf_pages(str(original)), text_splitter))
+    # Only the chunks of the edited page are new; at most all of them changed
+    assert 0 < second <= len(text_splitter.split_text(pages[2]))
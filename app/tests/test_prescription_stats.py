@@ -0,0 +1,96 @@
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import func, select
+from db import engine
+from models import (
+    AnalyticsDirtyDay, AnalyticsWatermark, Doctor, DiseaseTypeEnum, Hospital, Patient, Prescription, PrescriptionDailyStat,
+)
+from utils.Analytics import prescription_stats
+from utils.Analytics.prescription_stats import REFRESH_LOCK_KEY, WATERMARK_NAME, refresh_prescription_stats
+
+# 08:00 UTC is 11:00 in Nairobi: the same local day
+MARCH_1 = datetime(2026, 3, 1, 8)
+MARCH_2 = datetime(2026, 3, 2, 8)
+
+@pytest.fixture(autouse=True)
+def no_refresh_lag(monkeypatch):
+    # Rows written by the test are refreshed right away instead of a minute later
+    monkeypatch.setattr(prescription_stats, "REFRESH_LAG", timedelta(0))
+
+@pytest.fixture
+def clinic(postgres_db):
+    hospital = Hospital(name="Kijabe", location="Kijabe")
+    postgres_db.add(hospital)
+    postgres_db.flush()
+    doctor = Doctor(name="Dr A", email="a@doctor.test", role="doctor", hashed_password="x", hospital_id=hospital.id)
+    patients = [Patient(name=f"P{i}", email=f"p{i}@patient.test", hospital_id=hospital.id) for i in range(2)]
+    postgres_db.add_all([doctor, *patients])
+    postgres_db.flush()
+    for patient, created_at in ((patients[0], MARCH_1), (patients[0], MARCH_1), (patients[1], MARCH_1), (patients[1], MARCH_2)):
+        postgres_db.add(Prescription(
+            patient_id=patient.id, doctor_id=doctor.id, medication="Amoxicillin", dosage="500 mg", diagnosis="Infection",
+            diseases_type=DiseaseTypeEnum.COMMUNICABLE, created_at=created_at,
+        ))
+    postgres_db.commit()
+    return postgres_db, hospital, patients
+
+def counts(db) -> dict:
+    rows = db.execute(
+        select(PrescriptionDailyStat.day, func.sum(PrescriptionDailyStat.prescriptions)).group_by(PrescriptionDailyStat.day)
+    ).all()
+    return {day: total for day, total in rows}
+
+def test_refresh_counts_new_rows_and_advances_the_watermark(clinic):
+    db, _, _ = clinic
+    assert refresh_prescription_stats(db) == 2
+    assert counts(db) == {date(2026, 3, 1): 3, date(2026, 3, 2): 1}
+    watermark = db.get(AnalyticsWatermark, WATERMARK_NAME).value
+    assert watermark > max(db.scalars(select(Prescription.updated_at)))
+
+    # Nothing changed since the watermark
+    assert refresh_prescription_stats(db) == 0
+    assert db.get(AnalyticsWatermark, WATERMARK_NAME).value >= watermark
+
+def test_refresh_recomputes_edited_rows(clinic):
+    db, _, _ = clinic
+    refresh_prescription_stats(db)
+    db.scalars(select(Prescription).where(Prescription.created_at == MARCH_2)).one().created_at = MARCH_1
+    db.commit()
+
+    # The day it moved to, from its updated_at, and the day it left, marked dirty
+    assert refresh_prescription_stats(db) == 2
+    assert counts(db) == {date(2026, 3, 1): 4}
+    assert db.scalar(select(func.count()).select_from(AnalyticsDirtyDay)) == 0
+
+def test_refresh_consumes_the_dirty_days_of_deleted_rows(clinic):
+    db, _, _ = clinic
+    refresh_prescription_stats(db)
+    db.delete(db.scalars(select(Prescription).where(Prescription.created_at == MARCH_2)).one())
+    db.commit()
+    assert db.scalar(select(func.count()).select_from(AnalyticsDirtyDay)) == 1
+
+    assert refresh_prescription_stats(db) == 1
+    assert counts(db) == {date(2026, 3, 1): 3}
+    assert db.scalar(select(func.count()).select_from(AnalyticsDirtyDay)) == 0
+
+def test_prescriptions_of_a_deleted_patient_leave_the_counts(clinic):
+    db, _, patients = clinic
+    refresh_prescription_stats(db)
+    db.delete(patients[1])  # Its prescriptions are kept, with no patient
+    db.commit()
+
+    refresh_prescription_stats(db)
+    assert counts(db) == {date(2026, 3, 1): 2}
+
+def test_refresh_does_nothing_while_another_holds_the_lock(clinic):
+    db, _, _ = clinic
+    with engine.connect() as other:
+        other.execute(select(func.pg_advisory_lock(REFRESH_LOCK_KEY)))
+        try:
+            assert refresh_prescription_stats(db) == 0
+        finally:
+            other.execute(select(func.pg_advisory_unlock(REFRESH_LOCK_KEY)))
+            other.commit()
+    db.rollback()
+    assert db.get(AnalyticsWatermark, WATERMARK_NAME) is None
+    assert counts(db) == {}
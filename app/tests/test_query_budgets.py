@@ -0,0 +1,67 @@
+"""
+Statements per request of the listings, with the caller's principal cached as it is after login.
+A failure lists the statements run; a lazy load per row shows up as one statement repeated once per row.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from auth import create_access_token, principal_cache, principal_claims, principal_from_user
+from db import async_engine
+from models import Admin, Doctor, DiseaseTypeEnum, Hospital, Patient, Prescription
+from routes import admin, doctor
+
+@pytest.fixture
+def hospital(postgres_db):
+    hospital = Hospital(name="Kijabe", location="Kijabe")
+    postgres_db.add(hospital)
+    postgres_db.flush()
+    staff = {
+        "admin": Admin(name="Admin", email="admin@budget.test", role="admin", hashed_password="x", hospital_id=hospital.id),
+        "doctor": Doctor(name="Dr A", email="a@budget.test", role="doctor", hashed_password="x", hospital_id=hospital.id),
+    }
+    other_doctor = Doctor(name="Dr B", email="b@budget.test", role="doctor", hashed_password="x", hospital_id=hospital.id)
+    postgres_db.add_all([*staff.values(), other_doctor])
+    postgres_db.flush()
+    # Enough rows that a query per row would blow every budget
+    patients = [Patient(name=f"P{i}", email=f"p{i}@budget.test", hospital_id=hospital.id) for i in range(10)]
+    postgres_db.add_all(patients)
+    postgres_db.flush()
+    for i in range(10):
+        postgres_db.add(Prescription(
+            patient_id=patients[0].id, doctor_id=(staff["doctor"], other_doctor)[i % 2].id, medication="Amoxicillin",
+            dosage="500 mg", diagnosis="Infection", diseases_type=DiseaseTypeEnum.COMMUNICABLE,
+        ))
+    postgres_db.commit()
+
+    headers = {}
+    for role, user in staff.items():
+        principal_cache.set(principal_from_user(user))
+        headers[role] = {"Authorization": f"Bearer {create_access_token(principal_claims(user))}"}
+    return headers, patients[0].id
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(admin.router)
+    app.include_router(doctor.router)
+    with TestClient(app) as client:
+        yield client
+    # asyncpg connections belong to the client's event loop, which is closed now
+    async_engine.sync_engine.dispose(close=False)
+
+@pytest.mark.parametrize("role, budget", [("admin", 1), ("doctor", 2)])
+def test_list_patients(client, hospital, query_budget, role, budget):
+    headers, _ = hospital
+    client.get("/api/patients/", headers=headers[role])  # Opens the pool's connection
+    with query_budget(budget):
+        response = client.get("/api/patients/", headers=headers[role])
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+
+def test_list_prescriptions(client, hospital, query_budget):
+    headers, patient_id = hospital
+    client.get(f"/api/prescriptions/{patient_id}", headers=headers["doctor"])
+    with query_budget(3):
+        response = client.get(f"/api/prescriptions/{patient_id}", headers=headers["doctor"])
+    assert response.status_code == 200
+    assert len(response.json()) == 10
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import create_engine, text
+from utils.query_counter import QueryCounter, assert_max_queries
+from utils.query_log import statement_shape
+
+@pytest.mark.parametrize("statement, shape", [
+    ("SELECT * FROM patients WHERE id IN ($1, $2)", "SELECT * FROM patients WHERE id IN (...)"),
+    ("SELECT * FROM patients WHERE id IN ($1::INTEGER, $2::INTEGER, $3::INTEGER)", "SELECT * FROM patients WHERE id IN (...)"),
+    ("SELECT * FROM stress_logs WHERE ts IN ($1::TIMESTAMP WITHOUT TIME ZONE)", "SELECT * FROM stress_logs WHERE ts IN (...)"),
+    ("SELECT * FROM patients WHERE id IN (?, ?, ?)", "SELECT * FROM patients WHERE id IN (...)"),
+    ("SELECT * FROM patients WHERE id IN (%(id_1)s, %(id_2)s)", "SELECT * FROM patients WHERE id IN (...)"),
+    ("INSERT INTO notes (a, b) VALUES (%s, %s), (%s, %s)", "INSERT INTO notes (a, b) VALUES (...)"),
+    ("SELECT *\n  FROM patients\n WHERE id = $1::INTEGER", "SELECT * FROM patients WHERE id = $1::INTEGER"),
+    ("SELECT count(*) FROM patients", "SELECT count(*) FROM patients"),
+])
+def test_statement_shape(statement, shape):
+    assert statement_shape(statement) == shape
+
+def test_statement_shape_ignores_the_list_length():
+    assert statement_shape("SELECT 1 WHERE id IN ($1::INTEGER)") == statement_shape("SELECT 1 WHERE id IN ($1::INTEGER, $2::INTEGER)")
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+def test_query_counter_counts_statements(engine):
+    with engine.connect() as conn, QueryCounter(engine) as counter:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+    assert counter.count == 2
+
+def test_assert_max_queries_within_budget(engine):
+    with engine.connect() as conn, assert_max_queries(engine, 2):
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+
+def test_assert_max_queries_over_budget(engine):
+    with pytest.raises(AssertionError, match=r"at most 2 queries, 3 were executed:\n  3 x SELECT \?$"):
+        with engine.connect() as conn, assert_max_queries(engine, 2):
+            for id in range(3):
+                conn.execute(text("SELECT :id"), {"id": id})
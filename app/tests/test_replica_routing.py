@@ -0,0 +1,142 @@
+"""
+Read/write routing between the primary and the read replica, with two SQLite files standing in for the two servers.
+"""
+import time
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+import db
+from auth import create_access_token
+from utils import replica_stickiness
+from utils.middleware import PrimaryStickinessMiddleware
+from utils.replica_stickiness import apply_notification, sticky_principals
+
+def bearer(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': f'd{user_id}@x.io', 'uid': user_id, 'user_type': 'doctor'})}"}
+
+@pytest.fixture
+def servers(tmp_path, monkeypatch):
+    """
+    :return: Function of "primary" or "replica" returning the notes stored on that server
+    """
+    engines = {}
+    for name in ("primary", "replica"):
+        path = tmp_path / f"{name}.db"
+        sync_engine = create_engine(f"sqlite:///{path}")
+        with sync_engine.begin() as conn:
+            conn.execute(text("CREATE TABLE notes (body TEXT)"))
+            conn.execute(text("INSERT INTO notes VALUES (:body)"), {"body": f"seeded on the {name}"})
+        engines[name] = (sync_engine, create_async_engine(f"sqlite+aiosqlite:///{path}"))
+    monkeypatch.setattr(db, "AsyncSessionLocal", async_sessionmaker(bind=engines["primary"][1], expire_on_commit=False))
+    monkeypatch.setattr(db, "AsyncReplicaSessionLocal", async_sessionmaker(bind=engines["replica"][1], expire_on_commit=False))
+    monkeypatch.setattr(sticky_principals, "until", {})
+
+    def notes(name: str) -> list:
+        with engines[name][0].connect() as conn:
+            return conn.execute(text("SELECT body FROM notes ORDER BY rowid")).scalars().all()
+
+    yield notes
+    for sync_engine, _ in engines.values():
+        sync_engine.dispose()
+
+@pytest.fixture
+def client(servers):
+    app = FastAPI()
+    app.add_middleware(PrimaryStickinessMiddleware)
+
+    @app.get("/notes")
+    async def list_notes(session: AsyncSession = Depends(db.get_async_read_db)):
+        return (await session.execute(text("SELECT body FROM notes ORDER BY rowid"))).scalars().all()
+
+    @app.post("/notes")
+    async def create_note(body: str, session: AsyncSession = Depends(db.get_async_db)):
+        if not body:
+            raise HTTPException(status_code=400, detail="Empty note")
+        await session.execute(text("INSERT INTO notes VALUES (:body)"), {"body": body})
+        await session.commit()
+        return {"body": body}
+
+    @app.post("/api/query-dosage/")
+    async def query_dosage(session: AsyncSession = Depends(db.get_async_db)):
+        return {"notes": (await session.execute(text("SELECT count(*) FROM notes"))).scalar()}
+
+    return TestClient(app)
+
+def test_reads_go_to_the_replica(client):
+    assert client.get("/notes").json() == ["seeded on the replica"]
+
+def test_writes_go_to_the_primary(client, servers):
+    assert client.post("/notes", params={"body": "new"}).status_code == 200
+    assert servers("primary") == ["seeded on the primary", "new"]
+    assert servers("replica") == ["seeded on the replica"]
+
+def test_reads_after_a_write_go_to_the_primary(client):
+    client.post("/notes", params={"body": "new"})
+    assert db.PRIMARY_STICKY_COOKIE in client.cookies
+    assert client.get("/notes").json() == ["seeded on the primary", "new"]
+
+def test_reads_return_to_the_replica_after_the_sticky_window(client):
+    client.post("/notes", params={"body": "new"})
+    client.cookies.set(db.PRIMARY_STICKY_COOKIE, f"{time.time() - 1:.3f}")
+    assert client.get("/notes").json() == ["seeded on the replica"]
+
+def test_failed_writes_and_read_only_posts_are_not_sticky(client):
+    assert client.post("/notes", params={"body": ""}).status_code == 400
+    assert client.post("/api/query-dosage/", headers=bearer(1)).status_code == 200
+    assert db.PRIMARY_STICKY_COOKIE not in client.cookies
+    assert client.get("/notes").json() == ["seeded on the replica"]
+
+@pytest.fixture
+def notifications(tmp_path, monkeypatch):
+    """
+    :return: Payloads published with pg_notify, here into a SQLite function
+    """
+    payloads = []
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'notify.db'}")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def add_pg_notify(dbapi_connection, connection_record):
+        dbapi_connection.create_function("pg_notify", 2, lambda channel, payload: payloads.append((channel, payload)))
+
+    monkeypatch.setattr(replica_stickiness, "async_engine", engine)
+    return payloads
+
+def test_bearer_clients_without_cookies_read_their_writes_from_the_primary(client, notifications):
+    client.post("/notes", params={"body": "new"}, headers=bearer(1))
+    client.cookies.clear()
+    assert client.get("/notes", headers=bearer(1)).json() == ["seeded on the primary", "new"]
+    assert client.get("/notes", headers=bearer(2)).json() == ["seeded on the replica"]
+    assert client.get("/notes").json() == ["seeded on the replica"]
+
+def test_pins_reach_the_other_workers(client, notifications):
+    client.post("/notes", params={"body": "new"}, headers=bearer(1))
+    [(channel, payload)] = notifications
+    assert channel == replica_stickiness.PRIMARY_STICKY_CHANNEL
+
+    # Another worker only knows of the write from the notification
+    client.cookies.clear()
+    sticky_principals.until = {}
+    assert client.get("/notes", headers=bearer(1)).json() == ["seeded on the replica"]
+    apply_notification(payload)
+    assert client.get("/notes", headers=bearer(1)).json() == ["seeded on the primary", "new"]
+
+def test_pins_expire(client, notifications):
+    sticky_principals.pin("doctor:1", time.time() - 1)
+    assert client.get("/notes", headers=bearer(1)).json() == ["seeded on the replica"]
+
+def test_read_routes_use_the_replica_session(client):
+    from routes import admin, doctor, super_admin
+
+    def session_dependencies(dependant):
+        for dependency in dependant.dependencies:
+            if dependency.call in (db.get_async_db, db.get_async_read_db):
+                yield dependency.call
+            yield from session_dependencies(dependency)
+
+    for router in (admin.router, doctor.router, super_admin.router):
+        for route in router.routes:
+            if isinstance(route, APIRoute) and route.methods == {"GET"}:
+                assert db.get_async_db not in set(session_dependencies(route.dependant)), route.path
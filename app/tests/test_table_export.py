@@ -0,0 +1,69 @@
+import io
+from datetime import datetime, timedelta, timezone
+import orjson
+import pytest
+from sqlalchemy import Boolean, DateTime, Float, Integer, String, column
+from models import DiseaseTypeEnum
+from utils.Export.table_export import ChunkSink, ParquetEncoder, encode_csv, encode_ndjson
+from utils.timestamps import naive_utc
+
+NAMES = ["id", "diseases_type", "medication", "dose_mg", "active", "created_at"]
+CREATED = datetime(2026, 3, 1, 8, 30)
+ROWS = [
+    (1, DiseaseTypeEnum.COMMUNICABLE, "Amoxicillin", 500.0, True, CREATED),
+    (2, DiseaseTypeEnum.NON_COMMUNICABLE, None, None, None, None),
+]
+
+def test_encode_csv():
+    assert encode_csv([], header=NAMES).decode().splitlines() == [",".join(NAMES)]
+    assert encode_csv(ROWS).decode().splitlines() == [
+        f"1,{DiseaseTypeEnum.COMMUNICABLE.value},Amoxicillin,500.0,True,2026-03-01 08:30:00",
+        f"2,{DiseaseTypeEnum.NON_COMMUNICABLE.value},,,,",
+    ]
+
+def test_encode_ndjson():
+    lines = encode_ndjson(ROWS, NAMES).decode().splitlines()
+    assert [orjson.loads(line) for line in lines] == [
+        {"id": 1, "diseases_type": DiseaseTypeEnum.COMMUNICABLE.value, "medication": "Amoxicillin", "dose_mg": 500.0,
+         "active": True, "created_at": "2026-03-01T08:30:00"},
+        {"id": 2, "diseases_type": DiseaseTypeEnum.NON_COMMUNICABLE.value, "medication": None, "dose_mg": None,
+         "active": None, "created_at": None},
+    ]
+
+def test_chunk_sink_hands_over_each_write_once():
+    sink = ChunkSink()
+    sink.write(b"ab")
+    sink.write(memoryview(b"cd"))
+    assert (sink.take(), sink.tell()) == (b"abcd", 4)
+    sink.write(b"e")
+    assert (sink.take(), sink.take(), sink.tell()) == (b"e", b"", 5)
+
+def test_parquet_encoder_streams_row_groups_and_writes_the_footer_on_close():
+    pq = pytest.importorskip("pyarrow.parquet")
+    columns = [
+        column("id", Integer), column("diseases_type", String), column("medication", String),
+        column("dose_mg", Float), column("active", Boolean), column("created_at", DateTime),
+    ]
+    encoder = ParquetEncoder(columns)
+    chunks = [encoder.encode(ROWS[:1]), encoder.encode(ROWS[1:])]
+    assert not b"".join(chunks).endswith(b"PAR1")  # No footer until close()
+    chunks.append(encoder.close())
+    assert chunks[-1].endswith(b"PAR1")
+
+    parquet_file = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    assert parquet_file.num_row_groups == 2
+    assert parquet_file.read().to_pylist() == [
+        {"id": 1, "diseases_type": DiseaseTypeEnum.COMMUNICABLE.value, "medication": "Amoxicillin", "dose_mg": 500.0,
+         "active": True, "created_at": CREATED},
+        {"id": 2, "diseases_type": DiseaseTypeEnum.NON_COMMUNICABLE.value, "medication": None, "dose_mg": None,
+         "active": None, "created_at": None},
+    ]
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    (CREATED, CREATED),
+    (CREATED.replace(tzinfo=timezone.utc), CREATED),
+    (datetime(2026, 3, 1, 11, 30, tzinfo=timezone(timedelta(hours=3))), CREATED),
+])
+def test_naive_utc(value, expected):
+    assert naive_utc(value) == expected
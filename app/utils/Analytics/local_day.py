@@ -0,0 +1,16 @@
+from datetime import date, datetime, time, timedelta
+import pytz
+
+# Dashboards count days in hospital local time, like the stress log dashboard
+ANALYTICS_TIMEZONE_NAME = "Africa/Nairobi"
+ANALYTICS_TIMEZONE = pytz.timezone(ANALYTICS_TIMEZONE_NAME)
+
+def local_day(timestamp: datetime) -> date:
+    """Local day of a naive UTC timestamp, as stored in the database."""
+    return ANALYTICS_TIMEZONE.fromutc(timestamp).date()
+
+def day_bounds(day: date):
+    """Naive UTC start (inclusive) and end (exclusive) of a local day, for index range scans."""
+    start = ANALYTICS_TIMEZONE.localize(datetime.combine(day, time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+    end = ANALYTICS_TIMEZONE.localize(datetime.combine(day + timedelta(days=1), time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+    return start, end
@@ -0,0 +1,120 @@
+"""
+Incremental refresh of prescription_daily_stats.
+
+Each run finds the (hospital, local day) buckets touched since the last run, from prescriptions whose updated_at passed
+the watermark and from days marked dirty by deletes, and recomputes only those buckets from the prescriptions of that
+day. Dashboards then read the small aggregate table instead of grouping the whole prescriptions table.
+
+Run once from the app directory (e.g. from cron), or let the app's background task call it:
+    python -m utils.Analytics.prescription_stats [--rebuild]
+"""
+import argparse
+import asyncio
+import os
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, insert, func, literal, distinct, Date
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from db import SessionLocal
+from models import Prescription, Patient, PrescriptionDailyStat, AnalyticsWatermark, AnalyticsDirtyDay
+from utils.Analytics.local_day import ANALYTICS_TIMEZONE_NAME, day_bounds
+
+WATERMARK_NAME = "prescription_daily_stats"
+# Arbitrary key of the Postgres advisory lock that keeps refreshes from running concurrently
+REFRESH_LOCK_KEY = 430_001
+# Rows stamped just before a refresh may commit just after it: stay this far behind the clock so none are skipped
+REFRESH_LAG = timedelta(seconds=int(os.getenv("ANALYTICS_REFRESH_LAG_SECONDS", "60")))
+REFRESH_INTERVAL_SECONDS = int(os.getenv("ANALYTICS_REFRESH_INTERVAL_SECONDS", "300"))
+
+def local_day_of(column):
+    return func.date(func.timezone(ANALYTICS_TIMEZONE_NAME, func.timezone("UTC", column)))
+
+def changed_buckets(db: Session, low, high) -> set:
+    query = (
+        select(distinct(Patient.hospital_id), local_day_of(Prescription.created_at))
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .where(Prescription.created_at.is_not(None))
+    )
+    if low is not None:
+        query = query.where(Prescription.updated_at > low, Prescription.updated_at <= high)
+    return set(db.execute(query).all())
+
+def recompute_day(db: Session, day, hospital_ids: list):
+    start, end = day_bounds(day)
+    db.execute(delete(PrescriptionDailyStat).where(PrescriptionDailyStat.day == day, PrescriptionDailyStat.hospital_id.in_(hospital_ids)))
+    counts = (
+        select(
+            Patient.hospital_id,
+            literal(day, Date),
+            Prescription.doctor_id,
+            Prescription.diseases_type,
+            Prescription.medication,
+            func.count(),
+        )
+        .join(Patient, Prescription.patient_id == Patient.id)
+        .where(Prescription.created_at >= start, Prescription.created_at < end, Patient.hospital_id.in_(hospital_ids))
+        .group_by(Patient.hospital_id, Prescription.doctor_id, Prescription.diseases_type, Prescription.medication)
+    )
+    db.execute(insert(PrescriptionDailyStat).from_select(
+        ["hospital_id", "day", "doctor_id", "diseases_type", "medication", "prescriptions"], counts
+    ))
+
+def refresh_prescription_stats(db: Session, rebuild: bool = False) -> int:
+    """
+    Bring prescription_daily_stats up to date, in one transaction.
+    :param rebuild: Recompute every bucket instead of only those changed since the watermark
+    :return: Number of (hospital, day) buckets recomputed; 0 if another refresh holds the lock
+    """
+    if not db.execute(select(func.pg_try_advisory_xact_lock(REFRESH_LOCK_KEY))).scalar():
+        return 0
+    watermark = db.get(AnalyticsWatermark, WATERMARK_NAME)
+    low = None if rebuild or watermark is None else watermark.value
+    high = datetime.utcnow() - REFRESH_LAG
+
+    buckets = changed_buckets(db, low, high)
+    dirty = db.execute(select(AnalyticsDirtyDay.id, AnalyticsDirtyDay.hospital_id, AnalyticsDirtyDay.day)).all()
+    buckets |= {(hospital_id, day) for _, hospital_id, day in dirty}
+    if rebuild:
+        db.execute(delete(PrescriptionDailyStat))
+
+    hospitals_by_day = defaultdict(list)
+    for hospital_id, day in buckets:
+        hospitals_by_day[day].append(hospital_id)
+    for day, hospital_ids in sorted(hospitals_by_day.items()):
+        recompute_day(db, day, hospital_ids)
+
+    if dirty:
+        db.execute(delete(AnalyticsDirtyDay).where(AnalyticsDirtyDay.id.in_([row.id for row in dirty])))
+    if watermark is None:
+        watermark = AnalyticsWatermark(name=WATERMARK_NAME, value=high, refreshed_at=datetime.utcnow())
+        db.add(watermark)
+    else:
+        watermark.value = high
+        watermark.refreshed_at = datetime.utcnow()
+    db.commit()
+    return len(buckets)
+
+def refresh_with_new_session(rebuild: bool = False) -> int:
+    with SessionLocal() as db:
+        return refresh_prescription_stats(db, rebuild)
+
+async def refresh_periodically(interval: int = REFRESH_INTERVAL_SECONDS):
+    """Background task of each worker; the advisory lock lets only one of them work at a time."""
+    while True:
+        try:
+            await run_in_threadpool(refresh_with_new_session)
+        except Exception:
+            print("Prescription analytics refresh failed:")
+            traceback.print_exc()
+        await asyncio.sleep(interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the prescription analytics aggregates")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every day instead of only the changed ones")
+    args = parser.parse_args()
+    print(f"Recomputed {refresh_with_new_session(args.rebuild)} hospital-days")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Streaming export of query results as CSV, NDJSON or Parquet.
+
+Rows are read through a server-side cursor (yield_per) and each partition is encoded and sent as soon as it arrives,
+so memory stays at about one partition of rows whatever the size of the export.
+"""
+import csv
+import io
+import os
+from enum import Enum
+import orjson
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import Boolean, DateTime, Float, Integer
+from db import AsyncReplicaSessionLocal
+
+# Rows fetched from the cursor, encoded and sent per step (and rows per Parquet row group)
+EXPORT_PARTITION_ROWS = int(os.getenv("EXPORT_PARTITION_ROWS", "5000"))
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+def plain(value):
+    return value.value if isinstance(value, Enum) else value
+
+def encode_csv(rows, header: list = None) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    writer.writerows([plain(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+def encode_ndjson(rows, names: list) -> bytes:
+    return b"".join(orjson.dumps(dict(zip(names, row)), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that hands over what was written since the last take(), for streaming a Parquet file."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+class ParquetEncoder:
+    """Writes each partition as a row group; the footer is written by close()."""
+
+    def __init__(self, columns):
+        # Imported here: pyarrow is large and only Parquet exports need it
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([(column.key, self.arrow_type(column.type)) for column in columns])
+        self.sink = ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema, compression="zstd")
+
+    def arrow_type(self, column_type):
+        if isinstance(column_type, Boolean):
+            return self.pa.bool_()
+        if isinstance(column_type, Integer):
+            return self.pa.int64()
+        if isinstance(column_type, Float):
+            return self.pa.float64()
+        if isinstance(column_type, DateTime):
+            return self.pa.timestamp("us")
+        return self.pa.string()
+
+    def encode(self, rows) -> bytes:
+        values = list(zip(*rows))
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array([plain(value) for value in column], type=field.type) for column, field in zip(values, self.schema)],
+            schema=self.schema,
+        ))
+        return self.sink.take()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.sink.take()
+
+async def stream_export(statement, export_format: ExportFormat, partition_rows: int = EXPORT_PARTITION_ROWS):
+    """
+    Run a select on the read replica and encode its rows partition by partition.
+    Opens its own session: the request's session is closed before the response body is sent.
+    Partitions are encoded on the threadpool, so a large export doesn't block the event loop.
+    :param statement: Select of the exported columns, in file order; their keys name the fields
+    :return: Async generator of encoded chunks, for a StreamingResponse
+    """
+    columns = list(statement.selected_columns)
+    names = [column.key for column in columns]
+    parquet = await run_in_threadpool(ParquetEncoder, columns) if export_format == ExportFormat.PARQUET else None
+    if export_format == ExportFormat.CSV:
+        yield encode_csv([], header=names)
+
+    async with AsyncReplicaSessionLocal() as db:
+        result = await db.stream(statement.execution_options(yield_per=partition_rows))
+        async for rows in result.partitions():
+            if parquet:
+                yield await run_in_threadpool(parquet.encode, rows)
+            elif export_format == ExportFormat.CSV:
+                yield await run_in_threadpool(encode_csv, rows)
+            else:
+                yield await run_in_threadpool(encode_ndjson, rows, names)
+
+    if parquet:
+        yield await run_in_threadpool(parquet.close)
@@ -1,11 +1,13 @@
 from models import EmpaticaIotData, StressLog
 from datetime import datetime
-import pandas as pd
-from utils.ML.stress_detection import predict_avg_probability
 import pytz
+from utils.metrics import span
 
 def process_doctor_stress_log(doctor_id: int, doctor_name: str, db):
-    
+    # Imported on the first doctor login rather than by every worker at startup: pandas and the model are slow to load
+    import pandas as pd
+    from utils.ML.stress_detection import predict_avg_probability
+
     # Fetch latest 5 IoT records for the doctor
     recent_records = db.query(EmpaticaIotData).filter_by(doctor_id=doctor_id).order_by(EmpaticaIotData.timestamp.desc()).limit(5).all()
 
@@ -25,7 +27,8 @@ def process_doctor_stress_log(doctor_id: int, doctor_name: str, db):
     } for r in recent_records])
 
     # pass to the predictor function
-    result = predict_avg_probability(records_df)
+    with span("stress_model"):
+        result = predict_avg_probability(records_df)
 
     tz = pytz.timezone("Africa/Nairobi")
     if result["predicted_class"] == 1 or result["predicted_class"] == 2:
@@ -0,0 +1,208 @@
+"""
+Bulk CSV import of patients and doctors into an admin's hospital.
+
+The upload is read a batch at a time. Each batch is validated, checked for emails that are repeated in the file or
+already registered, and inserted with multi-row INSERT statements in the caller's transaction. Failed rows are skipped
+and reported by line number. Doctors are inserted with an unusable password: issue_temporary_passwords hashes and
+emails their temporary passwords after the response, a few at a time on the hashing workers.
+"""
+import asyncio
+import codecs
+import csv
+import itertools
+import os
+import traceback
+from dataclasses import dataclass, field
+from fastapi import HTTPException, UploadFile, status
+from pydantic import ValidationError
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from models import Patient, Doctor, PrincipalLookup
+from schemas import PatientCreate, DoctorImportRow
+from db import AsyncSessionLocal
+from auth import UNUSABLE_PASSWORD_HASH, HASH_RETRY_AFTER_SECONDS, pwd_context
+from utils.hashing import hash_executor, HashingSaturated, PASSWORD_HASH_WORKERS
+from utils.Notifications.credentials_verify import generate_temp_password, send_temporary_password
+
+# Rows validated and inserted per step
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+MAX_IMPORT_ROWS = int(os.getenv("MAX_IMPORT_ROWS", "50000"))
+# Failed rows listed in the report; any further ones are only counted
+MAX_REPORTED_ERRORS = 1000
+
+@dataclass
+class ImportResult:
+    total_rows: int = 0
+    imported: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def reject(self, row: int, errors: list):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": errors})
+
+def csv_rows(file: UploadFile, columns: list):
+    """
+    Iterate over the rows of an uploaded CSV file whose first line names its columns (in any order and case).
+    :return: Generator of (line number, row dict); raises HTTPException (400) if a column is missing
+    """
+    reader = csv.DictReader(codecs.iterdecode(file.file, "utf-8-sig"))
+    try:
+        if not reader.fieldnames:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The CSV file is empty")
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        missing = [column for column in columns if column not in reader.fieldnames]
+        if missing:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Missing CSV columns: {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, row
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid CSV file: {e}")
+
+def next_batch(rows, size: int) -> list:
+    return list(itertools.islice(rows, size))
+
+def validate_row(schema, row: dict):
+    """
+    :return: Tuple (validated row or None, list of error messages); empty cells count as missing
+    """
+    values = {key: value.strip() for key, value in row.items() if key in schema.model_fields and value and value.strip()}
+    try:
+        return schema(**values), []
+    except ValidationError as e:
+        return None, [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
+
+class PatientImporter:
+    schema = PatientCreate
+
+    def __init__(self, hospital_id: int):
+        self.hospital_id = hospital_id
+
+    async def taken_emails(self, db: AsyncSession, emails: list) -> set:
+        # Exact match, like the unique constraint on patients.email
+        return {email.lower() for email in (await db.execute(select(Patient.email).where(Patient.email.in_(emails)))).scalars()}
+
+    async def insert(self, db: AsyncSession, records: list):
+        await db.execute(insert(Patient), [
+            {"name": record.name, "email": record.email, "hospital_id": self.hospital_id} for record in records
+        ])
+
+class DoctorImporter:
+    schema = DoctorImportRow
+
+    def __init__(self, hospital_id: int):
+        self.hospital_id = hospital_id
+        self.inserted = []  # (id, email, name) rows, for issue_temporary_passwords
+
+    async def taken_emails(self, db: AsyncSession, emails: list) -> set:
+        # principal_lookup holds the lower-cased email of every doctor and admin
+        lowered = [email.lower() for email in emails]
+        return set((await db.execute(select(PrincipalLookup.email).where(PrincipalLookup.email.in_(lowered)))).scalars())
+
+    async def insert(self, db: AsyncSession, records: list):
+        doctors = (await db.execute(insert(Doctor).returning(Doctor.id, Doctor.email, Doctor.name), [
+            {
+                "name": record.name,
+                "email": record.email,
+                "specialty": record.specialty,
+                "role": "doctor",
+                "hashed_password": UNUSABLE_PASSWORD_HASH,
+                "is_temporary_password": True,
+                "hospital_id": self.hospital_id,
+            }
+            for record in records
+        ])).all()
+        # Bulk inserts skip the mapper events that keep principal_lookup in sync
+        await db.execute(insert(PrincipalLookup), [
+            {"email": doctor.email.lower(), "user_type": "doctor", "role": "doctor", "hospital_id": self.hospital_id, "doctor_id": doctor.id}
+            for doctor in doctors
+        ])
+        self.inserted += doctors
+
+async def import_csv(db: AsyncSession, file: UploadFile, importer, dry_run: bool = False, batch_size: int = IMPORT_BATCH_SIZE) -> ImportResult:
+    """
+    Validate and insert the rows of a CSV upload. Nothing is committed: the caller commits once, after the last batch.
+    :param importer: PatientImporter or DoctorImporter
+    :param dry_run: Only validate and report, without inserting
+    :return: ImportResult; raises HTTPException for an invalid file, too many rows or a concurrent insert of the same email
+    """
+    result = ImportResult()
+    rows = csv_rows(file, list(importer.schema.model_fields))
+    seen_emails = set()
+    # Reading and parsing run in a worker thread, so large files don't hold up the event loop
+    while batch := await run_in_threadpool(next_batch, rows, batch_size):
+        result.total_rows += len(batch)
+        if result.total_rows > MAX_IMPORT_ROWS:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Imports are limited to {MAX_IMPORT_ROWS} rows")
+
+        valid = []
+        for line, row in batch:
+            record, errors = validate_row(importer.schema, row)
+            if errors:
+                result.reject(line, errors)
+            elif record.email.lower() in seen_emails:
+                result.reject(line, ["email: Repeats an earlier row of the file"])
+            else:
+                seen_emails.add(record.email.lower())
+                valid.append((line, record))
+        if not valid:
+            continue
+
+        taken = await importer.taken_emails(db, [record.email for _, record in valid])
+        records = []
+        for line, record in valid:
+            if record.email.lower() in taken:
+                result.reject(line, ["email: Already registered"])
+            else:
+                records.append(record)
+        if records and not dry_run:
+            try:
+                await importer.insert(db, records)
+            except IntegrityError:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Some emails were registered while the file was imported; nothing was imported, please retry",
+                )
+        result.imported += len(records)
+    # Email conflicts are found a batch after the row errors; report in file order
+    result.errors.sort(key=lambda error: error["row"])
+    return result
+
+async def hash_when_free(passwords: list) -> list:
+    """Hash passwords on the hashing workers, waiting whenever logins keep them saturated."""
+    while True:
+        try:
+            return await asyncio.gather(*(hash_executor.run_async("hash", pwd_context.hash, password) for password in passwords))
+        except HashingSaturated:
+            await asyncio.sleep(HASH_RETRY_AFTER_SECONDS)
+
+async def issue_temporary_passwords(doctors: list, batch_size: int = PASSWORD_HASH_WORKERS):
+    """
+    Give each imported doctor a temporary password and email it. Runs after the import has committed; passwords are
+    saved before they are emailed, so every emailed password works. A doctor whose email fails can be given a password
+    with update-doctor.
+    :param doctors: (id, email, name) rows of DoctorImporter.inserted
+    :param batch_size: Passwords hashed at a time, at most one per hashing worker so logins still get through
+    """
+    try:
+        for start in range(0, len(doctors), batch_size):
+            group = doctors[start:start + batch_size]
+            passwords = [generate_temp_password() for _ in group]
+            hashed_passwords = await hash_when_free(passwords)
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(Doctor), [
+                    {"id": doctor.id, "hashed_password": hashed} for doctor, hashed in zip(group, hashed_passwords)
+                ])
+                await db.commit()
+            for doctor, password in zip(group, passwords):
+                try:
+                    await run_in_threadpool(send_temporary_password, doctor.email, password, doctor.name)
+                except Exception:
+                    print(f"Could not email the temporary password of doctor {doctor.id}:")
+                    traceback.print_exc()
+    except Exception:
+        print("Issuing temporary passwords to imported doctors failed:")
+        traceback.print_exc()
@@ -0,0 +1,62 @@
+import hashlib
+import numpy as np
+from sqlalchemy.orm import Session
+from models import ChunkEmbedding, DosageDocumentChunk
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def embedding_model_name(embeddings) -> str:
+    """Name used to keep vectors from different embedding models apart."""
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+def embed_chunks(db: Session, chunks: list, embeddings):
+    """
+    Return one vector per chunk, embedding only the chunks whose content has not been embedded before.
+    :param db: The database session
+    :param chunks: Chunk texts in document order
+    :param embeddings: LangChain embeddings used for unseen chunks
+    :return: Tuple (list of ChunkEmbedding rows in chunk order, list of vectors in chunk order, number of newly embedded chunks)
+    """
+    model = embedding_model_name(embeddings)
+    hashes = [content_hash(chunk) for chunk in chunks]
+
+    cached = {
+        row.content_hash: row
+        for row in db.query(ChunkEmbedding)
+        .filter(ChunkEmbedding.embedding_model == model, ChunkEmbedding.content_hash.in_(set(hashes)))
+        .all()
+    }
+
+    # Embed each unseen text once, even if it repeats within the document
+    missing = {}
+    for chunk, chunk_hash in zip(chunks, hashes):
+        if chunk_hash not in cached and chunk_hash not in missing:
+            missing[chunk_hash] = chunk
+    if missing:
+        vectors = embeddings.embed_documents(list(missing.values()))
+        new_rows = [
+            ChunkEmbedding(
+                content_hash=chunk_hash,
+                embedding_model=model,
+                text=text,
+                embedding=np.asarray(vector, dtype=np.float32).tobytes(),
+            )
+            for (chunk_hash, text), vector in zip(missing.items(), vectors)
+        ]
+        db.add_all(new_rows)
+        db.flush()
+        cached.update({row.content_hash: row for row in new_rows})
+
+    rows = [cached[chunk_hash] for chunk_hash in hashes]
+    vectors = [np.frombuffer(row.embedding, dtype=np.float32).tolist() for row in rows]
+    return rows, vectors, len(missing)
+
+def link_document_chunks(db: Session, document_id: int, rows: list):
+    """Record which chunks, in which order, make up a dosage document."""
+    db.query(DosageDocumentChunk).filter(DosageDocumentChunk.document_id == document_id).delete(synchronize_session=False)
+    db.add_all([
+        DosageDocumentChunk(document_id=document_id, position=position, chunk_id=row.id)
+        for position, row in enumerate(rows)
+    ])
+    db.flush()
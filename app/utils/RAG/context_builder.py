@@ -0,0 +1,91 @@
+import os
+from functools import lru_cache
+
+# Token budget for the context section of the dosage prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "3000"))
+
+# Overlaps shorter than this are treated as coincidence rather than shared chunk text
+MIN_OVERLAP_CHARS = 64
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-4o"):
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def find_overlap(left: str, right: str) -> int:
+    """
+    Return the length of the longest suffix of `left` that is also a prefix of `right`.
+    :param left: Text that comes first in the document
+    :param right: Text that may continue `left`
+    :return: Number of overlapping characters, 0 if the overlap is below MIN_OVERLAP_CHARS
+    """
+    probe = right[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = max(0, len(left) - len(right))
+    pos = left.find(probe, start)
+    while pos != -1:
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        pos = left.find(probe, pos + 1)
+    return 0
+
+def merge_chunks(texts: list) -> list:
+    """
+    Merge chunks that overlap (e.g. adjacent TokenTextSplitter chunks) into single spans.
+    :param texts: Chunk texts in relevance order
+    :return: List of (rank, text) spans, rank being the best relevance rank of the merged chunks
+    """
+    spans = []
+    for rank, text in enumerate(texts):
+        if not text or any(text in span_text for _, span_text in spans):
+            continue
+        merged = True
+        span_rank, span_text = rank, text
+        # Keep absorbing existing spans until nothing else overlaps the current one
+        while merged:
+            merged = False
+            for i, (other_rank, other_text) in enumerate(spans):
+                if span_text in other_text:
+                    span_text = other_text
+                elif other_text in span_text:
+                    pass
+                elif overlap := find_overlap(other_text, span_text):
+                    span_text = other_text + span_text[overlap:]
+                elif overlap := find_overlap(span_text, other_text):
+                    span_text = span_text + other_text[overlap:]
+                else:
+                    continue
+                span_rank = min(span_rank, other_rank)
+                spans.pop(i)
+                merged = True
+                break
+        spans.append((span_rank, span_text))
+    return sorted(spans, key=lambda span: span[0])
+
+def build_context(texts: list, token_budget: int = CONTEXT_TOKEN_BUDGET, model: str = "gpt-4o") -> str:
+    """
+    Build the prompt context from retrieved chunks.
+    Overlapping chunks are merged once and the most relevant spans are packed until the token budget is used up.
+    :param texts: Retrieved chunk texts, most relevant first
+    :param token_budget: Maximum number of tokens the context may use
+    :param model: Model whose tokenizer is used to count tokens
+    :return: Context string
+    """
+    encoding = get_encoding(model)
+    separator_tokens = len(encoding.encode("\n\n"))
+    remaining = token_budget
+    parts = []
+    for _, span_text in merge_chunks(texts):
+        if remaining <= 0:
+            break
+        tokens = encoding.encode(span_text.strip())
+        if len(tokens) > remaining:
+            tokens = tokens[:remaining]
+        parts.append(encoding.decode(tokens))
+        remaining -= len(tokens) + separator_tokens
+    return "\n\n".join(parts)
@@ -0,0 +1,223 @@
+import re
+from sqlalchemy import insert, or_, func
+from sqlalchemy.orm import Session
+from models import DrugDosage, DosageDocument
+
+# Section headings used in KNMF monographs
+SECTION_PATTERN = re.compile(
+    r"^\s*(indications?|contra-?indications?|cautions?|side[- ]effects?|adverse (?:effects|reactions)|interactions?"
+    r"|dose|doses|dosage|pregnancy|breast[- ]?feeding|renal impairment|hepatic impairment|notes?|counselling"
+    r"|monitoring|synonyms?|other names?|also known as)\s*[:\-]\s*(.*)$",
+    re.IGNORECASE,
+)
+
+# Population labels that split a dose section into rows, e.g. "Child 1-5 years: 125 mg"
+POPULATION_PATTERN = re.compile(
+    r"\b((?:adults?|child(?:ren)?|neonates?|infants?|elderly|adolescents?)\b[^:;\n]{0,40}?):",
+    re.IGNORECASE,
+)
+
+POPULATION_KEYWORDS = {
+    "adult": "adult", "adults": "adult",
+    "child": "child", "children": "child", "paediatric": "child", "pediatric": "child",
+    "neonate": "neonate", "neonates": "neonate", "newborn": "neonate",
+    "infant": "infant", "infants": "infant",
+    "elderly": "elderly",
+    "adolescent": "adolescent", "adolescents": "adolescent",
+}
+
+DOSE_INTENT_PATTERN = re.compile(r"\b(dose|doses|dosage|dosing|how much|mg)\b", re.IGNORECASE)
+
+STOPWORDS = {"a", "an", "the", "of", "for", "in", "to", "what", "is", "are", "give", "patient", "patients", "with", "and", "me"}
+
+# Words of how a dose question is asked, rather than of what it is about
+QUESTION_WORDS = {
+    "dose", "doses", "dosage", "dosing", "how", "much", "mg", "should", "be", "given", "take", "recommended", "usual",
+    "can", "i", "you", "tell", "please", "year", "years", "old", "aged", "age",
+}
+
+MAX_NAME_WORDS = 4
+
+def normalize_name(name: str) -> str:
+    """Lower-case a drug name and strip punctuation so lookups are exact-match friendly."""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", name.lower()).split())
+
+def _is_heading(line: str) -> bool:
+    return 0 < len(line) <= 60 and line[0].isalpha() and ":" not in line and not line.endswith(".")
+
+def _split_name(heading: str):
+    # "Paracetamol (Acetaminophen)" -> ("Paracetamol", ["acetaminophen"])
+    synonyms = [normalize_name(s) for s in re.findall(r"\(([^)]+)\)", heading)]
+    name = re.sub(r"\([^)]*\)", "", heading).strip()
+    return name, [s for s in synonyms if s]
+
+def _split_doses(dose_text: str):
+    matches = list(POPULATION_PATTERN.finditer(dose_text))
+    if not matches:
+        return [(None, dose_text.strip())]
+    rows = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(dose_text)
+        text = dose_text[match.end():end].strip(" ;,\n")
+        if text:
+            rows.append((" ".join(match.group(1).split()).capitalize(), text))
+    return rows
+
+def parse_drug_entries(text: str):
+    """
+    Parse KNMF monograph text into structured dose rows.
+    A monograph starts at a short heading line followed (within a few lines) by an "Indications:" section.
+    :param text: Plain text extracted from the formulary
+    :return: List of dicts with drug_name, normalized_name, synonyms, indication, population and dose_text
+    """
+    lines = [line.strip() for line in text.splitlines()]
+
+    # First pass: locate the heading line of every monograph
+    starts = []
+    for i, line in enumerate(lines):
+        match = SECTION_PATTERN.match(line)
+        if not match or not match.group(1).lower().startswith("indication"):
+            continue
+        # Walk back over formulation lines ("Tablet: 500 mg") to find the drug name heading
+        for j in range(i - 1, max(i - 6, -1), -1):
+            if _is_heading(lines[j]):
+                if not starts or j > starts[-1]:
+                    starts.append(j)
+                break
+
+    # Second pass: collect the sections of each monograph
+    entries = []
+    for k, start in enumerate(starts):
+        end = starts[k + 1] if k + 1 < len(starts) else len(lines)
+        name, synonyms = _split_name(lines[start])
+        sections = {}
+        section = None
+        for line in lines[start + 1:end]:
+            match = SECTION_PATTERN.match(line)
+            if match:
+                section = match.group(1).lower()
+                sections.setdefault(section, []).append(match.group(2))
+            elif line and section:
+                sections[section].append(line)
+        entries.append({"name": name, "synonyms": synonyms, "sections": sections})
+
+    rows = []
+    for entry in entries:
+        sections = {key: " ".join(part for part in value if part).strip() for key, value in entry["sections"].items()}
+        dose_text = sections.get("dose") or sections.get("doses") or sections.get("dosage")
+        if not entry["name"] or not dose_text:
+            continue
+        synonyms = list(entry["synonyms"])
+        for key in ("synonym", "synonyms", "other name", "other names", "also known as"):
+            synonyms += [normalize_name(s) for s in re.split(r"[,;/]", sections.get(key, "")) if normalize_name(s)]
+        indication = sections.get("indications") or sections.get("indication")
+        for population, dose in _split_doses(dose_text):
+            rows.append({
+                "drug_name": entry["name"],
+                "normalized_name": normalize_name(entry["name"]),
+                "synonyms": sorted(set(synonyms)),
+                "indication": indication,
+                "population": population,
+                "dose_text": dose,
+            })
+    return rows
+
+def store_drug_dosages(db: Session, document_id: int, text: str) -> int:
+    """
+    Replace the structured dose rows of a document with the ones parsed from its text.
+    :return: Number of rows stored
+    """
+    rows = parse_drug_entries(text)
+    db.query(DrugDosage).filter(DrugDosage.document_id == document_id).delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(DrugDosage), [{**row, "document_id": document_id} for row in rows])
+    return len(rows)
+
+def search_drug_dosages(db: Session, term: str, limit: int = 20):
+    """Prefix and trigram search over drug names, best matches first."""
+    term = normalize_name(term)
+    if not term:
+        return []
+    return (
+        db.query(DrugDosage)
+        .filter(or_(
+            DrugDosage.normalized_name.startswith(term, autoescape=True),
+            DrugDosage.normalized_name.bool_op("%")(term),
+            DrugDosage.synonyms.any(term),
+        ))
+        .order_by(func.similarity(DrugDosage.normalized_name, term).desc(), DrugDosage.normalized_name, DrugDosage.id)
+        .limit(limit)
+        .all()
+    )
+
+def _candidate_names(words):
+    return {
+        " ".join(words[i:i + n])
+        for n in range(1, MAX_NAME_WORDS + 1)
+        for i in range(len(words) - n + 1)
+        if words[i] not in STOPWORDS
+    }
+
+def resolve_dosage_query(db: Session, query: str, document_ids=None):
+    """
+    Answer simple "dose of X (for Y)" questions straight from the drug_dosages table.
+    :param document_ids: Only answer from these dosage documents
+    :return: Answer text, or None when the query does not resolve to a single drug entry
+    """
+    if not DOSE_INTENT_PATTERN.search(query):
+        return None
+    words = normalize_name(query).split()
+    candidates = _candidate_names(words)
+    if not candidates:
+        return None
+
+    rows = db.query(DrugDosage).filter(
+        or_(DrugDosage.normalized_name.in_(candidates), DrugDosage.synonyms.overlap(list(candidates)))
+    )
+    if document_ids:
+        rows = rows.filter(DrugDosage.document_id.in_(document_ids))
+    rows = rows.order_by(DrugDosage.document_id.desc(), DrugDosage.id).all()
+    if not rows:
+        return None
+    # Only answer from the most recently uploaded document, and only for a single drug
+    rows = [row for row in rows if row.document_id == rows[0].document_id]
+    if len({row.normalized_name for row in rows}) != 1:
+        return None
+    rows = match_query_rows(rows, words)
+    if not rows:
+        return None
+    return format_dosage_answer(db, rows)
+
+def match_query_rows(rows, words):
+    """
+    Keep the dose rows of one drug that answer the query: those of the population it names, if any, whose indication
+    mentions every other word of the query. A condition the indication doesn't mention ("in renal impairment",
+    "with HIV") may change the dose, so such a query is left to the LLM instead of getting the standard dose.
+    :param words: Normalized words of the query
+    :return: The matching rows, or an empty list
+    """
+    drug_words = set(rows[0].normalized_name.split()) | {w for s in rows[0].synonyms for w in s.split()}
+
+    populations = {POPULATION_KEYWORDS[w] for w in words if w in POPULATION_KEYWORDS}
+    if populations:
+        rows = [row for row in rows if row.population and any(p in row.population.lower() for p in populations)]
+
+    condition = [
+        w for w in words
+        if w not in STOPWORDS and w not in QUESTION_WORDS and w not in POPULATION_KEYWORDS and w not in drug_words
+        and not w.isdigit()
+    ]
+    if condition:
+        rows = [row for row in rows if row.indication and all(w in normalize_name(row.indication).split() for w in condition)]
+    return rows
+
+def format_dosage_answer(db: Session, rows) -> str:
+    document = db.query(DosageDocument.title).filter(DosageDocument.id == rows[0].document_id).scalar()
+    lines = [f"{rows[0].drug_name} dosage (KNMF):"]
+    if rows[0].indication:
+        lines.append(f"Indications: {rows[0].indication}")
+    for row in rows:
+        lines.append(f"- {row.population}: {row.dose_text}" if row.population else f"- {row.dose_text}")
+    if document:
+        lines.append(f"Source: {document}")
+    return "\n".join(lines)
@@ -1,34 +1,66 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import TokenTextSplitter
-import pdfplumber
+from sqlalchemy.orm import Session
+from models import DosageDocument
+from utils.RAG.chunk_store import embed_chunks, link_document_chunks
+from utils.RAG.vector_collections import collection_manager
+from utils.metrics import span
+
+def read_pdf_pages(file_path: str) -> list:
+    import pdfplumber
 
-def read_pdf(file_path: str) -> str:
-    pdf_text = ""
     try:
         with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                pdf_text += page.extract_text()
-        return pdf_text
+            return [page.extract_text() or "" for page in pdf.pages]
     except Exception as e:
         print("Error reading PDF:", e)
-        return ""
+        return []
+
+def read_pdf(file_path: str) -> str:
+    return "".join(page + "\n" for page in read_pdf_pages(file_path))
+
+def split_pages(pages: list, text_splitter) -> list:
+    """
+    Split each page on its own. Chunks never cross a page boundary, so editing, adding or removing a page
+    leaves the chunks (and cached embeddings) of every other page unchanged.
+    """
+    return [chunk for page in pages for chunk in text_splitter.split_text(page)]
+
+def process_and_store_pdf_content(file_path: str, db: Session, document: DosageDocument, embeddings=None, manager=collection_manager, text_splitter=None):
+    # Only KNMF uploads need these, and langchain_openai alone takes about a second to import
+    from langchain_openai import OpenAIEmbeddings
+    from langchain_community.vectorstores import FAISS
+    from langchain.text_splitter import TokenTextSplitter
 
-def process_and_store_pdf_content(file_path: str):
     # Read PDF content
-    pdf_content = read_pdf(file_path)
-    if not pdf_content:
+    pages = read_pdf_pages(file_path)
+    pdf_content = "".join(page + "\n" for page in pages)
+    if not pdf_content.strip():
         print("No text extracted from the PDF.")
-    # Split text into chunks
-    text_splitter = TokenTextSplitter(chunk_size=1000, chunk_overlap=300)
-    chunks = text_splitter.split_text(pdf_content)
+    # Split text into chunks, page by page
+    text_splitter = text_splitter or TokenTextSplitter(chunk_size=1000, chunk_overlap=300)
+    chunks = split_pages(pages, text_splitter)
+    if not chunks:
+        return pdf_content
     
-    # Create embeddings for each chunk and store them
-    embeddings = OpenAIEmbeddings()
-    vector_store = FAISS.from_texts(chunks, embeddings)
+    # Reuse cached embeddings and only embed chunks that have not been seen before
+    embeddings = embeddings or OpenAIEmbeddings()
+    with span("embeddings"):
+        rows, vectors, embedded = embed_chunks(db, chunks, embeddings)
+    link_document_chunks(db, document.id, rows)
+    print(f"Embedded {embedded} new chunks, reused {len(chunks) - embedded} cached chunks.")
+
+    # Build the vector store from the cached vectors
+    vector_store = FAISS.from_embeddings(
+        list(zip(chunks, vectors)),
+        embeddings,
+        metadatas=[
+            {"document_id": document.id, "edition": document.edition, "position": position}
+            for position in range(len(chunks))
+        ],
+    )
 
-    # Save the vector store to disk for later retrieval
-    vector_store.save_local("faiss_dosage_index")
+    # Save the document's own collection; other documents' indexes are left as they are
+    manager.add(document.id, vector_store, title=document.title, edition=document.edition)
+    return pdf_content
 
 # file_path="data/Kenya_National_Medicines_Formulary_2023_1st_Edition.pdf"
 # process_and_store_pdf_content(file_path)
@@ -1,23 +1,26 @@
-from langchain_community.chat_models import ChatOpenAI
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+from utils.RAG.vector_collections import collection_manager
+from utils.RAG.context_builder import build_context
+from utils.metrics import span
 
+# langchain takes seconds to import, so the OpenAI clients are only imported by the first dosage query
+def default_embeddings():
+    from langchain_community.embeddings import OpenAIEmbeddings
+    return OpenAIEmbeddings()
 
-def get_dosage_info(query: str):
-    # Load the FAISS vector store from disk
-    vector_store = FAISS.load_local("faiss_dosage_index", OpenAIEmbeddings(), allow_dangerous_deserialization=True)
+def default_llm():
+    from langchain_community.chat_models import ChatOpenAI
+    return ChatOpenAI(model="gpt-4o")
 
-    llm = ChatOpenAI(model="gpt-4o")
+def get_dosage_info(query: str, document_ids=None, editions=None, embeddings=None, llm=None, manager=collection_manager):
+    embeddings = embeddings or default_embeddings()
+    llm = llm or default_llm()
 
-    
-    retriever = vector_store.as_retriever()
-    retriever.search_kwargs = {"k": 20}  
+    # Search the per-document FAISS collections, optionally restricted to some documents or editions
+    with span("retrieval"):
+        retrieved_docs = manager.search(query, embeddings, k=20, document_ids=document_ids, editions=editions)
 
-    # Retrieve and summarize documents
-    retrieved_docs = retriever.invoke(query)
-    summaries = [doc.page_content[:300] for doc in retrieved_docs]  
-    # Prepare context from summarized documents
-    context = "\n".join(summaries)
+    # Pack the most relevant, de-duplicated text into the token budget
+    context = build_context([doc.page_content for doc in retrieved_docs])
 
     # Create the prompt with context, assistant identity, and fallback handling
     prompt = f"""
@@ -38,7 +41,8 @@ def get_dosage_info(query: str):
     """
 
     # Run the query with the LLM
-    response = llm.invoke([{"role": "user", "content": prompt}])
+    with span("llm"):
+        response = llm.invoke([{"role": "user", "content": prompt}])
 
     return response
 
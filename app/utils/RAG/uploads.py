@@ -0,0 +1,47 @@
+import hashlib
+import os
+import tempfile
+from fastapi import HTTPException, UploadFile, status
+
+# Where uploaded formularies are kept, named by their SHA-256 checksum
+UPLOAD_DIR = os.getenv("DOSAGE_UPLOAD_DIR", "/tmp/dawachat_uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_DOSAGE_UPLOAD_MB", "200")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def save_pdf_upload(file: UploadFile, upload_dir: str = UPLOAD_DIR, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """
+    Stream an uploaded PDF to a content-addressed file, hashing it on the way.
+    :param file: The uploaded file
+    :param upload_dir: Directory the file is stored in
+    :param max_bytes: Largest accepted upload
+    :param chunk_size: Bytes read and written per step
+    :return: Tuple (file path, SHA-256 hex digest)
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB limit")
+
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    # Unique temporary name so concurrent uploads never write to the same file
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := file.file.read(chunk_size):
+                if size == 0 and not chunk.startswith(b"%PDF-"):
+                    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Only PDF files are accepted")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB limit")
+                digest.update(chunk)
+                buffer.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Uploaded file is empty")
+        checksum = digest.hexdigest()
+        file_path = os.path.join(upload_dir, f"{checksum}.pdf")
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return file_path, checksum
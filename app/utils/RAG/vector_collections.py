@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Root directory holding one FAISS index per dosage document
+INDEX_ROOT = os.getenv("FAISS_INDEX_ROOT", "faiss_dosage_index")
+SEARCH_WORKERS = int(os.getenv("FAISS_SEARCH_WORKERS", "4"))
+MANIFEST = "manifest.json"
+
+class VectorCollectionManager:
+    """
+    Manages one FAISS index ("collection") per uploaded dosage document.
+    Documents are added and removed independently, and queries fan out over the selected collections in parallel.
+    """
+
+    def __init__(self, root: str = INDEX_ROOT, max_workers: int = SEARCH_WORKERS):
+        self.root = root
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="faiss-search")
+        self._lock = threading.Lock()
+        self._stores = {}  # collection path -> (manifest mtime, FAISS store)
+
+    def _path(self, document_id: int) -> str:
+        return os.path.join(self.root, f"document_{document_id}")
+
+    def add(self, document_id: int, vector_store, title: str = None, edition: str = None):
+        """Save (or replace) the collection of a document."""
+        path = self._path(document_id)
+        staging = f"{path}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        vector_store.save_local(staging)
+        with open(os.path.join(staging, MANIFEST), "w") as manifest:
+            json.dump({"document_id": document_id, "title": title, "edition": edition}, manifest)
+        # Swap the new index in so concurrent searches never see a half-written directory
+        if os.path.isdir(path):
+            retired = f"{path}.old"
+            shutil.rmtree(retired, ignore_errors=True)
+            os.rename(path, retired)
+            os.rename(staging, path)
+            shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.rename(staging, path)
+        with self._lock:
+            self._stores.pop(path, None)
+
+    def remove(self, document_id: int):
+        """Delete the collection of a document; other collections are untouched."""
+        path = self._path(document_id)
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self._stores.pop(path, None)
+
+    def collections(self):
+        """
+        List the available collections.
+        :return: List of (path, manifest) tuples
+        """
+        found = []
+        if os.path.isdir(self.root):
+            for entry in os.scandir(self.root):
+                manifest_path = os.path.join(entry.path, MANIFEST)
+                # Skip ".tmp"/".old" directories of an add() in progress
+                if not (entry.name.startswith("document_") and entry.name[len("document_"):].isdigit()):
+                    continue
+                if entry.is_dir() and os.path.exists(manifest_path):
+                    with open(manifest_path) as manifest:
+                        found.append((entry.path, json.load(manifest)))
+        # Indexes saved before per-document collections live directly in the root
+        if not found and os.path.exists(os.path.join(self.root, "index.faiss")):
+            found.append((self.root, {"document_id": None, "title": None, "edition": None}))
+        return found
+
+    def _load(self, path: str, embeddings):
+        manifest_path = os.path.join(path, MANIFEST)
+        mtime = os.path.getmtime(manifest_path if os.path.exists(manifest_path) else os.path.join(path, "index.faiss"))
+        with self._lock:
+            cached = self._stores.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        # Imported by the first search, not at worker startup
+        from langchain_community.vectorstores import FAISS
+        store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+        with self._lock:
+            self._stores[path] = (mtime, store)
+        return store
+
+    def search(self, query: str, embeddings, k: int = 20, document_ids=None, editions=None):
+        """
+        Search the selected collections in parallel and merge the hits by distance.
+        :param query: Query text
+        :param embeddings: Embeddings used for the query and to load the indexes
+        :param k: Number of documents to return
+        :param document_ids: Only search these dosage documents
+        :param editions: Only search documents of these editions
+        :return: The k closest LangChain documents across all selected collections
+        """
+        available = self.collections()
+        with self._lock:
+            # Forget collections removed by other workers
+            for path in set(self._stores) - {path for path, _ in available}:
+                del self._stores[path]
+        selected = [
+            path for path, manifest in available
+            if (not document_ids or manifest["document_id"] in document_ids)
+            and (not editions or manifest["edition"] in editions)
+        ]
+        if not selected:
+            return []
+
+        # Embed once and reuse the vector for every collection
+        vector = embeddings.embed_query(query)
+
+        def search_collection(path):
+            return self._load(path, embeddings).similarity_search_with_score_by_vector(vector, k=k)
+
+        hits = [hit for result in self._executor.map(search_collection, selected) for hit in result]
+        hits.sort(key=lambda hit: hit[1])
+        return [doc for doc, _ in hits[:k]]
+
+collection_manager = VectorCollectionManager()
@@ -1,5 +1,11 @@
 from sqlalchemy.inspection import inspect
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def column_keys(model) -> tuple:
+    """Column attribute names of a mapped class, inspected once per class. Deferred columns are left out."""
+    return tuple(c.key for c in inspect(model).column_attrs if not c.deferred)
 
 def asdict(obj):
     """Convert SQLAlchemy object to dictionary dynamically."""
-    return {c.key: getattr(obj, c.key) for c in inspect(obj).mapper.column_attrs}
\ No newline at end of file
+    return {key: getattr(obj, key) for key in column_keys(type(obj))}
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from utils.metrics import PASSWORD_HASH_SECONDS, PASSWORD_HASH_IN_FLIGHT, PASSWORD_HASH_REJECTED
+
+# bcrypt is CPU bound: more workers than cores only adds latency
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Operations allowed to wait for a worker before new ones are rejected
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
+class HashingSaturated(Exception):
+    """Raised when every hashing worker is busy and the queue is full."""
+
+class BoundedHashExecutor:
+    """
+    Dedicated thread pool for bcrypt, so a burst of logins cannot take the threads every other
+    endpoint runs on. At most `workers + queue_limit` operations are accepted at a time;
+    beyond that submit() fails immediately instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_limit: int = PASSWORD_HASH_QUEUE_LIMIT):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+
+    def submit(self, operation: str, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            PASSWORD_HASH_REJECTED.labels(operation).inc()
+            raise HashingSaturated(operation)
+        PASSWORD_HASH_IN_FLIGHT.inc()
+
+        def timed():
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - start)
+
+        def release(_):
+            PASSWORD_HASH_IN_FLIGHT.dec()
+            self._slots.release()
+
+        try:
+            future = self._executor.submit(timed)
+        except BaseException:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return future
+
+    def run(self, operation: str, fn, *args):
+        """Run fn on a hashing worker and wait for the result (for sync callers)."""
+        return self.submit(operation, fn, *args).result()
+
+    async def run_async(self, operation: str, fn, *args):
+        """Run fn on a hashing worker without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(operation, fn, *args))
+
+hash_executor = BoundedHashExecutor()
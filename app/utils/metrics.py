@@ -0,0 +1,178 @@
+"""
+Prometheus metrics shared by the app, served on /metrics.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory before starting them: each worker
+writes its metrics there and /metrics adds up every worker's, whichever one serves the scrape. Without it, each
+worker counts on its own and /metrics only shows the worker that answers.
+"""
+import os
+import time
+from collections import Counter as ShapeCounter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, make_asgi_app, multiprocess
+from sqlalchemy import event
+from utils.query_log import SLOW_QUERY_SECONDS, log_slow_query, statement_shape
+
+# Requests are labelled with the path template of their route, e.g. /api/prescriptions/{patient_id}
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Requests served, by route and response status",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to the end of its response",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests being served",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time per request spent executing SQL statements",
+    ["method", "route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+SPAN_SECONDS = Histogram(
+    "span_duration_seconds",
+    "Time spent in instrumented operations such as model inference and LLM calls",
+    ["span"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds",
+    "Time spent in one bcrypt hash or verify, excluding time queued for a worker",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0),
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight",
+    "Password hash operations running or waiting for a hashing worker",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hash operations rejected because the hashing queue was full",
+    ["operation"],
+)
+
+DB_POOL_CHECKOUT_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool, including connecting when the pool grows",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after pool_timeout because every connection was in use",
+    ["engine"],
+)
+
+# Connections of every live worker's pools, by engine; updated on each checkout and return
+DB_POOL_SIZE_CONNECTIONS = Gauge("db_pool_size", "Connections the pool keeps open", ["engine"], multiprocess_mode="livesum")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently in use", ["engine"], multiprocess_mode="livesum")
+DB_POOL_CHECKED_IN = Gauge("db_pool_checked_in", "Idle connections in the pool", ["engine"], multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections opened beyond the pool size", ["engine"], multiprocess_mode="livesum"
+)
+
+def record_pool_usage(pool):
+    # NullPool (pgbouncer mode) keeps no connections of its own
+    if not hasattr(pool, "checkedout"):
+        return
+    DB_POOL_SIZE_CONNECTIONS.labels(pool.logging_name).set(pool.size())
+    DB_POOL_CHECKED_OUT.labels(pool.logging_name).set(pool.checkedout())
+    DB_POOL_CHECKED_IN.labels(pool.logging_name).set(pool.checkedin())
+    DB_POOL_OVERFLOW.labels(pool.logging_name).set(max(pool.overflow(), 0))
+
+def metrics_app():
+    """ASGI app serving the metrics: of every worker in multiprocess mode, else of this process."""
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return make_asgi_app()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry)
+
+def mark_worker_dead():
+    """Drop the live gauges of this worker when it stops; its counters and histograms are kept."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+class RequestStats:
+    """Database work and spans of the request being served, for its metrics, Server-Timing header and query log."""
+
+    def __init__(self, route: str = None):
+        self.route = route
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.spans = defaultdict(float)
+        self.statement_shapes = ShapeCounter()
+        self.finished = False  # Response sent: later work (background tasks) is not counted
+
+    def server_timing(self, total_seconds: float) -> str:
+        timings = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"']
+        timings += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans.items()]
+        timings.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(timings)
+
+# Set by MetricsMiddleware; worker threads of sync routes see it too, as they run in a copy of the request's context
+current_request_stats = ContextVar("current_request_stats", default=None)
+
+def active_request_stats():
+    """Stats of the request being served, or None outside a request and in its background tasks."""
+    stats = current_request_stats.get()
+    return None if stats is None or stats.finished else stats
+
+@contextmanager
+def span(name: str):
+    """
+    Time a block in span_duration_seconds and in the current request's Server-Timing header.
+    :param name: Span label, a single word such as "llm"
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.labels(name).observe(elapsed)
+        stats = active_request_stats()
+        if stats is not None:
+            stats.spans[name] += elapsed
+
+def instrument_queries(engine):
+    """
+    Add the statements a (sync) engine executes, and their time, to the stats of the current request,
+    and log the slow ones whether or not they run in a request.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+        stats = active_request_stats()
+        if stats is not None:
+            stats.queries += 1
+            stats.statement_shapes[statement_shape(statement)] += 1
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        stats = active_request_stats()
+        if stats is not None:
+            stats.db_seconds += elapsed
+        if elapsed >= SLOW_QUERY_SECONDS:
+            log_slow_query(statement, elapsed, stats.route if stats is not None else "background task")
@@ -0,0 +1,116 @@
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from db import PRIMARY_STICKY_COOKIE, REPLICA_STICKY_SECONDS
+from utils.metrics import (
+    HTTP_REQUESTS, HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_PROGRESS, HTTP_REQUEST_DB_QUERIES, HTTP_REQUEST_DB_SECONDS,
+    RequestStats, current_request_stats,
+)
+from utils.query_log import report_repeated_statements
+from utils.replica_stickiness import principal_key, publish_pin, sticky_principals
+import os
+import time
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+# Server-Timing shows clients how a request's time was spent (database, spans): off unless enabled, e.g. in staging
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+# POSTs that write nothing the client reads back, so they don't pin its reads to the primary
+READ_ONLY_POST_PATHS = ("/api/query-dosage/",)
+
+class PrimaryStickinessMiddleware:
+    """
+    After a successful write, pin the client to the primary (see utils.replica_stickiness): a short-lived cookie,
+    and its principal for bearer clients that send no cookies. Reads of a pinned client get request.state
+    read_from_primary, which makes get_async_read_db use the primary, so the client sees what it just wrote
+    even if the replica lags behind.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"] == "POST" and scope["path"] in READ_ONLY_POST_PATHS):
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] in READ_METHODS:
+            # No token to decode while nobody is pinned
+            if sticky_principals.until and (key := principal_key(scope)) and sticky_principals.is_pinned(key):
+                scope.setdefault("state", {})["read_from_primary"] = True
+            await self.app(scope, receive, send)
+            return
+
+        key = principal_key(scope)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + REPLICA_STICKY_SECONDS
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{PRIMARY_STICKY_COOKIE}={until:.3f}; Max-Age={REPLICA_STICKY_SECONDS}; Path=/; HttpOnly; SameSite=Lax",
+                )
+                if key:
+                    # Before the response goes out, so no later read of the client can miss it
+                    await publish_pin(key, until)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+def route_template(scope) -> str:
+    """Path template of the route a request goes to, so metrics have one label per route rather than per URL."""
+    partial = None
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path  # Right path, wrong method: answered with a 405
+    return partial or "unmatched"
+
+class MetricsMiddleware:
+    """
+    Per-route Prometheus metrics: latency, status codes, requests in progress, and the SQL statements, database time
+    and spans (model inference, LLM calls) of each request. With SERVER_TIMING_ENABLED the same timings are sent in a
+    Server-Timing header. Statements repeated within the request are reported as possible N+1 queries.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope["method"], route_template(scope)
+        stats = RequestStats(f"{method} {route}")
+        stats_token = current_request_stats.set(stats)
+        status_code = 500  # Unless a response is started before an exception
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_PROGRESS.labels(method, route).inc()
+
+        def finish():
+            # Once, when the response is complete: background tasks run after it and are not part of the request
+            if stats.finished:
+                return
+            stats.finished = True
+            HTTP_REQUESTS_IN_PROGRESS.labels(method, route).dec()
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            HTTP_REQUEST_SECONDS.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_REQUEST_DB_QUERIES.labels(method, route).observe(stats.queries)
+            HTTP_REQUEST_DB_SECONDS.labels(method, route).observe(stats.db_seconds)
+            report_repeated_statements(stats.statement_shapes, stats.route)
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    MutableHeaders(scope=message).append("server-timing", stats.server_timing(time.perf_counter() - start))
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            finish()
+            current_request_stats.reset(stats_token)
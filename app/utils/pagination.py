@@ -0,0 +1,82 @@
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import tuple_
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# List bodies stay plain JSON arrays; the cursor of the next page travels in this header
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+@dataclass
+class PageParams:
+    limit: Optional[int]  # None: the whole list
+    cursor: Optional[str]
+
+def page_params(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Maximum number of items to return; paging is opt-in, {DEFAULT_PAGE_SIZE} per page when only a cursor is given"),
+    cursor: Optional[str] = Query(None, description=f"Value of the {NEXT_CURSOR_HEADER} header of the previous page"),
+) -> PageParams:
+    """
+    Paging of the list endpoints that used to return every item: without limit or cursor they still do,
+    so clients that don't know about the cursor header never lose items silently.
+    """
+    if limit is None and cursor is not None:
+        limit = DEFAULT_PAGE_SIZE
+    return PageParams(limit=limit, cursor=cursor)
+
+def bounded_page_params(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of items to return"),
+    cursor: Optional[str] = Query(None, description=f"Value of the {NEXT_CURSOR_HEADER} header of the previous page"),
+) -> PageParams:
+    """Paging of endpoints that were paged from the start, such as searches: always at most `limit` items."""
+    return PageParams(limit=limit, cursor=cursor)
+
+def encode_cursor(values: list) -> str:
+    encoded = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(encoded).encode()).decode()
+
+def decode_cursor(cursor: str, columns: list) -> list:
+    """
+    Decode a cursor back into one value per key column.
+    :return: Raises HTTPException (400) if the cursor was not issued for these columns
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value) if column.type.python_type is datetime else column.type.python_type(value)
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def keyset_page(stmt, columns: list, page: PageParams, descending: bool = False):
+    """
+    Order a select by unique key columns (e.g. [Model.id], [Model.created_at, Model.id] or [rank expression, Model.id])
+    and restrict it to the page after the cursor. Each page is an index range scan, however deep it is;
+    one extra row is fetched to detect a next page.
+    """
+    if page.cursor:
+        values = decode_cursor(page.cursor, columns)
+        key, bound = (columns[0], values[0]) if len(columns) == 1 else (tuple_(*columns), tuple_(*values))
+        stmt = stmt.where(key < bound if descending else key > bound)
+    stmt = stmt.order_by(*(column.desc() if descending else column for column in columns))
+    return stmt if page.limit is None else stmt.limit(page.limit + 1)
+
+def finish_page(items: list, columns: list, page: PageParams, response: Response, key=None) -> list:
+    """
+    Drop the extra row fetched by keyset_page and, if there was one, set the next page's cursor header.
+    :param key: Returns the key values of an item, for keys that aren't attributes of it (e.g. a computed rank)
+    """
+    if page.limit is None or len(items) <= page.limit:
+        return items
+    items = items[:page.limit]
+    values = key(items[-1]) if key else [getattr(items[-1], column.key) for column in columns]
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(values)
+    return items
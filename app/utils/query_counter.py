@@ -0,0 +1,49 @@
+from sqlalchemy import event
+from collections import Counter
+from contextlib import contextmanager
+from utils.query_log import statement_shape
+
+class QueryCounter:
+    """
+    Records the SQL statements engines execute while active. Takes sync or async engines.
+
+        with QueryCounter(async_engine) as counter:
+            client.get("/api/patients/", headers=headers)
+        print(counter.count, counter.statements)
+    """
+
+    def __init__(self, *engines):
+        self.engines = [getattr(engine, "sync_engine", engine) for engine in engines]
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._record)
+
+@contextmanager
+def assert_max_queries(engine, limit: int):
+    """
+    Fail with the executed statements listed if the block runs more than `limit` queries,
+    e.g. when a relationship is lazily loaded per row again.
+    :param engine: Engine, or list of engines, whose statements are counted
+    """
+    engines = engine if isinstance(engine, (list, tuple)) else [engine]
+    with QueryCounter(*engines) as counter:
+        yield counter
+    if counter.count > limit:
+        # Grouped by shape, most repeated first: an N+1 shows up as one statement run once per row
+        shapes = Counter(statement_shape(statement) for statement in counter.statements)
+        statements = "\n".join(f"  {count} x {shape}" for shape, count in shapes.most_common())
+        raise AssertionError(f"Expected at most {limit} queries, {counter.count} were executed:\n{statements}")
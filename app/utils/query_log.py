@@ -0,0 +1,56 @@
+"""
+Slow query log and N+1 detection, fed by the query hooks of utils.metrics.instrument_queries.
+
+Statements slower than SLOW_QUERY_SECONDS are printed with the route that ran them. When a request runs the same
+statement shape N_PLUS_ONE_THRESHOLD times or more, typically a relationship lazily loaded once per row, the
+statement is printed once at the end of the request.
+"""
+import os
+import re
+from prometheus_client import Counter
+
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.5"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+# Characters of a statement printed in the logs
+LOGGED_STATEMENT_CHARS = 1000
+
+DB_SLOW_QUERIES = Counter(
+    "db_slow_queries_total",
+    "Statements that took longer than SLOW_QUERY_SECONDS, by the route that ran them",
+    ["route"],
+)
+DB_REPEATED_STATEMENTS = Counter(
+    "db_repeated_statements_total",
+    "Requests that ran one statement shape N_PLUS_ONE_THRESHOLD times or more (likely N+1 queries)",
+    ["route"],
+)
+
+# A placeholder of any driver, with the cast asyncpg adds to some, e.g. $1::INTEGER or $2::TIMESTAMP WITHOUT TIME ZONE
+PLACEHOLDER = r"(?:\$\d+|\?|%\(\w+\)s|%s)(?:::\w+(?: \w+)*(?:\[\])?)?"
+# A parenthesised list of placeholders only: IN (...) lists and multi-row VALUES of any length
+PLACEHOLDER_LIST = re.compile(rf"\(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})*\s*\)")
+MULTI_ROW_VALUES = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+
+def statement_shape(statement: str) -> str:
+    """
+    Statement with whitespace normalised and placeholder lists collapsed,
+    so `id IN ($1, $2)` and `id IN ($1, $2, $3)` have the same shape.
+    """
+    shape = PLACEHOLDER_LIST.sub("(...)", " ".join(statement.split()))
+    return MULTI_ROW_VALUES.sub("(...)", shape)
+
+def log_slow_query(statement: str, seconds: float, route: str):
+    DB_SLOW_QUERIES.labels(route).inc()
+    print(f"Slow query: {seconds * 1000:.0f} ms in {route}: {statement_shape(statement)[:LOGGED_STATEMENT_CHARS]}")
+
+def report_repeated_statements(shapes, route: str, threshold: int = N_PLUS_ONE_THRESHOLD):
+    """
+    Print the statement shapes a request ran at least `threshold` times.
+    :param shapes: Counter of the request's statement shapes
+    """
+    repeated = [(shape, count) for shape, count in shapes.items() if count >= threshold]
+    if not repeated:
+        return
+    DB_REPEATED_STATEMENTS.labels(route).inc()
+    for shape, count in repeated:
+        print(f"Possible N+1 queries: {route} ran {count} times: {shape[:LOGGED_STATEMENT_CHARS]}")
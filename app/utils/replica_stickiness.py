@@ -0,0 +1,90 @@
+"""
+Read-your-writes for clients whose reads go to the replica.
+
+After a successful write, the client's reads use the primary for REPLICA_STICKY_SECONDS. The client is recognised by
+- a cookie, for browsers that send credentials;
+- its principal, from the bearer token, for every other client. The principal's deadline is kept in memory and
+  published with Postgres NOTIFY, so whichever worker (or container) serves the next read knows about it.
+"""
+import asyncio
+import time
+import traceback
+from typing import Optional
+import asyncpg
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from starlette.datastructures import Headers
+from auth import decode_token
+from db import DATABASE_URL, DB_PGBOUNCER, async_engine
+
+PRIMARY_STICKY_CHANNEL = "primary_sticky"
+LISTEN_RETRY_SECONDS = 5
+
+class StickyPrincipals:
+    """Per-worker deadlines until which each principal reads from the primary."""
+
+    def __init__(self):
+        self.until = {}
+
+    def pin(self, key: str, until: float):
+        now = time.time()
+        # Expired deadlines are dropped as new ones come in, so the map only holds recent writers
+        self.until = {k: deadline for k, deadline in self.until.items() if deadline > now}
+        if until > self.until.get(key, 0):
+            self.until[key] = until
+
+    def is_pinned(self, key: str) -> bool:
+        return self.until.get(key, 0) > time.time()
+
+sticky_principals = StickyPrincipals()
+
+def principal_key(scope) -> Optional[str]:
+    """Key of the principal of a request's bearer token, or None without a valid one."""
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        claims = decode_token(token)
+    except HTTPException:
+        return None
+    if claims.get("uid") is not None:
+        return f"{claims.get('user_type')}:{claims['uid']}"
+    # Tokens issued before the id claims were added
+    return f"email:{claims['sub'].lower()}" if claims.get("sub") else None
+
+async def publish_pin(key: str, until: float):
+    """Pin a principal to the primary in this worker and, through NOTIFY, in every other one."""
+    sticky_principals.pin(key, until)
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(select(func.pg_notify(PRIMARY_STICKY_CHANNEL, f"{until:.3f} {key}")))
+            await conn.commit()
+    except Exception:
+        print("Publishing primary stickiness failed, other workers may read from the replica:")
+        traceback.print_exc()
+
+def apply_notification(payload: str):
+    until, _, key = payload.partition(" ")
+    sticky_principals.pin(key, float(until))
+
+async def listen_for_pins():
+    """Background task of each worker: applies the pins published by all the workers."""
+    if DB_PGBOUNCER:
+        # pgbouncer in transaction mode can't hold a LISTEN: pins then only reach the worker that served the write
+        print("DB_PGBOUNCER is set: bearer clients read their own writes only on the worker that served them")
+        return
+    while True:
+        try:
+            connection = await asyncpg.connect(DATABASE_URL)
+            try:
+                await connection.add_listener(
+                    PRIMARY_STICKY_CHANNEL, lambda conn, pid, channel, payload: apply_notification(payload)
+                )
+                while not connection.is_closed():
+                    await asyncio.sleep(LISTEN_RETRY_SECONDS)
+            finally:
+                await connection.close()
+        except Exception:
+            print("Listening for primary stickiness failed, retrying:")
+            traceback.print_exc()
+        await asyncio.sleep(LISTEN_RETRY_SECONDS)
@@ -0,0 +1,58 @@
+"""
+Response builders for the large list endpoints.
+
+They read only the fields of the response schema, from field lists computed once at import, and the result
+is rendered with orjson in a single pass. Returning the response directly skips FastAPI's jsonable_encoder and
+the second validation against response_model, which is kept on the routes for the OpenAPI docs.
+"""
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from schemas import HospitalOut, PatientOut, DoctorOut, PrescriptionOut
+from utils.pagination import NEXT_CURSOR_HEADER
+
+def _scalar_fields(schema, nested: tuple) -> tuple:
+    return tuple(name for name in schema.model_fields if name not in nested)
+
+HOSPITAL_FIELDS = _scalar_fields(HospitalOut, ())
+PATIENT_FIELDS = _scalar_fields(PatientOut, ("hospital", "prescriptions"))
+DOCTOR_FIELDS = _scalar_fields(DoctorOut, ("hospital", "prescriptions"))
+PRESCRIPTION_FIELDS = _scalar_fields(PrescriptionOut, ("patient", "doctor"))
+
+def hospital_out(hospital):
+    return {name: getattr(hospital, name) for name in HOSPITAL_FIELDS} if hospital else None
+
+def patient_out(patient):
+    if patient is None:
+        return None
+    return {
+        **{name: getattr(patient, name) for name in PATIENT_FIELDS},
+        "hospital": hospital_out(patient.hospital),
+        "prescriptions": [],
+    }
+
+def doctor_out(doctor):
+    if doctor is None:
+        return None
+    return {
+        **{name: getattr(doctor, name) for name in DOCTOR_FIELDS},
+        "hospital": hospital_out(doctor.hospital),
+        "prescriptions": [],
+    }
+
+def prescription_out(prescription):
+    """Same shape as PrescriptionOut; patient and doctor (with their hospitals) must already be loaded."""
+    return {
+        **{name: getattr(prescription, name) for name in PRESCRIPTION_FIELDS},
+        "patient": patient_out(prescription.patient),
+        "doctor": doctor_out(prescription.doctor),
+    }
+
+def json_response(content, status_code: int = 200, response: Response = None) -> ORJSONResponse:
+    """
+    Render content with orjson. Pass the route's injected `response` to carry over
+    the pagination cursor header set on it by finish_page.
+    """
+    headers = {}
+    if response is not None and NEXT_CURSOR_HEADER in response.headers:
+        headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
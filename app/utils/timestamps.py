@@ -0,0 +1,11 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    A datetime as the naive UTC the timestamp columns store. Naive values are taken to be UTC already;
+    aware ones (e.g. "...T08:00:00+03:00" in a query string) are converted, as Postgres won't compare the two.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)